@@ -4,6 +4,8 @@ import shutil
 import sqlite3
 import tempfile
 import zipfile
+from contextlib import contextmanager
+from functools import partial
 
 # from datetime import datetime
 
@@ -17,130 +19,191 @@ import zipfile
 
 # Anki 字段内容的分隔符
 FIELD_SEPARATOR = "\x1f"
+# 新版 Anki 导出 collection.anki21，旧版为 collection.anki2，两者都存在时前者为准
+COLLECTION_MEMBERS = ("collection.anki21", "collection.anki2")
+# 每次从游标读取的笔记数
+NOTES_FETCH_SIZE = 1000
 
 
-def parse_apkg(apkg_path):
-    """解析 Anki .apkg 文件并提取信息。"""
-    extracted_data = {"decks": {}, "models": {}, "notes": [], "media_files": {}}
+def extract_collection(apkg_path, dest_dir):
+    """只解压 .apkg 中的集合数据库，媒体文件留在压缩包内
 
-    # 创建一个临时目录来解压文件
-    temp_dir = tempfile.mkdtemp()
-    print(f"[*] 解压 .apkg 文件到临时目录: {temp_dir}")
+    Args:
+        apkg_path: .apkg 文件路径
+        dest_dir: 解压目录
+
+    Returns:
+        集合数据库路径，压缩包中没有集合数据库时返回 None
+    """
+    with zipfile.ZipFile(apkg_path, "r") as zf:
+        names = set(zf.namelist())
+        for member in COLLECTION_MEMBERS:
+            if member in names:
+                db_path = os.path.join(dest_dir, member)
+                with zf.open(member) as src, open(db_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                return db_path
+    return None
+
+
+def read_media_mapping(apkg_path):
+    """读取媒体文件映射 {压缩包内文件名: 原始文件名}，不解压媒体文件"""
+    with zipfile.ZipFile(apkg_path, "r") as zf:
+        if "media" not in zf.namelist():
+            return {}
+        with zf.open("media") as f:
+            return json.load(f)
+
+
+def iter_media_members(apkg_path):
+    """逐个产出 .apkg 中的媒体文件，不解压到磁盘
+
+    压缩包内的媒体文件以数字命名 (0, 1, ...)，media 映射给出原始文件名。
+
+    Yields:
+        (原始文件名, 无参函数)，函数每次调用打开一个新的只读文件对象，
+        只能在迭代期间调用
+    """
+    with zipfile.ZipFile(apkg_path, "r") as zf:
+        names = set(zf.namelist())
+        if "media" not in names:
+            return
+        with zf.open("media") as f:
+            media_mapping = json.load(f)
+        for member, filename in media_mapping.items():
+            if member in names:
+                yield filename, partial(zf.open, member)
+
+
+def read_metadata(db_path):
+    """读取集合数据库中的牌组、模型信息和笔记总数
 
+    Args:
+        db_path: 集合数据库路径
+
+    Returns:
+        {"decks": {...}, "models": {...}, "note_count": int}
+    """
+    conn = sqlite3.connect(db_path)
     try:
-        # 1. 解压缩 .apkg 文件
-        with zipfile.ZipFile(apkg_path, "r") as zf:
-            zf.extractall(temp_dir)
-
-        # 2. 处理 media 文件 (如果存在)
-        media_json_path = os.path.join(temp_dir, "media")
-        if os.path.exists(media_json_path):
-            with open(media_json_path, encoding="utf-8") as f:
-                media_mapping = json.load(f)
-                extracted_data["media_files"] = media_mapping
-                print(f"[*] 找到 {len(media_mapping)} 个媒体文件映射。")
-                # 你可以在这里添加逻辑来复制或处理实际的媒体文件
-                # 它们在 temp_dir 下以数字命名 (e.g., temp_dir/0, temp_dir/1)
-
-        # 3. 确定数据库文件名
-        db_path_anki2 = os.path.join(temp_dir, "collection.anki2")
-        db_path_anki21 = os.path.join(temp_dir, "collection.anki21")
-
-        db_path = None
-        if os.path.exists(db_path_anki21):
-            db_path = db_path_anki21
-            print("[*] 找到 collection.anki21 数据库。")
-        elif os.path.exists(db_path_anki2):
-            db_path = db_path_anki2
-            print("[*] 找到 collection.anki2 数据库。")
-        else:
-            print(
-                "[!] 错误: 在解压的目录中未找到 collection.anki2 或 collection.anki21。"
-            )
-            return None
-
-        # 4. 连接并查询 SQLite 数据库
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # 获取牌组 (Decks) 信息
-        # 牌组信息存储在 col 表的 decks 字段 (JSON 字符串)
-        cursor.execute("SELECT decks FROM col")
-        decks_json_str = cursor.fetchone()[0]
-        decks_data = json.loads(decks_json_str)
-        for deck_id, deck_info in decks_data.items():
-            extracted_data["decks"][deck_id] = {
-                "name": deck_info.get("name"),
-                "id": deck_info.get("id"),  # deck_id 也是 id
-            }
-        print(f"[*] 提取了 {len(extracted_data['decks'])} 个牌组信息。")
-
-        # 获取模型 (Note Types / Models) 信息
-        # 模型信息存储在 col 表的 models 字段 (JSON 字符串)
-        cursor.execute("SELECT models FROM col")
-        models_json_str = cursor.fetchone()[0]
-        models_data = json.loads(models_json_str)
-        for model_id, model_info in models_data.items():
-            field_names = [fld.get("name") for fld in model_info.get("flds", [])]
-            extracted_data["models"][model_id] = {
+        # 牌组和模型信息存储在 col 表的 decks、models 字段 (JSON 字符串)
+        decks_json_str, models_json_str = conn.execute(
+            "SELECT decks, models FROM col"
+        ).fetchone()
+        decks = {
+            deck_id: {"name": deck_info.get("name"), "id": deck_info.get("id")}
+            for deck_id, deck_info in json.loads(decks_json_str).items()
+        }
+        models = {
+            model_id: {
                 "name": model_info.get("name"),
-                "id": model_info.get("id"),  # model_id 也是 id
-                "field_names": field_names,
+                "id": model_info.get("id"),
+                "field_names": [fld.get("name") for fld in model_info.get("flds", [])],
             }
-        print(f"[*] 提取了 {len(extracted_data['models'])} 个模型信息。")
+            for model_id, model_info in json.loads(models_json_str).items()
+        }
+        (note_count,) = conn.execute("SELECT count(*) FROM notes").fetchone()
+    finally:
+        conn.close()
+    return {"decks": decks, "models": models, "note_count": note_count}
+
+
+def _to_note(note_row, models):
+    note_id, model_id, flds_str, tags_str = note_row
+    # model_id 在 JSON 中是字符串键
+    model_info = models.get(str(model_id))
+    model_name = model_info["name"] if model_info else "未知模型"
+    field_names = model_info["field_names"] if model_info else []
+
+    # 将字段内容与字段名对应起来
+    note_fields_dict = {}
+    for i, content in enumerate(flds_str.split(FIELD_SEPARATOR)):
+        field_name = field_names[i] if i < len(field_names) else f"字段_{i + 1}"
+        note_fields_dict[field_name] = content
+
+    return {
+        "id": note_id,
+        "model_id": model_id,
+        "model_name": model_name,
+        "fields": note_fields_dict,
+        "tags": tags_str.strip().split(" ") if tags_str.strip() else [],
+    }
+
 
-        # 获取笔记 (Notes) 信息
+def iter_notes(db_path, models, after_note_id=None, fetch_size=NOTES_FETCH_SIZE):
+    """按笔记ID顺序逐条产出笔记，每次从游标读取 fetch_size 条
+
+    Args:
+        db_path: 集合数据库路径
+        models: read_metadata 返回的模型信息
+        after_note_id: 只产出ID大于该值的笔记，用于从上次中断处继续
+        fetch_size: 每次从游标读取的笔记数
+
+    Yields:
+        笔记，格式与 parse_apkg 返回的 notes 元素相同
+    """
+    conn = sqlite3.connect(db_path)
+    try:
         # notes 表: id (note_id), mid (model_id), flds (fields, 以 \x1f 分隔), tags
-        cursor.execute("SELECT id, mid, flds, tags FROM notes")
-        notes_rows = cursor.fetchall()
-        for note_row in notes_rows:
-            note_id, model_id, flds_str, tags_str = note_row
-
-            # 解析字段
-            fields_content = flds_str.split(FIELD_SEPARATOR)
-
-            # 获取模型名称和字段名称
-            model_info = extracted_data["models"].get(
-                str(model_id)
-            )  # model_id 在 JSON 中是字符串键
-            model_name = model_info["name"] if model_info else "未知模型"
-            field_names = model_info["field_names"] if model_info else []
-
-            # 将字段内容与字段名对应起来
-            note_fields_dict = {}
-            for i, content in enumerate(fields_content):
-                field_name = field_names[i] if i < len(field_names) else f"字段_{i + 1}"
-                note_fields_dict[field_name] = content
-
-            note_data = {
-                "id": note_id,
-                "model_id": model_id,
-                "model_name": model_name,
-                "fields": note_fields_dict,
-                "tags": tags_str.strip().split(" ") if tags_str.strip() else [],
-            }
-            extracted_data["notes"].append(note_data)
-        print(f"[*] 提取了 {len(extracted_data['notes'])} 条笔记。")
-
-        # 你还可以查询 cards 表来获取卡片信息，它通过 nid (note_id) 和 did (deck_id) 关联
-        # cursor.execute("SELECT id, nid, did, ord, C FROM cards")
-        # cards_rows = cursor.fetchall()
-        # for card_row in cards_rows:
-        #     card_id, note_id, deck_id, ord_val = card_row # ord 是卡片模板的序号
-        #     deck_name = extracted_data["decks"].get(str(deck_id), {}).get("name", "未知牌组")
-        #     print(f"    Card ID: {card_id}, Note ID: {note_id}, Deck: {deck_name}, Template Order: {ord_val}")
+        cursor = conn.execute(
+            "SELECT id, mid, flds, tags FROM notes WHERE id > ? ORDER BY id",
+            (after_note_id if after_note_id is not None else -1,),
+        )
+        while True:
+            note_rows = cursor.fetchmany(fetch_size)
+            if not note_rows:
+                break
+            for note_row in note_rows:
+                yield _to_note(note_row, models)
+    finally:
         conn.close()
 
+
+@contextmanager
+def open_apkg(apkg_path):
+    """打开 .apkg 文件，元数据立即可用，笔记按需逐条读取
+
+    只解压集合数据库，内存占用与牌组大小无关。退出上下文时清理临时目录。
+
+    Yields:
+        {"decks", "models", "note_count", "media_files", "notes"}，
+        notes 是笔记的迭代器，只能在上下文内消费
+    """
+    temp_dir = tempfile.mkdtemp()
+    notes = None
+    try:
+        db_path = extract_collection(apkg_path, temp_dir)
+        if db_path is None:
+            raise ValueError(
+                "在 .apkg 文件中未找到 collection.anki2 或 collection.anki21"
+            )
+        apkg = read_metadata(db_path)
+        apkg["media_files"] = read_media_mapping(apkg_path)
+        notes = iter_notes(db_path, apkg["models"])
+        apkg["notes"] = notes
+        yield apkg
+    finally:
+        if notes is not None:
+            notes.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def parse_apkg(apkg_path):
+    """解析 Anki .apkg 文件并提取信息，所有笔记一次性读入内存。
+
+    大牌组请使用 open_apkg 逐条读取。
+    """
+    try:
+        with open_apkg(apkg_path) as apkg:
+            return {
+                "decks": apkg["decks"],
+                "models": apkg["models"],
+                "notes": list(apkg["notes"]),
+                "media_files": apkg["media_files"],
+            }
     except Exception as e:
         print(f"[!] 解析过程中发生错误: {e}")
         return None
-    finally:
-        # 清理临时目录
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-            print(f"[*] 已清理临时目录: {temp_dir}")
-
-    return extracted_data
 
 
 if __name__ == "__main__":
@@ -3,8 +3,9 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from corelib.config import settings
-from corelib.db import get_sqlite_db
+from corelib.db import get_read_db
 from corelib.security import parse_token
+from corelib.user_cache import cache_user, get_cached_user, user_cache_generation
 from crud.crud_user import get_user_by_email
 from models.user import User
 
@@ -14,7 +15,7 @@ oauth2_scheme = OAuth2PasswordBearer(
 
 
 async def get_current_user(
-    db: AsyncSession = Depends(get_sqlite_db), token: str = Depends(oauth2_scheme)
+    db: AsyncSession = Depends(get_read_db), token: str = Depends(oauth2_scheme)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -27,9 +28,14 @@ async def get_current_user(
     email: str = payload.get("sub", None)
     if email is None:
         raise credentials_exception
-    user = await get_user_by_email(db, email=email)
+    user = await get_cached_user(email)
     if user is None:
-        raise credentials_exception
+        # taken before the read, a change committed meanwhile is not cached
+        generation = await user_cache_generation(email)
+        user = await get_user_by_email(db, email=email)
+        if user is None:
+            raise credentials_exception
+        await cache_user(user, generation)
     return user
 
 
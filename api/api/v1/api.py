@@ -1,10 +1,13 @@
 from fastapi import APIRouter
 
-from api.v1.endpoints import (  # auth,; study_sessions,
+from api.v1.endpoints import (  # auth,
     cards,
+    media,
+    metrics,
     notification_settings,
     sse,
     statistics,
+    study_sessions,
     users,
 )
 
@@ -13,9 +16,13 @@ api_router = APIRouter()
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(cards.router, prefix="/cards", tags=["cards"])
 # api_router.include_router(decks.router, prefix="/decks", tags=["decks"])
-# api_router.include_router(study_sessions.router, prefix="/study-sessions", tags=["study-sessions"])
+api_router.include_router(
+    study_sessions.router, prefix="/study-sessions", tags=["study-sessions"]
+)
 api_router.include_router(statistics.router, prefix="/statistics", tags=["statistics"])
 api_router.include_router(
     notification_settings.router, prefix="/users", tags=["notification-settings"]
 )
 api_router.include_router(sse.router, prefix="/sse", tags=["sse"])
+api_router.include_router(media.router, prefix="/media", tags=["media"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
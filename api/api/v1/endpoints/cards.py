@@ -1,52 +1,206 @@
-from pathlib import Path
-from typing import List
+import asyncio
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+import anyio
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool
 
 from api.deps import get_current_active_user
-from corelib.db import get_sqlite_db
+from corelib.apkg_export import (
+    APKG_COLLECTION_NAME,
+    add_notes,
+    close_collection,
+    create_collection,
+    iter_apkg_zip,
+)
+from corelib.card_generation import generate_cards
+from corelib.chunked_upload import (
+    UploadOffsetError,
+    UploadSizeError,
+    create_upload,
+    delete_upload,
+    get_upload,
+    upload_data_path,
+    verify_upload,
+    write_chunk,
+)
+from corelib.config import settings
+from corelib.db import get_db, get_read_db, get_session_local
+from corelib.media_store import SHA256_HEX
+from corelib.outbox import new_outbox_message, notify_outbox
+from corelib.sse import send_message, sse_connections
+from corelib.tasks.helper import new_task_id, new_task_params
+from corelib.tasks.import_task import IMPORT_JOB_FINISHED_STATUSES, import_job_path
+from corelib.tasks.import_task_api import import_apkg_task
 from crud.crud_card import (
     create_card,
     create_review,
+    create_reviews,
     get_card,
     get_due_cards,
     get_user_cards,
+    iter_user_card_batches,
     update_card,
 )
+from crud.crud_import_job import create_import_job, get_import_job
+from crud.crud_media import get_card_media, get_user_media
+from models.import_job import ImportJob as ImportJobModel
 from models.user import User
-from schemas.card import Card, CardCreate, CardUpdate, ReviewCreate
+from schemas.card import (
+    ApkgUpload,
+    ApkgUploadCreate,
+    Card,
+    CardCreate,
+    CardCursor,
+    CardGenerationRequest,
+    CardGenerationResult,
+    CardMediaRef,
+    CardPage,
+    CardUpdate,
+    ImportJob,
+    ReviewBatchItem,
+    ReviewBatchResult,
+    ReviewCreate,
+)
 
 router = APIRouter()
 
+REVIEW_BATCH_MAX_SIZE = 1000
+CARD_GENERATION_MAX_WORDS = 100
+APKG_UPLOAD_CHUNK_BYTES = 1024 * 1024
+IMPORT_JOB_PROGRESS_INTERVAL_SECONDS = 1
+
+# SSE progress relays of running import jobs, referenced until they finish
+progress_relays = set()
 
-@router.get("/due", response_model=List[Card])
+
+def _card_page(cards, limit: int) -> CardPage:
+    next_cursor = None
+    if len(cards) == limit and cards:
+        next_cursor = CardCursor(
+            after_next_review=cards[-1].next_review, after_id=cards[-1].id
+        )
+    return CardPage(items=cards, next_cursor=next_cursor)
+
+
+@router.get("/due", response_model=CardPage)
 async def h_get_due_cards(
     skip: int = 0,
     limit: int = 100,
+    after_next_review: Optional[datetime] = None,
+    after_id: Optional[int] = None,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Get due cards for review."""
-    return await get_due_cards(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    """Get due cards for review, ordered by next review time."""
+    cards = await get_due_cards(
+        db=db,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        after_next_review=after_next_review,
+        after_id=after_id,
+    )
+    return _card_page(cards, limit)
 
 
-@router.get("/", response_model=List[Card])
+@router.get("/", response_model=CardPage)
 async def h_get_cards(
     skip: int = 0,
     limit: int = 100,
+    after_next_review: Optional[datetime] = None,
+    after_id: Optional[int] = None,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Get user cards."""
-    return await get_user_cards(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    """Get user cards, ordered by next review time."""
+    cards = await get_user_cards(
+        db=db,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        after_next_review=after_next_review,
+        after_id=after_id,
+    )
+    return _card_page(cards, limit)
+
+
+def _iter_from_thread(iterator: AsyncIterator):
+    # consumes an async iterator from a worker thread started by anyio
+    while True:
+        try:
+            yield anyio.from_thread.run(iterator.__anext__)
+        except StopAsyncIteration:
+            return
+
+
+async def _export_apkg(user_id: int):
+    # the collection is built on disk batch by batch, then zipped chunk by
+    # chunk; media rows are streamed twice, for the pronunciation fields and
+    # for the zip, instead of being held in memory
+    with tempfile.TemporaryDirectory() as temp_dir:
+        collection_path = os.path.join(temp_dir, APKG_COLLECTION_NAME)
+        collection = await asyncio.to_thread(
+            create_collection, collection_path, settings.PROJECT_NAME
+        )
+        async with get_session_local(role="read")() as db:
+            try:
+                sound_filenames = {}
+                async for filename, sha256, _ in get_user_media(db, user_id):
+                    sound_filenames.setdefault(sha256, filename)
+                async for cards in iter_user_card_batches(
+                    db, user_id, settings.APKG_EXPORT_BATCH_SIZE
+                ):
+                    await asyncio.to_thread(
+                        add_notes, collection, cards, sound_filenames
+                    )
+            finally:
+                await asyncio.to_thread(close_collection, collection)
+            media = get_user_media(db, user_id)
+            try:
+                async for chunk in iterate_in_threadpool(
+                    iter_apkg_zip(collection_path, _iter_from_thread(media))
+                ):
+                    yield chunk
+            finally:
+                await media.aclose()
+
+
+@router.get("/export.apkg")
+async def h_export_anki_cards(
+    current_user: User = Depends(get_current_active_user),
+):
+    """Export all cards and their media as an Anki .apkg file.
+
+    The file is streamed while it is built, its size is not known up front.
+    """
+    return StreamingResponse(
+        _export_apkg(current_user.id),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="cards.apkg"'},
+    )
 
 
 @router.get("/{card_id}", response_model=Card)
 async def h_get_card(
     card_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Get card by ID."""
     db_card = await get_card(db=db, card_id=card_id)
@@ -55,31 +209,81 @@ async def h_get_card(
     return db_card
 
 
+@router.get("/{card_id}/media", response_model=List[CardMediaRef])
+async def h_get_card_media(
+    card_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """List the media files a card references."""
+    db_card = await get_card(db=db, card_id=card_id)
+    if db_card is None or db_card.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Card not found")
+    return [
+        CardMediaRef(
+            filename=filename,
+            sha256=sha256,
+            content_type=content_type,
+            size=size,
+            url=f"{settings.API_V1_STR}/media/{sha256}",
+        )
+        for filename, sha256, content_type, size in await get_card_media(db, card_id)
+    ]
+
+
 @router.post("/", response_model=Card)
 async def h_create_card(
     card: CardCreate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Create new card."""
+    """Create new card, or merge it into the existing card for the same word."""
     try:
-        return await create_card(db=db, card=card, user_id=current_user.id)
+        return await create_card(
+            db=db,
+            card=card,
+            user_id=current_user.id,
+            merge_policy=settings.CARD_MERGE_POLICY,
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/generate", response_model=CardGenerationResult)
+async def h_generate_cards(
+    request: CardGenerationRequest,
+    current_user: User = Depends(get_current_active_user),
+):
+    """Generate cards for a list of words with the configured LLM.
+
+    The cards are not saved, create the ones to keep with POST /cards/.
+    """
+    if len(request.words) > CARD_GENERATION_MAX_WORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CARD_GENERATION_MAX_WORDS} words per request",
+        )
+    cards, failed = await generate_cards(request.words)
+    return CardGenerationResult(cards=cards, failed=failed)
+
+
 @router.patch("/{card_id}", response_model=Card)
 async def h_update_card(
     card_id: int,
     card_update: CardUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Update card."""
     db_card = await get_card(db=db, card_id=card_id)
     if db_card is None or db_card.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Card not found")
-    return await update_card(db=db, card_id=card_id, card_update=card_update)
+    try:
+        return await update_card(db=db, card_id=card_id, card_update=card_update)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=409, detail="Another card already has this word"
+        )
 
 
 @router.post("/{card_id}/review", response_model=Card)
@@ -87,36 +291,254 @@ async def h_review_card(
     card_id: int,
     review: ReviewCreate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Review card."""
-    db_card = await get_card(db=db, card_id=card_id)
-    if db_card is None or db_card.owner_id != current_user.id:
+    db_card = await create_review(
+        db=db, card_id=card_id, user_id=current_user.id, rating=review.rating
+    )
+    if db_card is None:
         raise HTTPException(status_code=404, detail="Card not found")
-    return await create_review(db=db, card_id=card_id, rating=review.rating)
+    return db_card
+
+
+@router.post("/reviews:batch", response_model=List[ReviewBatchResult])
+async def h_review_cards_batch(
+    reviews: List[ReviewBatchItem],
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Review a batch of cards in one transaction, e.g. an offline study session."""
+    if len(reviews) > REVIEW_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {REVIEW_BATCH_MAX_SIZE} reviews per batch",
+        )
+    return await create_reviews(db=db, user_id=current_user.id, reviews=reviews)
+
+
+MergePolicy = Literal["keep", "overwrite", "fill_empty"]
+
+
+async def _relay_import_job_progress(job_id: str, connection_id: str):
+    # the job runs on a Celery worker, poll its row and forward changes
+    session_local = get_session_local(role="read")
+    last_message = None
+    while connection_id in sse_connections:
+        async with session_local() as db:
+            job = await get_import_job(db, job_id)
+        if job is None:
+            return
+        message = {
+            "type": "card_import",
+            "job_id": job_id,
+            "status": job.status,
+            "imported": job.imported,
+            "duplicates": job.duplicates,
+            "processed": job.processed_notes,
+            "total": job.total_notes,
+        }
+        if job.error is not None:
+            message["detail"] = job.error
+        if message != last_message:
+            await send_message(connection_id, message)
+            last_message = message
+        if job.status in IMPORT_JOB_FINISHED_STATUSES:
+            return
+        await asyncio.sleep(IMPORT_JOB_PROGRESS_INTERVAL_SECONDS)
 
 
-@router.post("/import", response_model=List[Card])
+async def _enqueue_import_job(
+    db: AsyncSession,
+    job_id: str,
+    user_id: int,
+    filename: str,
+    connection_id: Optional[str],
+    merge_policy: Optional[MergePolicy],
+) -> ImportJobModel:
+    """Create the job for a file already at import_job_path(job_id)."""
+    task_id, task_params = new_task_params(job_id=job_id)
+    try:
+        await create_import_job(
+            db,
+            ImportJobModel(
+                id=job_id,
+                owner_id=user_id,
+                status="pending",
+                filename=filename,
+                merge_policy=merge_policy or settings.CARD_MERGE_POLICY,
+                attempts=0,
+                processed_notes=0,
+                imported=0,
+                duplicates=0,
+            ),
+            new_outbox_message(import_apkg_task.name, task_id, task_params),
+        )
+    except Exception:
+        os.remove(import_job_path(job_id))
+        raise
+    notify_outbox()
+    if connection_id is not None:
+        task = asyncio.create_task(_relay_import_job_progress(job_id, connection_id))
+        progress_relays.add(task)
+        task.add_done_callback(progress_relays.discard)
+    return await get_import_job(db, job_id)
+
+
+@router.post("/import", response_model=ImportJob, status_code=202)
 async def h_import_anki_cards(
     file: UploadFile = File(...),
+    connection_id: Optional[str] = Query(
+        None, description="SSE connection to send import progress to"
+    ),
+    merge_policy: Optional[MergePolicy] = Query(
+        None, description="How to merge notes whose word already has a card"
+    ),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Import cards from an Anki .apkg file."""
+    """Import cards from an Anki .apkg file sent in a single request.
+
+    The import runs as a background job, poll GET /cards/import/{job_id}.
+    """
     if not file.filename.endswith(".apkg"):
         raise HTTPException(status_code=400, detail="Only .apkg files are supported")
 
+    # Stream the upload to where the worker reads it
+    job_id = new_task_id()
+    apkg_path = import_job_path(job_id)
+    os.makedirs(os.path.dirname(apkg_path), exist_ok=True)
+    size = 0
+    with open(apkg_path, "wb") as f:
+        while chunk := await file.read(APKG_UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > settings.APKG_IMPORT_MAX_BYTES:
+                f.close()
+                os.remove(apkg_path)
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File larger than {settings.APKG_IMPORT_MAX_BYTES} bytes",
+                )
+            await asyncio.to_thread(f.write, chunk)
+    return await _enqueue_import_job(
+        db, job_id, current_user.id, file.filename, connection_id, merge_policy
+    )
+
+
+def _get_upload_or_404(upload_id: str, user_id: int):
+    upload = get_upload(upload_id, user_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+@router.post("/import/uploads", response_model=ApkgUpload)
+def h_create_apkg_upload(
+    upload: ApkgUploadCreate,
+    current_user: User = Depends(get_current_active_user),
+):
+    """Start a resumable chunked upload of an .apkg file."""
+    if not upload.filename.endswith(".apkg"):
+        raise HTTPException(status_code=400, detail="Only .apkg files are supported")
+    if not SHA256_HEX.fullmatch(upload.sha256.lower()):
+        raise HTTPException(status_code=400, detail="sha256 must be 64 hex digits")
+    if not 0 < upload.size <= settings.APKG_IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File larger than {settings.APKG_IMPORT_MAX_BYTES} bytes",
+        )
+    upload_id = create_upload(
+        current_user.id, upload.filename, upload.size, upload.sha256
+    )
+    return ApkgUpload(upload_id=upload_id, size=upload.size, offset=0)
+
+
+@router.get("/import/uploads/{upload_id}", response_model=ApkgUpload)
+def h_get_apkg_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+):
+    """Get the offset to resume an upload from."""
+    return _get_upload_or_404(upload_id, current_user.id)
+
+
+@router.put("/import/uploads/{upload_id}", response_model=ApkgUpload)
+async def h_put_apkg_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., description="Position of the chunk in the file"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Append a chunk, sent as the raw request body, at the given offset."""
+    upload = _get_upload_or_404(upload_id, current_user.id)
     try:
-        # Create .apkg directory if it doesn't exist
-        apkg_dir = Path(".apkg")
-        apkg_dir.mkdir(exist_ok=True)
+        upload["offset"] = await write_chunk(upload, offset, request.stream())
+    except UploadOffsetError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Chunk must start at offset {e.offset}",
+            headers={"Upload-Offset": str(e.offset)},
+        )
+    except UploadSizeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return upload
 
-        # Save the file
-        file_path = apkg_dir / file.filename
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
 
-        return []  # Return empty list for now since we're just saving the file
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+@router.post(
+    "/import/uploads/{upload_id}/complete", response_model=ImportJob, status_code=202
+)
+async def h_complete_apkg_upload(
+    upload_id: str,
+    connection_id: Optional[str] = Query(
+        None, description="SSE connection to send import progress to"
+    ),
+    merge_policy: Optional[MergePolicy] = Query(
+        None, description="How to merge notes whose word already has a card"
+    ),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Verify the checksum of a finished upload and start importing it."""
+    upload = _get_upload_or_404(upload_id, current_user.id)
+    if upload["offset"] != upload["size"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {upload['offset']} of {upload['size']} bytes",
+            headers={"Upload-Offset": str(upload["offset"])},
+        )
+    if not await asyncio.to_thread(verify_upload, upload):
+        delete_upload(upload_id)
+        raise HTTPException(status_code=400, detail="Checksum mismatch")
+    job_id = new_task_id()
+    os.makedirs(settings.APKG_IMPORT_JOB_ROOT_PATH, exist_ok=True)
+    await asyncio.to_thread(
+        shutil.move, upload_data_path(upload_id), import_job_path(job_id)
+    )
+    delete_upload(upload_id)
+    return await _enqueue_import_job(
+        db, job_id, current_user.id, upload["filename"], connection_id, merge_policy
+    )
+
+
+@router.delete("/import/uploads/{upload_id}")
+def h_delete_apkg_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+):
+    """Abort an upload and free its disk space."""
+    _get_upload_or_404(upload_id, current_user.id)
+    delete_upload(upload_id)
+    return {"message": "Upload deleted"}
+
+
+@router.get("/import/{job_id}", response_model=ImportJob)
+async def h_get_import_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Get the state and progress of an import job."""
+    job = await get_import_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
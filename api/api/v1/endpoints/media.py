@@ -0,0 +1,79 @@
+import os
+
+import anyio
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from corelib.db import get_read_db
+from corelib.media_store import (
+    DEFAULT_CONTENT_TYPE,
+    SHA256_HEX,
+    is_inline_content_type,
+    media_path,
+)
+from crud.crud_media import get_media_blob
+
+router = APIRouter()
+
+# content never changes under a hash, clients and CDNs may keep it forever
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, RFC 9110 13.1.2
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+@router.api_route("/{sha256}", methods=["GET", "HEAD"])
+async def h_get_media(
+    sha256: str,
+    if_none_match: str = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Serve a stored media file by its SHA-256.
+
+    Media is content-addressed, so the hash is a strong ETag and responses are
+    immutable. Range requests are answered with 206. No login is required:
+    <audio> and <img> tags cannot send a bearer token, and the hash is only
+    known to owners of cards referencing the file. Only audio and raster
+    images are served inline; anything else (HTML or SVG in an imported deck)
+    is sent as an octet-stream attachment so that it never runs on this origin.
+    """
+    if not SHA256_HEX.fullmatch(sha256):
+        raise HTTPException(status_code=404, detail="Media not found")
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": MEDIA_CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff",
+    }
+    # a cached copy of immutable content is always current
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    blob = await get_media_blob(db, sha256)
+    await db.close()
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    path = media_path(sha256)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Media not found")
+    # blobs stored before the allowlist may carry any type
+    media_type = blob.content_type
+    if not is_inline_content_type(media_type):
+        media_type = DEFAULT_CONTENT_TYPE
+        headers["Content-Disposition"] = f'attachment; filename="{sha256}"'
+    # sent with http.response.pathsend (zero-copy) when the server supports it
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result,
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from corelib.metrics import get_metrics
+
+router = APIRouter()
+
+
+@router.get("/")
+async def h_get_metrics():
+    """Get in-process metrics of this worker."""
+    return get_metrics()
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api import deps
-from corelib.db import get_sqlite_db
+from corelib.db import get_db
 from crud.curd_notification_setting import (
     create_notification_settings,
     get_notification_settings,
@@ -22,7 +22,7 @@ router = APIRouter()
 @router.get("/notification-settings", response_model=NotificationSettings)
 async def h_get_notification_settings(
     current_user=Depends(deps.get_current_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ) -> Any:
     """Get current user's notification settings."""
     settings = await get_notification_settings(db, current_user.id)
@@ -48,7 +48,7 @@ async def h_update_notification_settings(
     *,
     settings_in: NotificationSettingsUpdate,
     current_user=Depends(deps.get_current_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ) -> Any:
     """Update current user's notification settings."""
     settings = await get_notification_settings(db, current_user.id)
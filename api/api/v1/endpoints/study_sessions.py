@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.deps import get_current_active_user
+from corelib.db import get_read_db
+from corelib.study_session import (
+    create_study_session,
+    end_study_session,
+    get_study_session,
+    next_study_cards,
+)
+from crud.crud_card import get_due_cards
+from models.user import User
+from schemas.card import Card
+from schemas.study_session import StudySession, StudySessionCards, StudySessionCreate
+
+router = APIRouter()
+
+# sessions live in the memory of the worker that created them, a request
+# served by another worker (or after a restart) cannot find its session
+STUDY_SESSION_NOT_FOUND = "Study session not found or expired, start a new session"
+
+
+def _study_session_schema(session: dict) -> StudySession:
+    return StudySession(
+        id=session["id"],
+        total=len(session["cards"]),
+        remaining=len(session["cards"]) - session["cursor"],
+        created_at=datetime.fromtimestamp(session["created_at"]),
+        expires_at=datetime.fromtimestamp(session["expires_at"]),
+    )
+
+
+@router.post("/", response_model=StudySession)
+async def h_start_study_session(
+    study_session: StudySessionCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Start a study session, snapshotting the user's due queue once."""
+    due_cards = await get_due_cards(
+        db=db, user_id=current_user.id, limit=study_session.limit
+    )
+    session = create_study_session(
+        current_user.id,
+        [Card.model_validate(card).model_dump() for card in due_cards],
+    )
+    return _study_session_schema(session)
+
+
+@router.get("/{session_id}", response_model=StudySession)
+async def h_get_study_session(
+    session_id: str, current_user: User = Depends(get_current_active_user)
+):
+    """Get study session progress."""
+    session = get_study_session(session_id, current_user.id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=STUDY_SESSION_NOT_FOUND)
+    return _study_session_schema(session)
+
+
+@router.get("/{session_id}/next", response_model=StudySessionCards)
+async def h_get_next_study_cards(
+    session_id: str,
+    n: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Get the next cards of the study session without querying the database."""
+    session = get_study_session(session_id, current_user.id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=STUDY_SESSION_NOT_FOUND)
+    cards = next_study_cards(session, n)
+    return StudySessionCards(
+        items=cards, remaining=len(session["cards"]) - session["cursor"]
+    )
+
+
+@router.delete("/{session_id}", response_model=StudySession)
+async def h_end_study_session(
+    session_id: str, current_user: User = Depends(get_current_active_user)
+):
+    """End study session."""
+    session = get_study_session(session_id, current_user.id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=STUDY_SESSION_NOT_FOUND)
+    end_study_session(session_id)
+    return _study_session_schema(session)
@@ -9,19 +9,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.deps import get_current_active_user
 from corelib.config import settings
-from corelib.db import get_sqlite_db
+from corelib.db import get_db, get_read_db
+from corelib.metrics import incr_counter
+from corelib.outbox import new_outbox_message, notify_outbox
 from corelib.security import (
+    PasswordHashBusyError,
+    aget_password_hash,
+    averify_password,
     create_token,
     decrypt_aes,
-    get_password_hash,
+    is_password_hash_busy,
     parse_token,
-    verify_password,
 )
 from corelib.tasks.email_task_api import (
     send_activation_email_task,
     send_password_reset_email_task,
 )
 from corelib.tasks.helper import new_task_params
+from corelib.user_cache import invalidate_cached_user
 from crud.crud_user import (
     cancel_subscription,
     create_user,
@@ -36,14 +41,33 @@ from schemas.user import User as UserSchema
 router = APIRouter()
 
 
+def _password_hash_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password requests, please retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/login")
 async def h_login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """OAuth2 compatible token login, get an access token for future requests."""
+    if is_password_hash_busy():
+        incr_counter("password_hash.rejected")
+        raise _password_hash_busy_exception()
     user = await get_user_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # release the read connection while bcrypt runs
+    await db.close()
+    try:
+        is_valid = user is not None and await averify_password(
+            form_data.password, user.hashed_password
+        )
+    except PasswordHashBusyError:
+        raise _password_hash_busy_exception()
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -66,24 +90,31 @@ async def h_login(
 
 
 @router.post("/register", response_model=UserSchema)
-async def h_create_user_endpoint(
-    user: UserCreate, db: AsyncSession = Depends(get_sqlite_db)
-):
+async def h_create_user_endpoint(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Create new user."""
     db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Create user
-    new_user = await create_user(db=db, user=user)
-
-    # Send activation email
-    _task_id, task_params = new_task_params(email=user.email)
-    task = send_activation_email_task.apply_async(
-        (task_params,), task_id=_task_id, countdown=3, expires=3600
+    # Create user, the activation email is committed with it to the outbox
+    task_id, task_params = new_task_params(email=user.email)
+    activation_email = new_outbox_message(
+        send_activation_email_task.name,
+        task_id,
+        task_params,
+        countdown=3,
+        expires=3600,
+    )
+    try:
+        new_user = await create_user(
+            db=db, user=user, outbox_messages=[activation_email]
+        )
+    except PasswordHashBusyError:
+        raise _password_hash_busy_exception()
+    notify_outbox()
+    loguru_logger.info(
+        f"Activation email queued for {user.email} with task_id: {task_id}"
     )
-    task_id = task.id
-    loguru_logger.info(f"Activation email sent to {user.email} with task_id: {task_id}")
 
     return new_user
 
@@ -91,7 +122,7 @@ async def h_create_user_endpoint(
 @router.get("/activate")
 async def h_activate_user(
     token: str = Query(..., description="The activation token"),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Activate user account using encrypted token."""
     try:
@@ -115,6 +146,7 @@ async def h_activate_user(
         # Update user's verified status
         user.is_verified = True
         await db.commit()
+        await invalidate_cached_user(user.email)
 
         return {"message": "Account activated successfully"}
     except Exception as exc:
@@ -135,7 +167,7 @@ def h_get_user_profile(current_user: User = Depends(get_current_active_user)):
 async def h_update_user_profile_endpoint(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Update user profile."""
     return await update_user_profile(
@@ -146,7 +178,7 @@ async def h_update_user_profile_endpoint(
 @router.post("/cancel-subscription", response_model=UserSchema)
 async def h_cancel_subscription_endpoint(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Cancel user subscription."""
     return await cancel_subscription(db=db, user_id=current_user.id)
@@ -155,7 +187,7 @@ async def h_cancel_subscription_endpoint(
 @router.delete("/account", response_model=UserSchema)
 async def h_delete_user_account(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Delete user account."""
     return await delete_user(db=db, user_id=current_user.id)
@@ -164,7 +196,7 @@ async def h_delete_user_account(
 @router.post("/request-password-reset")
 async def request_password_reset(
     email: EmailStr = Query(..., description="The email address to reset password for"),
-    db: AsyncSession = Depends(get_sqlite_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Request a password reset email."""
     user = await get_user_by_email(db, email=email)
@@ -179,13 +211,20 @@ async def request_password_reset(
         expires_delta=timedelta(hours=1),
     )
     # Send reset email
-    _task_id, task_params = new_task_params(email=user.email, reset_token=reset_token)
-    task = send_password_reset_email_task.apply_async(
-        (task_params,), task_id=_task_id, countdown=3, expires=3600
+    task_id, task_params = new_task_params(email=user.email, reset_token=reset_token)
+    db.add(
+        new_outbox_message(
+            send_password_reset_email_task.name,
+            task_id,
+            task_params,
+            countdown=3,
+            expires=3600,
+        )
     )
-    task_id = task.id
+    await db.commit()
+    notify_outbox()
     loguru_logger.info(
-        f"Password reset email sent to {user.email} with task_id: {task_id}"
+        f"Password reset email queued for {user.email} with task_id: {task_id}"
     )
 
     return {
@@ -195,7 +234,7 @@ async def request_password_reset(
 
 @router.post("/reset-password")
 async def reset_password(
-    password_reset: PasswordResetRequest, db: AsyncSession = Depends(get_sqlite_db)
+    password_reset: PasswordResetRequest, db: AsyncSession = Depends(get_db)
 ):
     """Reset password using the reset token."""
     # Verify token
@@ -223,7 +262,11 @@ async def reset_password(
         )
 
     # Update password
-    user.hashed_password = get_password_hash(password_reset.new_password)
+    try:
+        user.hashed_password = await aget_password_hash(password_reset.new_password)
+    except PasswordHashBusyError:
+        raise _password_hash_busy_exception()
     await db.commit()
+    await invalidate_cached_user(user.email)
 
     return {"message": "Password has been reset successfully."}
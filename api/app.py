@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -6,8 +7,20 @@ from loguru import logger as loguru_logger
 
 from api.v1.api import api_router
 from corelib.config import settings
-from corelib.db import sqlite_engine
+from corelib.db import (
+    dispose_engines,
+    get_engine,
+    get_sqlite_pragmas,
+    optimize_sqlite,
+    optimize_sqlite_periodically,
+    start_group_commit,
+    stop_group_commit,
+)
+from corelib.due_queue_cache import listen_due_queue_invalidations
 from corelib.loguru_logger import init_global_logger
+from corelib.outbox import start_outbox_relay, stop_outbox_relay
+from corelib.security import shutdown_password_executor
+from corelib.user_cache import listen_user_invalidations
 from middlewares.recover_panic_and_report_latency import RecoverPanicMiddleware
 from models.base import Base
 
@@ -22,12 +35,46 @@ async def lifespan(app: FastAPI):
     )
     loguru_logger.info("Application startup...")
     # Create database tables
-    async with sqlite_engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    is_sqlite = settings.DB_BACKEND == "sqlite"
+    optimize_task = None
+    if is_sqlite:
+        loguru_logger.info(f"SQLite pragmas: {await get_sqlite_pragmas()}")
+        optimize_task = asyncio.create_task(
+            optimize_sqlite_periodically(settings.SQLITE_OPTIMIZE_INTERVAL_SECONDS)
+        )
+        if settings.SQLITE_GROUP_COMMIT:
+            start_group_commit(
+                settings.SQLITE_GROUP_COMMIT_WINDOW_MS,
+                settings.SQLITE_GROUP_COMMIT_MAX_BATCH_SIZE,
+            )
+    start_outbox_relay(
+        settings.OUTBOX_RELAY_INTERVAL_SECONDS,
+        settings.OUTBOX_RELAY_BATCH_SIZE,
+        settings.OUTBOX_MAX_ATTEMPTS,
+    )
+    invalidation_task = None
+    if settings.USER_CACHE_REDIS_ENABLED:
+        invalidation_task = asyncio.create_task(listen_user_invalidations())
+    due_invalidation_task = None
+    if settings.DUE_QUEUE_CACHE_REDIS_ENABLED:
+        due_invalidation_task = asyncio.create_task(listen_due_queue_invalidations())
 
     yield
 
     loguru_logger.info("Application shutdown...")
+    await stop_outbox_relay()
+    if invalidation_task is not None:
+        invalidation_task.cancel()
+    if due_invalidation_task is not None:
+        due_invalidation_task.cancel()
+    if is_sqlite:
+        await stop_group_commit()
+        optimize_task.cancel()
+        await optimize_sqlite()
+    await dispose_engines()
+    shutdown_password_executor()
 
 
 app = FastAPI(
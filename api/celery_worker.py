@@ -2,7 +2,11 @@ import celery
 
 from corelib.config import settings
 from corelib.loguru_logger import init_task_logger
-from corelib.tasks import SendActivationEmailTask, SendPasswordResetEmailTask
+from corelib.tasks import (
+    ImportApkgTask,
+    SendActivationEmailTask,
+    SendPasswordResetEmailTask,
+)
 
 
 def init_runtime_env():
@@ -10,7 +14,11 @@ def init_runtime_env():
 
 
 def init_celery():
-    registered_tasks = [SendActivationEmailTask, SendPasswordResetEmailTask]
+    registered_tasks = [
+        SendActivationEmailTask,
+        SendPasswordResetEmailTask,
+        ImportApkgTask,
+    ]
     celery_inst = celery.Celery(
         __name__,
         broker=settings.CELERY_BROKER_URL,
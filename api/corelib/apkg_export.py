@@ -0,0 +1,430 @@
+import hashlib
+import html
+import json
+import os
+import sqlite3
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger as loguru_logger
+
+from corelib.media_store import MEDIA_CHUNK_BYTES, media_path
+from corelib.word_key import HTML_TAG
+
+# Anki 2.1 的旧版集合格式 (schema 11)，新旧版本的 Anki 都能导入
+APKG_COLLECTION_NAME = "collection.anki2"
+APKG_SCHEMA_VERSION = 11
+# 笔记类型和牌组的 ID，Anki 中为创建时间的毫秒时间戳
+APKG_EXPORT_MODEL_ID = 1704067200000
+APKG_EXPORT_DECK_ID = 1704067200001
+APKG_EXPORT_MODEL_NAME = "Anki AI Card"
+# 笔记字段名与卡片列，字段名与导入时的 APKG_FIELD_ALIASES 对应；
+# Pronunciation 字段为发音文件的 [sound:] 引用，放在其他字段之前，
+# 导入时取第一个 [sound:] 引用作为发音
+APKG_EXPORT_FIELDS = (
+    ("Word", "word"),
+    ("Pronunciation", None),
+    ("Definition", "definition"),
+    ("Phonetic", "us_phonetic_symbols"),
+    ("Example", "example"),
+    ("Notes", "notes"),
+    ("Chinese Definition", "zh_definition"),
+    ("Chinese Example", "zh_example"),
+)
+ANKI_FIELD_SEPARATOR = "\x1f"
+ANKI_DEFAULT_FACTOR = 2500
+
+ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (
+    usn integer not null, oid integer not null, type integer not null
+);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+
+def _anki_models(mod: int) -> Dict[str, Any]:
+    field_names = [name for name, _ in APKG_EXPORT_FIELDS]
+    return {
+        str(APKG_EXPORT_MODEL_ID): {
+            "id": APKG_EXPORT_MODEL_ID,
+            "name": APKG_EXPORT_MODEL_NAME,
+            "type": 0,
+            "mod": mod,
+            "usn": -1,
+            "sortf": 0,
+            "did": APKG_EXPORT_DECK_ID,
+            "tmpls": [
+                {
+                    "name": "Card 1",
+                    "ord": 0,
+                    "qfmt": "{{Word}}<br>{{Phonetic}} {{Pronunciation}}",
+                    "afmt": "{{FrontSide}}<hr id=answer>{{Definition}}"
+                    "<br>{{Chinese Definition}}<br>{{Example}}"
+                    "<br>{{Chinese Example}}<br>{{Notes}}",
+                    "did": None,
+                    "bqfmt": "",
+                    "bafmt": "",
+                }
+            ],
+            "flds": [
+                {
+                    "name": name,
+                    "ord": ord_,
+                    "sticky": False,
+                    "rtl": False,
+                    "font": "Arial",
+                    "size": 20,
+                    "media": [],
+                }
+                for ord_, name in enumerate(field_names)
+            ],
+            "css": ".card { font-family: arial; font-size: 20px; text-align: center; }",
+            "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}"
+            "\n\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n"
+            "\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+            "latexPost": "\\end{document}",
+            "latexsvg": False,
+            "tags": [],
+            "vers": [],
+            "req": [[0, "any", [0]]],
+        }
+    }
+
+
+def _anki_deck(deck_id: int, name: str, mod: int) -> Dict[str, Any]:
+    return {
+        "id": deck_id,
+        "name": name,
+        "desc": "",
+        "mod": mod,
+        "usn": -1,
+        "collapsed": False,
+        "browserCollapsed": False,
+        "dyn": 0,
+        "conf": 1,
+        "extendNew": 10,
+        "extendRev": 50,
+        "newToday": [0, 0],
+        "revToday": [0, 0],
+        "lrnToday": [0, 0],
+        "timeToday": [0, 0],
+    }
+
+
+def _anki_deck_config(mod: int) -> Dict[str, Any]:
+    return {
+        "1": {
+            "id": 1,
+            "name": "Default",
+            "mod": mod,
+            "usn": -1,
+            "dyn": False,
+            "maxTaken": 60,
+            "timer": 0,
+            "autoplay": True,
+            "replayq": True,
+            "new": {
+                "delays": [1, 10],
+                "ints": [1, 4, 7],
+                "initialFactor": ANKI_DEFAULT_FACTOR,
+                "order": 1,
+                "perDay": 20,
+                "bury": True,
+            },
+            "rev": {
+                "perDay": 200,
+                "ease4": 1.3,
+                "fuzz": 0.05,
+                "maxIvl": 36500,
+                "ivlFct": 1,
+                "bury": True,
+                "hardFactor": 1.2,
+            },
+            "lapse": {
+                "delays": [10],
+                "mult": 0,
+                "minInt": 1,
+                "leechFails": 8,
+                "leechAction": 0,
+            },
+        }
+    }
+
+
+def create_collection(db_path: str, deck_name: str) -> Dict[str, Any]:
+    """创建空的 Anki 集合数据库，笔记由 add_notes 分批写入
+
+    Args:
+        db_path: 集合数据库路径
+        deck_name: 导出的牌组名
+
+    Returns:
+        {"conn", "crt", "next_position", "last_note_id"}，传给 add_notes 和
+        close_collection
+    """
+    now = int(time.time())
+    # 到期日以集合创建日为第 0 天
+    crt = int(
+        datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    )
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.executescript(ANKI_SCHEMA)
+    conn.execute(
+        "INSERT INTO col VALUES (1, ?, ?, ?, ?, 0, 0, 0, '{}', ?, ?, ?, '{}')",
+        (
+            crt,
+            now * 1000,
+            now * 1000,
+            APKG_SCHEMA_VERSION,
+            json.dumps(_anki_models(now)),
+            json.dumps(
+                {
+                    "1": _anki_deck(1, "Default", now),
+                    str(APKG_EXPORT_DECK_ID): _anki_deck(
+                        APKG_EXPORT_DECK_ID, deck_name, now
+                    ),
+                }
+            ),
+            json.dumps(_anki_deck_config(now)),
+        ),
+    )
+    return {"conn": conn, "crt": crt, "next_position": 1, "last_note_id": 0}
+
+
+def _note_guid(card_id: int) -> str:
+    # stable per card, importing a later export into Anki updates the notes
+    return hashlib.sha1(f"anki-ai:{card_id}".encode()).hexdigest()[:10]
+
+
+def _card_schedule(
+    collection: Dict[str, Any], review_count: int, next_review: Optional[datetime]
+) -> Tuple[int, int, int, int]:
+    # (type, queue, due, ivl): unreviewed cards are new cards, due by position
+    if not review_count or next_review is None:
+        position = collection["next_position"]
+        collection["next_position"] += 1
+        return 0, 0, position, 0
+    due = max((int(next_review.timestamp()) - collection["crt"]) // 86400, 0)
+    return 2, 2, due, max(due, 1)
+
+
+def add_notes(
+    collection: Dict[str, Any],
+    cards: Sequence[Any],
+    sound_filenames: Dict[str, str],
+):
+    """把一批卡片写入集合数据库，每张卡片对应一条笔记和一张 Anki 卡片
+
+    Args:
+        collection: create_collection 的返回值
+        cards: 卡片行，包含 crud_card.EXPORTED_CARD_COLUMNS
+        sound_filenames: {sha256: 文件名}，用于写入 Pronunciation 字段
+    """
+    now = int(time.time())
+    notes = []
+    anki_cards = []
+    for card in cards:
+        fields = []
+        for name, column in APKG_EXPORT_FIELDS:
+            if column == "word":
+                fields.append(html.escape(card.word or "", quote=False))
+            elif column is not None:
+                fields.append(getattr(card, column) or "")
+            elif card.pronunciation in sound_filenames:
+                fields.append(f"[sound:{sound_filenames[card.pronunciation]}]")
+            else:
+                fields.append("")
+        # note ids are creation times in milliseconds, kept unique and ordered
+        created_ms = int(card.created_at.timestamp() * 1000) if card.created_at else 0
+        note_id = max(created_ms, collection["last_note_id"] + 1)
+        collection["last_note_id"] = note_id
+        sort_field = html.unescape(HTML_TAG.sub("", fields[0])).strip()
+        checksum = int(hashlib.sha1(sort_field.encode()).hexdigest()[:8], 16)
+        tags = f" {card.tags.strip()} " if card.tags and card.tags.strip() else ""
+        notes.append(
+            (
+                note_id,
+                _note_guid(card.id),
+                APKG_EXPORT_MODEL_ID,
+                now,
+                -1,
+                tags,
+                ANKI_FIELD_SEPARATOR.join(fields),
+                sort_field,
+                checksum,
+                0,
+                "",
+            )
+        )
+        card_type, queue, due, interval = _card_schedule(
+            collection, card.review_count, card.next_review
+        )
+        anki_cards.append(
+            (
+                note_id,
+                note_id,
+                APKG_EXPORT_DECK_ID,
+                0,
+                now,
+                -1,
+                card_type,
+                queue,
+                due,
+                interval,
+                ANKI_DEFAULT_FACTOR if card_type else 0,
+                card.review_count or 0,
+                0,
+                0,
+                0,
+                0,
+                0,
+                "",
+            )
+        )
+    conn = collection["conn"]
+    conn.executemany(f"INSERT INTO notes VALUES ({', '.join('?' * 11)})", notes)
+    conn.executemany(f"INSERT INTO cards VALUES ({', '.join('?' * 18)})", anki_cards)
+    conn.commit()
+
+
+def close_collection(collection: Dict[str, Any]):
+    """写入集合配置并关闭集合数据库"""
+    conn = collection["conn"]
+    try:
+        conf = {
+            "nextPos": collection["next_position"],
+            "estTimes": True,
+            "activeDecks": [APKG_EXPORT_DECK_ID],
+            "sortType": "noteFld",
+            "timeLim": 0,
+            "sortBackwards": False,
+            "addToCur": True,
+            "curDeck": APKG_EXPORT_DECK_ID,
+            "newSpread": 0,
+            "dueCounts": True,
+            "curModel": APKG_EXPORT_MODEL_ID,
+            "collapseTime": 1200,
+        }
+        conn.execute("UPDATE col SET conf = ?", (json.dumps(conf),))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class _ZipStream:
+    """zipfile 的输出对象，写入的字节暂存到被取走为止
+
+    没有 seek/tell，zipfile 会为每个文件写入数据描述符，不需要回写文件头。
+    """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _zip_member(name: str, size: int, compress_type: int) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    zinfo.compress_type = compress_type
+    # a known size lets zipfile decide whether the entry needs zip64
+    zinfo.file_size = size
+    return zinfo
+
+
+def iter_apkg_zip(
+    collection_path: str, media: Iterable[Tuple[str, str, int]]
+) -> Iterator[bytes]:
+    """把集合数据库和媒体文件逐块打包为 .apkg，每次产出一块压缩包内容
+
+    内存中最多保留一个分块的压缩输出。同名的媒体文件只打包第一个，
+    存储中缺失的文件被跳过。
+
+    Args:
+        collection_path: close_collection 之后的集合数据库路径
+        media: (文件名, sha256, 字节数)，边打包边读取
+
+    Yields:
+        压缩包内容
+    """
+    stream = _ZipStream()
+    media_mapping = {}
+    exported = set()
+    with zipfile.ZipFile(stream, "w") as zf:
+
+        def write_member(path: str, zinfo: zipfile.ZipInfo):
+            with open(path, "rb") as src, zf.open(zinfo, "w") as dst:
+                while chunk := src.read(MEDIA_CHUNK_BYTES):
+                    dst.write(chunk)
+                    data = stream.pop()
+                    if data:
+                        yield data
+
+        yield from write_member(
+            collection_path,
+            _zip_member(
+                APKG_COLLECTION_NAME,
+                os.path.getsize(collection_path),
+                zipfile.ZIP_DEFLATED,
+            ),
+        )
+        for filename, sha256, size in media:
+            if filename in exported:
+                continue
+            path = media_path(sha256)
+            if not os.path.exists(path):
+                loguru_logger.warning(f"Media {sha256} is missing, not exported")
+                continue
+            # members are named 0, 1, ... and mapped to file names in "media";
+            # audio and images are compressed already
+            member = str(len(media_mapping))
+            yield from write_member(path, _zip_member(member, size, zipfile.ZIP_STORED))
+            media_mapping[member] = filename
+            exported.add(filename)
+        zf.writestr(
+            _zip_member("media", 0, zipfile.ZIP_DEFLATED), json.dumps(media_mapping)
+        )
+    yield stream.pop()
@@ -0,0 +1,167 @@
+import asyncio
+import html
+import itertools
+import re
+import sqlite3
+import zipfile
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from anki_parser import extract_collection, iter_notes, read_metadata
+
+# 笔记字段名到卡片列的映射，按顺序匹配，字段名不区分大小写
+APKG_FIELD_ALIASES = {
+    "word": ("word", "front", "expression", "vocabulary", "单词", "词汇", "正面"),
+    "definition": ("definition", "back", "meaning", "释义", "解释", "背面"),
+    "us_phonetic_symbols": ("phonetic", "ipa", "音标"),
+    "example": ("example", "sentence", "例句"),
+    "notes": ("notes", "note", "extra", "备注", "笔记"),
+    "zh_definition": ("chinese definition", "中文释义"),
+    "zh_example": ("chinese example", "中文例句", "例句翻译"),
+}
+HTML_TAG = re.compile(r"<[^>]+>")
+SOUND_TAG = re.compile(r"\[sound:[^\]]*\]")
+# 笔记字段中引用媒体文件的方式：[sound:a.mp3] 和 <img src="a.jpg">
+MEDIA_REFERENCE = re.compile(
+    r"\[sound:([^\]]+)\]|<img[^>]*\ssrc=[\"']?([^\"'>]+)", re.IGNORECASE
+)
+
+
+def _to_text(content: str) -> str:
+    return html.unescape(HTML_TAG.sub("", SOUND_TAG.sub("", content))).strip()
+
+
+def note_to_card(fields: Dict[str, str], tags: List[str]) -> Optional[Dict[str, Any]]:
+    """把一条 Anki 笔记转换为卡片的列值
+
+    Args:
+        fields: 字段名到字段内容的映射，按笔记类型中的字段顺序排列
+        tags: 笔记标签
+
+    Returns:
+        卡片的列值、media（引用的媒体文件名列表）和 pronunciation（第一个
+        [sound:] 引用的文件名），笔记没有可用的单词时返回 None
+    """
+    by_name = {name.strip().lower(): content for name, content in fields.items()}
+    contents = list(fields.values())
+    card = {}
+    for column, aliases in APKG_FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in by_name:
+                card[column] = by_name[alias]
+                break
+    # notes types without recognizable field names: front, back
+    if "word" not in card and contents:
+        card["word"] = contents[0]
+    if "definition" not in card and len(contents) > 1:
+        card["definition"] = contents[1]
+    card["word"] = _to_text(card.get("word", ""))
+    if not card["word"]:
+        return None
+    card.setdefault("definition", "")
+    card["tags"] = " ".join(tags)
+    media = []
+    pronunciation = None
+    for content in contents:
+        for sound, image in MEDIA_REFERENCE.findall(content):
+            filename = html.unescape(sound or image).strip()
+            if sound and pronunciation is None:
+                pronunciation = filename
+            if filename not in media:
+                media.append(filename)
+    card["media"] = media
+    card["pronunciation"] = pronunciation
+    return card
+
+
+def read_apkg_collection(apkg_path: str, dest_dir: str) -> Optional[Dict[str, Any]]:
+    """解压 .apkg 中的集合数据库并读取元数据，在导入进程池中执行
+
+    Args:
+        apkg_path: .apkg 文件路径
+        dest_dir: 集合数据库的解压目录，由调用方负责清理
+
+    Returns:
+        {"db_path", "models", "note_count"}，文件无法解析时返回 None
+    """
+    try:
+        db_path = extract_collection(apkg_path, dest_dir)
+        if db_path is None:
+            return None
+        metadata = read_metadata(db_path)
+    except (zipfile.BadZipFile, sqlite3.DatabaseError, KeyError, ValueError):
+        return None
+    return {
+        "db_path": db_path,
+        "models": metadata["models"],
+        "note_count": metadata["note_count"],
+    }
+
+
+def read_apkg_cards(
+    db_path: str,
+    models: Dict[str, Any],
+    after_note_id: Optional[int],
+    limit: int,
+) -> Tuple[List[Dict[str, str]], int, Optional[int]]:
+    """读取 after_note_id 之后的 limit 条笔记并转换为卡片，在导入进程池中执行
+
+    Returns:
+        (卡片列值列表, 读取的笔记数, 最后一条笔记的ID)
+    """
+    cards = []
+    n_notes = 0
+    last_note_id = after_note_id
+    notes = iter_notes(db_path, models, after_note_id, fetch_size=limit)
+    for note in itertools.islice(notes, limit):
+        n_notes += 1
+        last_note_id = note["id"]
+        card = note_to_card(note["fields"], note["tags"])
+        if card is not None:
+            cards.append(card)
+    notes.close()
+    return cards, n_notes, last_note_id
+
+
+async def iter_apkg_card_batches(
+    collection: Dict[str, Any],
+    batch_size: int,
+    executor: Executor,
+    after_note_id: Optional[int] = None,
+) -> AsyncIterator[Tuple[List[Dict[str, str]], int, Optional[int]]]:
+    """在指定的执行器中按笔记ID顺序分批读取卡片
+
+    下一批在当前批次被消费（写入数据库）时即开始读取，内存中最多同时存在两批。
+
+    Args:
+        collection: read_apkg_collection 的返回值
+        batch_size: 每批读取的笔记数
+        executor: 读取使用的执行器，如导入 worker 的线程池
+        after_note_id: 从该笔记之后开始读取，用于继续中断的导入
+
+    Yields:
+        (卡片列值列表, 本批读取的笔记数, 本批最后一条笔记的ID)
+    """
+    loop = asyncio.get_running_loop()
+
+    def read_after(note_id: Optional[int]):
+        return loop.run_in_executor(
+            executor,
+            read_apkg_cards,
+            collection["db_path"],
+            collection["models"],
+            note_id,
+            batch_size,
+        )
+
+    pending = read_after(after_note_id)
+    while True:
+        cards, n_notes, last_note_id = await pending
+        if n_notes == 0:
+            break
+        pending = read_after(last_note_id)
+        try:
+            yield cards, n_notes, last_note_id
+        except BaseException:
+            pending.cancel()
+            raise
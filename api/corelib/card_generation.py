@@ -0,0 +1,278 @@
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger as loguru_logger
+from pydantic import ValidationError
+
+from corelib.config import settings
+from corelib.metrics import incr_counter
+from corelib.word_key import normalize_word
+from schemas.card import GeneratedCard
+
+# 输出 JSON 的字段名到卡片字段的映射
+CARD_GENERATION_FIELDS = {
+    "单词": "word",
+    "详细资料": "definition",
+    "英美音标": "us_phonetic_symbols",
+    "中文释义": "zh_definition",
+    "英语例句": "example",
+    "英语例句对应的中文翻译": "zh_example",
+    "笔记": "notes",
+    "标签": "tags",
+}
+# 系统提示词对同一模型的每次调用都相同，多个单词合并到一次调用中，
+# 提示词按批次而不是按单词发送
+CARD_GENERATION_SYSTEM_PROMPT = """
+你是一位非常擅长制作 Anki 记忆卡的大师，尤其擅长制作英文单词及句子类的记忆卡。
+我会给你发送若干个英文单词或句子，每行一个。请为每一行按照<格式>，并参考<示例>制作一张通用格式的 Anki 记忆卡，
+按输入的顺序输出一个 JSON 数组，数组的每个元素是一张记忆卡。
+请注意只需要给出 JSON 数组，不要做任何额外的解释。
+
+<格式>
+[
+    {
+        "单词": "",
+        "详细资料": "",
+        "英美音标": "",
+        "中文释义": "",
+        "英语例句": "",
+        "英语例句对应的中文翻译": "",
+        "笔记": "",
+        "标签": ""
+    }
+]
+</格式>
+
+<示例>
+输入：
+adhere
+输出：
+[
+    {
+        "单词": "adhere",
+        "详细资料": "v. (adheres, adhering, adhered) 1. To stick fast to (a surface or substance). Synonyms: stick, cling, cohere, bond. 2. To believe in and follow the practices of. Synonyms: abide by, stick to, hold to, comply with. Etymology: from Latin 'adhaerere' (ad- 'to' + haerere 'to stick').",
+        "英美音标": "UK: /ədˈhɪə(r)/ US: /ədˈhɪr/",
+        "中文释义": "v. 黏附，附着；遵守，坚持；拥护，支持",
+        "英语例句": "All members must adhere to the club's rules and regulations.",
+        "英语例句对应的中文翻译": "所有成员都必须遵守俱乐部的规章制度。",
+        "笔记": "Common collocation: adhere to (rules, principles, a plan, a belief). It is more formal than 'stick to'.",
+        "标签": "verb formal C1"
+    }
+]
+</示例>
+"""
+JSON_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# 进程内所有生成请求共享的并发上限，第一次使用时创建
+generation_semaphore: Optional[asyncio.Semaphore] = None
+card_provider = None
+
+
+class GeminiCardProvider:
+    """通过 google-genai 的异步客户端调用 Gemini"""
+
+    name = "gemini"
+
+    def __init__(self, max_batch_size: int):
+        # imported on first use, the fake provider needs no SDK
+        from google import genai
+        from google.genai import types
+
+        self.max_batch_size = max_batch_size
+        self._types = types
+        self._client = genai.Client(
+            api_key=settings.GOOGLE_GEMINI_API_KEY,
+            http_options=types.HttpOptions(base_url=settings.GOOGLE_GEMINI_BASE_URL),
+        )
+
+    async def generate(self, system_prompt: str, prompt: str) -> str:
+        response = await self._client.aio.models.generate_content(
+            model=settings.GOOGLE_GEMINI_MODEL,
+            contents=prompt,
+            config=self._types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                response_mime_type="application/json",
+            ),
+        )
+        return response.text or ""
+
+
+class FakeCardProvider:
+    """本地的模拟模型，按提示词中的单词返回固定内容，用于开发和基准测试
+
+    每次调用耗时 latency_seconds + per_word_seconds * 单词数。
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        latency_seconds: float = 0,
+        per_word_seconds: float = 0,
+    ):
+        self.max_batch_size = max_batch_size
+        self.latency_seconds = latency_seconds
+        self.per_word_seconds = per_word_seconds
+        self.n_calls = 0
+        self.n_in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, system_prompt: str, prompt: str) -> str:
+        words = [line.strip() for line in prompt.splitlines() if line.strip()]
+        self.n_calls += 1
+        self.n_in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.n_in_flight)
+        try:
+            await asyncio.sleep(
+                self.latency_seconds + self.per_word_seconds * len(words)
+            )
+        finally:
+            self.n_in_flight -= 1
+        cards = [
+            {
+                "单词": word,
+                "详细资料": f"n. the meaning of '{word}'.",
+                "英美音标": f"/{word}/",
+                "中文释义": f"{word} 的中文释义",
+                "英语例句": f"This sentence uses the word {word}.",
+                "英语例句对应的中文翻译": f"这个句子使用了 {word}。",
+                "笔记": "",
+                "标签": "fake",
+            }
+            for word in words
+        ]
+        return "```json\n" + json.dumps(cards, ensure_ascii=False) + "\n```"
+
+
+CARD_PROVIDERS = {
+    "gemini": GeminiCardProvider,
+    "fake": FakeCardProvider,
+}
+
+
+def get_card_provider():
+    """settings.CARD_GENERATION_PROVIDER 指定的模型，第一次调用时创建"""
+    global card_provider
+    if card_provider is None:
+        card_provider = CARD_PROVIDERS[settings.CARD_GENERATION_PROVIDER](
+            max_batch_size=settings.CARD_GENERATION_BATCH_SIZE
+        )
+    return card_provider
+
+
+def _get_generation_semaphore() -> asyncio.Semaphore:
+    global generation_semaphore
+    if generation_semaphore is None:
+        generation_semaphore = asyncio.Semaphore(
+            settings.CARD_GENERATION_MAX_CONCURRENCY
+        )
+    return generation_semaphore
+
+
+def parse_generated_cards(text: str) -> List[GeneratedCard]:
+    """解析模型输出的 JSON，跳过无法转换为卡片的元素
+
+    Args:
+        text: 模型输出，可以是 JSON 数组或单个对象，允许包含 ```json 代码块标记
+
+    Returns:
+        卡片列表，输出不是合法 JSON 时为空
+    """
+    try:
+        items = json.loads(JSON_CODE_FENCE.sub("", text.strip()))
+    except json.JSONDecodeError:
+        return []
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return []
+    cards = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        values: Dict[str, Any] = {}
+        for key, value in item.items():
+            field = CARD_GENERATION_FIELDS.get(key, key)
+            if field in GeneratedCard.model_fields and value is not None:
+                values[field] = value if isinstance(value, str) else str(value)
+        try:
+            cards.append(GeneratedCard(**values))
+        except ValidationError:
+            continue
+    return cards
+
+
+async def _generate_batch(
+    provider, words: Sequence[str], semaphore: asyncio.Semaphore
+) -> Dict[str, GeneratedCard]:
+    async with semaphore:
+        incr_counter("card_generation.calls")
+        try:
+            text = await asyncio.wait_for(
+                provider.generate(CARD_GENERATION_SYSTEM_PROMPT, "\n".join(words)),
+                settings.CARD_GENERATION_TIMEOUT_SECONDS,
+            )
+        except Exception as exc:
+            loguru_logger.error(
+                f"Failed to generate cards with {provider.name}, err: {exc!r}"
+            )
+            return {}
+    # the model may reorder or re-case the words, match on the word key
+    cards = {}
+    for card in parse_generated_cards(text):
+        cards.setdefault(normalize_word(card.word), card)
+    return cards
+
+
+async def generate_cards(
+    words: Sequence[str],
+    provider=None,
+    max_concurrency: Optional[int] = None,
+) -> Tuple[List[GeneratedCard], List[str]]:
+    """为一组单词生成卡片
+
+    单词去重后按模型允许的批大小分批，每批一次调用，批次并发执行，
+    同时进行的调用数受并发上限限制。
+
+    Args:
+        words: 单词或句子
+        provider: 模型，默认为 get_card_provider()
+        max_concurrency: 本次生成的并发上限，默认使用进程内共享的上限
+            settings.CARD_GENERATION_MAX_CONCURRENCY
+
+    Returns:
+        (按输入顺序排列的卡片, 没有生成卡片的单词)
+    """
+    provider = provider or get_card_provider()
+    semaphore = (
+        asyncio.Semaphore(max_concurrency)
+        if max_concurrency is not None
+        else _get_generation_semaphore()
+    )
+    unique_words = {}
+    for word in words:
+        word = word.strip()
+        if normalize_word(word):
+            unique_words.setdefault(normalize_word(word), word)
+    batch_size = max(provider.max_batch_size, 1)
+    keys = list(unique_words)
+    batches = [
+        keys[start : start + batch_size] for start in range(0, len(keys), batch_size)
+    ]
+    results = await asyncio.gather(
+        *(
+            _generate_batch(provider, [unique_words[key] for key in batch], semaphore)
+            for batch in batches
+        )
+    )
+    generated = {}
+    for cards in results:
+        generated.update(cards)
+    cards = [generated[key] for key in keys if key in generated]
+    failed = [unique_words[key] for key in keys if key not in generated]
+    incr_counter("card_generation.words", len(cards))
+    incr_counter("card_generation.failed_words", len(failed))
+    return cards, failed
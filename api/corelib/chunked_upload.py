@@ -0,0 +1,167 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, AsyncIterable, Dict, Optional
+
+from corelib.config import settings
+
+# 上传ID为 uuid4 的十六进制形式，校验后才能用于拼接路径
+UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+# 分块内容先在内存中攒到该大小再写入磁盘，单个请求最多占用这么多内存
+UPLOAD_WRITE_BYTES = 1024 * 1024
+UPLOAD_META_FILENAME = "meta.json"
+UPLOAD_DATA_FILENAME = "data.part"
+
+
+class UploadOffsetError(Exception):
+    """分块的起始偏移不是已上传的字节数"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadSizeError(Exception):
+    """分块超出了创建上传时声明的文件大小"""
+
+
+def _upload_dir(upload_id: str) -> str:
+    return os.path.join(settings.APKG_UPLOAD_ROOT_PATH, upload_id)
+
+
+def upload_data_path(upload_id: str) -> str:
+    return os.path.join(_upload_dir(upload_id), UPLOAD_DATA_FILENAME)
+
+
+def delete_expired_uploads(max_age_seconds: int):
+    """删除超过 max_age_seconds 没有写入的上传"""
+    if not os.path.isdir(settings.APKG_UPLOAD_ROOT_PATH):
+        return
+    expires_before = time.time() - max_age_seconds
+    for upload_id in os.listdir(settings.APKG_UPLOAD_ROOT_PATH):
+        try:
+            if os.path.getmtime(upload_data_path(upload_id)) < expires_before:
+                delete_upload(upload_id)
+        except FileNotFoundError:
+            pass
+
+
+def create_upload(user_id: int, filename: str, size: int, sha256: str) -> str:
+    """创建一个分块上传
+
+    Args:
+        user_id: 上传者的用户ID
+        filename: 原始文件名
+        size: 文件总字节数
+        sha256: 文件内容的 SHA-256，完成上传时校验
+
+    Returns:
+        str: 上传ID
+    """
+    delete_expired_uploads(settings.APKG_UPLOAD_EXPIRE_SECONDS)
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_upload_dir(upload_id))
+    open(upload_data_path(upload_id), "wb").close()
+    meta = {
+        "user_id": user_id,
+        "filename": filename,
+        "size": size,
+        "sha256": sha256.lower(),
+    }
+    with open(os.path.join(_upload_dir(upload_id), UPLOAD_META_FILENAME), "w") as f:
+        json.dump(meta, f)
+    return upload_id
+
+
+def get_upload(upload_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """读取上传信息，offset 为已写入磁盘的字节数
+
+    Returns:
+        上传信息，上传不存在或不属于该用户时返回 None
+    """
+    if not UPLOAD_ID.fullmatch(upload_id):
+        return None
+    try:
+        with open(os.path.join(_upload_dir(upload_id), UPLOAD_META_FILENAME)) as f:
+            meta = json.load(f)
+        offset = os.path.getsize(upload_data_path(upload_id))
+    except FileNotFoundError:
+        return None
+    if meta["user_id"] != user_id:
+        return None
+    return {**meta, "upload_id": upload_id, "offset": offset}
+
+
+async def write_chunk(
+    upload: Dict[str, Any], offset: int, chunks: AsyncIterable[bytes]
+) -> int:
+    """把一个分块追加到上传文件末尾
+
+    连接中断时已收到的字节仍会写入，客户端查询 offset 后从断点继续。
+    同一上传同时只允许一个写入，持有文件锁期间到达的分块直接返回冲突。
+
+    Args:
+        upload: get_upload 的返回值
+        offset: 分块在文件中的起始位置，必须等于已上传的字节数
+        chunks: 分块内容，如 Request.stream()
+
+    Returns:
+        int: 写入后已上传的字节数
+
+    Raises:
+        UploadOffsetError: offset 与已上传的字节数不符，或另一个分块正在写入
+        UploadSizeError: 分块超出声明的文件大小
+    """
+    path = upload_data_path(upload["upload_id"])
+    with open(path, "ab") as f:
+        # one writer per upload, across worker processes too; a concurrent
+        # chunk is rejected with the offset as it is now instead of waiting
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadOffsetError(os.fstat(f.fileno()).st_size)
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadOffsetError(current)
+        buffer = bytearray()
+        size = offset
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > upload["size"]:
+                    raise UploadSizeError(f"Upload is {upload['size']} bytes")
+                buffer += chunk
+                if len(buffer) >= UPLOAD_WRITE_BYTES:
+                    await asyncio.to_thread(f.write, buffer)
+                    buffer = bytearray()
+        except UploadSizeError:
+            # drop the rejected chunk, the upload stays at its offset
+            f.flush()
+            f.truncate(offset)
+            raise
+        finally:
+            if buffer and size <= upload["size"]:
+                await asyncio.to_thread(f.write, buffer)
+        return f.tell()
+
+
+def verify_upload(upload: Dict[str, Any]) -> bool:
+    """检查上传是否完整且内容与声明的 SHA-256 一致，逐块读取文件"""
+    path = upload_data_path(upload["upload_id"])
+    if os.path.getsize(path) != upload["size"]:
+        return False
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_WRITE_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest() == upload["sha256"]
+
+
+def delete_upload(upload_id: str):
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
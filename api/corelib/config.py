@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 
 from fastapi.security.api_key import APIKeyHeader
 from loguru import logger as loguru_logger
@@ -15,6 +15,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    PASSWORD_HASH_WORKERS: int
+    PASSWORD_HASH_MAX_PENDING: int
     # Misc
     FRONTEND_URL: str
     RECORD_REQUEST_LATENCY: bool
@@ -30,10 +32,41 @@ class Settings(BaseSettings):
     CELERY_WORKER_LOG_LEVEL: str
     CELERY_WORKER_LOG_PRINTER: str
     CELERY_WORKER_LOG_PRINTER_FILENAME: str
+    # Anki import
+    APKG_IMPORT_BATCH_SIZE: int
+    APKG_IMPORT_MAX_BYTES: int
+    APKG_UPLOAD_ROOT_PATH: str
+    APKG_UPLOAD_EXPIRE_SECONDS: int
+    APKG_IMPORT_JOB_ROOT_PATH: str
+    APKG_IMPORT_JOB_MAX_ATTEMPTS: int
+    APKG_EXPORT_BATCH_SIZE: int
+    MEDIA_ROOT_PATH: str
+    CARD_MERGE_POLICY: Literal["keep", "overwrite", "fill_empty"]
+    CARD_GENERATION_PROVIDER: Literal["gemini", "fake"]
+    CARD_GENERATION_BATCH_SIZE: int
+    CARD_GENERATION_MAX_CONCURRENCY: int
+    CARD_GENERATION_TIMEOUT_SECONDS: float
+    # Database
+    DB_BACKEND: Literal["sqlite", "mysql", "postgresql"]
     # Sqlite
     SQLALCHEMY_DATABASE_URL: str
+    SQLITE_JOURNAL_MODE: str
+    SQLITE_SYNCHRONOUS: str
+    SQLITE_BUSY_TIMEOUT_MS: int
+    SQLITE_CACHE_SIZE_KIB: int
+    SQLITE_MMAP_SIZE_BYTES: int
+    SQLITE_TEMP_STORE: str
+    SQLITE_OPTIMIZE_INTERVAL_SECONDS: int
+    SQLITE_GROUP_COMMIT: bool
+    SQLITE_GROUP_COMMIT_WINDOW_MS: int
+    SQLITE_GROUP_COMMIT_MAX_BATCH_SIZE: int
+    # Database pools
+    DB_WRITE_POOL_SIZE: int
+    DB_READ_POOL_SIZE: int
+    DB_POOL_TIMEOUT_SECONDS: int
     # MySQL
     MYSQL_SERVER_ENDPOINT: str
+    MYSQL_READ_SERVER_ENDPOINT: str
     MYSQL_USERNAME: str
     MYSQL_PASSWORD: str
     MYSQL_DATABASE: str
@@ -41,6 +74,7 @@ class Settings(BaseSettings):
     MYSQL_COLLATION: str
     # PostgreSQL
     POSTGRES_SERVER_ENDPOINT: str
+    POSTGRES_READ_SERVER_ENDPOINT: str
     POSTGRES_USERNAME: str
     POSTGRES_PASSWORD: str
     POSTGRES_DATABASE: str
@@ -50,9 +84,14 @@ class Settings(BaseSettings):
     REDIS_SERVER_ENDPOINT: str
     REDIS_PASSWORD: str
     REDIS_CACHE_DB: int
+    USER_CACHE_REDIS_ENABLED: bool
+    DUE_QUEUE_CACHE_REDIS_ENABLED: bool
     # Celery
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND_URL: str
+    OUTBOX_RELAY_INTERVAL_SECONDS: int
+    OUTBOX_RELAY_BATCH_SIZE: int
+    OUTBOX_MAX_ATTEMPTS: int
     # Email
     EMAIL_SENDER: str
     EMAIL_ATTACH_FILE_ROOT_PATH: str
@@ -1,60 +1,394 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger as loguru_logger
+from sqlalchemy import event, insert, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from corelib.config import settings
+from corelib.metrics import incr_counter
+
+# 每个 SQLite 连接建立时应用的 PRAGMA，按顺序执行
+# - journal_mode=WAL: 读写互不阻塞，写入只追加 WAL 文件
+# - synchronous=NORMAL: WAL 模式下只在 checkpoint 时 fsync，断电最多丢失最近的事务，不会损坏数据库
+# - busy_timeout: 写锁被占用时等待而不是立即返回 SQLITE_BUSY
+# - cache_size: 负数表示以 KiB 为单位的页缓存大小
+# - mmap_size: 通过内存映射读取数据库文件，减少 read() 系统调用
+# - temp_store=MEMORY: 排序、临时索引等临时表放在内存中
+SQLITE_PRAGMAS = {
+    "journal_mode": settings.SQLITE_JOURNAL_MODE,
+    "synchronous": settings.SQLITE_SYNCHRONOUS,
+    "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": -settings.SQLITE_CACHE_SIZE_KIB,
+    "mmap_size": settings.SQLITE_MMAP_SIZE_BYTES,
+    "temp_store": settings.SQLITE_TEMP_STORE,
+}
+
+
+def timed_pool_class(name: str):
+    """返回记录连接等待时间的连接池类
+
+    等待时间累加到 db.<name>.pool_wait_seconds，获取次数累加到
+    db.<name>.pool_checkouts，两者相除即为平均等待时间。
+    """
+
+    class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            st = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                incr_counter(f"db.{name}.pool_wait_seconds", time.perf_counter() - st)
+                incr_counter(f"db.{name}.pool_checkouts")
+
+    return TimedAsyncAdaptedQueuePool
+
+
+def create_pooled_engine(url: str, name: str, pool_size: int, **kwargs):
+    return create_async_engine(
+        url,
+        poolclass=timed_pool_class(name),
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        echo=False,  # echo=True to print SQL
+        future=True,  # future=True to use SQLAlchemy 2.0 features
+        **kwargs,
+    )
+
+
+# Backends: 每个后端按角色（write / read）给出连接地址。引擎在第一次使用时才创建，
+# 未使用的后端不会导入其驱动（aiomysql / asyncpg）。
+# SQLite 的写连接和读连接分属两个连接池：WAL 模式下读不阻塞写，只读请求不必和写请求争抢连接
+def _sqlite_url(role: str) -> str:
+    return settings.SQLALCHEMY_DATABASE_URL.replace(
+        "sqlite:///", "sqlite+aiosqlite:///"
+    )
+
+
+def _mysql_url(role: str) -> str:
+    endpoint = (
+        settings.MYSQL_READ_SERVER_ENDPOINT
+        if role == "read"
+        else settings.MYSQL_SERVER_ENDPOINT
+    )
+    return f"mysql+aiomysql://{settings.MYSQL_USERNAME}:{settings.MYSQL_PASSWORD}@{endpoint}/{settings.MYSQL_DATABASE}"
+
+
+def _postgresql_url(role: str) -> str:
+    endpoint = (
+        settings.POSTGRES_READ_SERVER_ENDPOINT
+        if role == "read"
+        else settings.POSTGRES_SERVER_ENDPOINT
+    )
+    return f"postgresql+asyncpg://{settings.POSTGRES_USERNAME}:{settings.POSTGRES_PASSWORD}@{endpoint}/{settings.POSTGRES_DATABASE}"
+
+
+DB_BACKENDS: Dict[str, Callable[[str], str]] = {
+    "sqlite": _sqlite_url,
+    "mysql": _mysql_url,
+    "postgresql": _postgresql_url,
+}
+
+# (backend, role) -> 已创建的引擎 / 会话工厂
+engines: Dict[Tuple[str, str], AsyncEngine] = {}
+session_locals: Dict[Tuple[str, str], async_sessionmaker] = {}
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def apply_sqlite_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def get_engine(backend: Optional[str] = None, role: str = "write") -> AsyncEngine:
+    """获取数据库引擎，第一次调用时创建
+
+    Args:
+        backend: 后端名称，默认为 settings.DB_BACKEND
+        role: write 或 read
+
+    Returns:
+        数据库引擎
+    """
+    backend = backend or settings.DB_BACKEND
+    engine = engines.get((backend, role))
+    if engine is not None:
+        return engine
+    if backend not in DB_BACKENDS:
+        raise ValueError(f"Unknown database backend: {backend}")
+    kwargs = {}
+    if backend == "sqlite":
+        kwargs["connect_args"] = {"check_same_thread": False}
+    engine = create_pooled_engine(
+        DB_BACKENDS[backend](role),
+        backend if role == "write" else f"{backend}_{role}",
+        settings.DB_READ_POOL_SIZE if role == "read" else settings.DB_WRITE_POOL_SIZE,
+        **kwargs,
+    )
+    if backend == "sqlite":
+        event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+        if role == "read":
+            event.listen(engine.sync_engine, "connect", apply_sqlite_query_only)
+    engines[(backend, role)] = engine
+    return engine
+
+
+def get_session_local(
+    backend: Optional[str] = None, role: str = "write"
+) -> async_sessionmaker:
+    """获取数据库会话工厂，第一次调用时创建对应的引擎"""
+    backend = backend or settings.DB_BACKEND
+    session_local = session_locals.get((backend, role))
+    if session_local is None:
+        session_local = async_sessionmaker(
+            bind=get_engine(backend, role),
+            class_=AsyncSession,
+            autoflush=False,  # autoflush=True to automatically flush changes to the database
+            expire_on_commit=False,  # expire_on_commit=True to expire objects after commit, False to keep objects alive until the session is closed
+        )
+        session_locals[(backend, role)] = session_local
+    return session_local
+
+
+async def dispose_engines():
+    """关闭所有已创建的引擎及其连接池"""
+    for engine in engines.values():
+        await engine.dispose()
+    engines.clear()
+    session_locals.clear()
 
-# Sqlite
-sqlite_engine = create_async_engine(
-    settings.SQLALCHEMY_DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///"),
-    connect_args={"check_same_thread": False},
-    echo=False,  # echo=True to print SQL
-    future=True,  # future=True to use SQLAlchemy 2.0 features
-)
-AsyncSqliteSessionLocal = async_sessionmaker(
-    bind=sqlite_engine,
-    class_=AsyncSession,
-    autoflush=False,  # autoflush=True to automatically flush changes to the database
-    expire_on_commit=False,  # expire_on_commit=True to expire objects after commit, False to keep objects alive until the session is closed
-)
+
+async def get_sqlite_pragmas() -> Dict[str, str]:
+    """获取当前连接上实际生效的 PRAGMA，用于启动时确认配置"""
+    pragmas = {}
+    async with get_engine("sqlite").connect() as conn:
+        for name in SQLITE_PRAGMAS:
+            pragmas[name] = str(await conn.scalar(text(f"PRAGMA {name}")))
+    return pragmas
+
+
+async def optimize_sqlite():
+    """执行 PRAGMA optimize，让 SQLite 按需更新查询规划器的统计信息"""
+    async with get_engine("sqlite").connect() as conn:
+        await conn.execute(text("PRAGMA optimize"))
+
+
+async def optimize_sqlite_periodically(interval_seconds: int):
+    """每隔 interval_seconds 秒执行一次 PRAGMA optimize，直到任务被取消"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await optimize_sqlite()
+        except Exception as exc:
+            loguru_logger.warning(f"Failed to optimize sqlite, err: {exc}")
 
 
 # Dependency
-async def get_sqlite_db():
-    async with AsyncSqliteSessionLocal() as session:
+def insert_ignore(db: AsyncSession, model):
+    """按方言构造跳过唯一键冲突行的 INSERT"""
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert(model).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql_insert(model).on_conflict_do_nothing()
+    return insert(model).prefix_with("IGNORE")
+
+
+def insert_or_update(
+    db: AsyncSession,
+    model,
+    index_elements: List[str],
+    update_columns: Callable[[Any], Dict[str, Any]],
+):
+    """按方言构造唯一键冲突时更新已有行的 INSERT
+
+    Args:
+        db: 数据库会话
+        model: 插入的模型
+        index_elements: 冲突判断使用的唯一键列（MySQL 使用表上的所有唯一键）
+        update_columns: 以待插入的行（excluded / inserted）调用，返回 SET 子句
+    """
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        statement = (sqlite_insert if dialect == "sqlite" else postgresql_insert)(model)
+        return statement.on_conflict_do_update(
+            index_elements=index_elements, set_=update_columns(statement.excluded)
+        )
+    statement = mysql_insert(model)
+    return statement.on_duplicate_key_update(update_columns(statement.inserted))
+
+
+async def get_db():
+    """settings.DB_BACKEND 指定的后端的读写会话"""
+    async with get_session_local()() as session:
         try:
             yield session
         finally:
             await session.close()
 
 
-# MySQL
-mysql_database_url = f"mysql+aiomysql://{settings.MYSQL_USERNAME}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_SERVER_ENDPOINT}/{settings.MYSQL_DATABASE}"
-mysql_engine = create_async_engine(mysql_database_url, echo=False, future=True)
-AsyncMysqlSessionLocal = async_sessionmaker(
-    bind=mysql_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
-)
-
-
-async def get_mysql_db():
-    async with AsyncMysqlSessionLocal() as session:
+async def get_read_db():
+    """settings.DB_BACKEND 指定的后端的只读会话，用于不写入数据库的接口"""
+    async with get_session_local(role="read")() as session:
         try:
             yield session
         finally:
             await session.close()
 
 
-# PostgreSQL
-postgresql_database_url = f"postgresql+asyncpg://{settings.POSTGRES_USERNAME}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_SERVER_ENDPOINT}/{settings.POSTGRES_DATABASE}"
-postgresql_engine = create_async_engine(
-    postgresql_database_url, echo=False, future=True
-)
-AsyncPostgresqlSessionLocal = async_sessionmaker(
-    bind=postgresql_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
-)
+# Group commit: 单写者任务把几毫秒内到达的写入合并到一个事务中提交，
+# 每个写入单元在自己的 SAVEPOINT 中执行，失败只回滚该单元。
+WriteUnit = Callable[[AsyncSession], Awaitable[Any]]
+write_queue: Optional["asyncio.Queue[Tuple[WriteUnit, asyncio.Future]]"] = None
+writer_task: Optional[asyncio.Task] = None
+
 
+def is_group_commit_enabled() -> bool:
+    return writer_task is not None
 
-async def get_postgresql_db():
-    async with AsyncPostgresqlSessionLocal() as session:
+
+async def submit_write(unit: WriteUnit) -> Any:
+    """提交一个写入单元，等待其所在的批次提交后返回结果
+
+    Args:
+        unit: 接收数据库会话的协程函数，不能自行 commit 或 rollback
+
+    Returns:
+        unit 的返回值，unit 或批次提交失败时抛出对应的异常
+    """
+    if writer_task is None:
+        raise RuntimeError("Group commit is not started")
+    future = asyncio.get_running_loop().create_future()
+    await write_queue.put((unit, future))
+    return await future
+
+
+async def _commit_batch(
+    session_local: async_sessionmaker,
+    batch: List[Tuple[WriteUnit, asyncio.Future]],
+):
+    done = []
+    async with session_local() as session:
         try:
-            yield session
-        finally:
-            await session.close()
+            # pysqlite only opens a transaction before DML, so without an
+            # explicit BEGIN the first SAVEPOINT would start the transaction
+            # and its RELEASE would commit it
+            await session.execute(text("BEGIN IMMEDIATE"))
+            for unit, future in batch:
+                if future.cancelled():
+                    continue
+                try:
+                    async with session.begin_nested():
+                        result = await unit(session)
+                    done.append((future, result))
+                except Exception as exc:
+                    future.set_exception(exc)
+            await session.commit()
+        except Exception as exc:
+            await session.rollback()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+    incr_counter("group_commit.batches")
+    incr_counter("group_commit.writes", len(done))
+    for future, result in done:
+        if not future.done():
+            future.set_result(result)
+
+
+async def _run_writer(
+    queue: asyncio.Queue,
+    session_local: async_sessionmaker,
+    window_seconds: float,
+    max_batch_size: int,
+):
+    # a None item stops the writer once everything queued before it is committed
+    loop = asyncio.get_running_loop()
+    is_stopping = False
+    while not is_stopping:
+        item = await queue.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = loop.time() + window_seconds
+        while len(batch) < max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                is_stopping = True
+                break
+            batch.append(item)
+        try:
+            await _commit_batch(session_local, batch)
+        except Exception as exc:
+            loguru_logger.error(f"Failed to commit write batch, err: {exc}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+
+def start_group_commit(
+    window_ms: int,
+    max_batch_size: int,
+    session_local: Optional[async_sessionmaker] = None,
+):
+    """启动单写者任务
+
+    Args:
+        window_ms: 批次收集窗口（毫秒），从批次的第一个写入到达开始计时
+        max_batch_size: 单个批次的最大写入数
+        session_local: 写者使用的会话工厂，默认为 SQLite 的读写会话工厂
+    """
+    global write_queue, writer_task
+    if writer_task is not None:
+        return
+    write_queue = asyncio.Queue()
+    writer_task = asyncio.create_task(
+        _run_writer(
+            write_queue,
+            session_local or get_session_local("sqlite"),
+            window_ms / 1000,
+            max_batch_size,
+        )
+    )
+
+
+async def stop_group_commit():
+    """提交已排队的写入后停止单写者任务"""
+    global write_queue, writer_task
+    if writer_task is None:
+        return
+    task, queue = writer_task, write_queue
+    # new writes go straight to the caller's session from now on
+    writer_task = None
+    await queue.put(None)
+    await task
+    write_queue = None
@@ -0,0 +1,285 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger as loguru_logger
+
+from corelib.config import settings
+from corelib.metrics import incr_counter, set_gauge
+
+# 所有缓存队列的条目总数上限，超出后按 LRU 淘汰整个用户的队列；
+# 每个条目占 32 字节（四个 int64），默认约 64 MB
+DUE_QUEUE_CACHE_MAX_ENTRIES = 2_000_000
+# 缓存条目的有效期（秒），用于兜底其他进程（如 Celery worker）写入的卡片
+DUE_QUEUE_CACHE_TTL_SECONDS = 300
+# 未命中时加载的队列条目数上限，到期卡片更多的用户只缓存最早到期的部分，
+# 超出部分的分页由数据库查询
+DUE_QUEUE_FILL_MAX_ENTRIES = 5000
+# 其他进程（如导入 worker）批量写入卡片后发布用户ID，各 API 进程丢弃该用户的队列
+DUE_QUEUE_REDIS_CHANNEL = "anki_ai:due_queue:invalidate"
+# 记录写入代数的用户数上限，只需覆盖一次队列加载期间发生写入的用户
+DUE_QUEUE_GENERATION_MAX_USERS = 65536
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# user_id -> 待复习队列。队列包含在 horizon 之前到期的全部卡片，以两个平行的 int64
+# 数组保存 (next_review, card_id)，按升序排列，支持二分查找实现游标分页；
+# 另有按 card_id 排序的 (card_id, next_review) 两个数组，用于按卡片ID定位条目。
+due_queues: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+due_queue_entries = 0
+# user_id -> 最近一次写入的代数。加载队列前记下代数，加载期间发生写入时
+# （代数变化）丢弃读到的快照，避免刚复习过的卡片在有效期内一直显示为待复习
+due_queue_generations: "OrderedDict[int, int]" = OrderedDict()
+_generations = count(1)
+
+
+def _to_key(next_review: Union[datetime, str]) -> int:
+    if isinstance(next_review, str):
+        # raw SQLite text, fromisoformat is much cheaper than the ORM's regex
+        next_review = datetime.fromisoformat(next_review)
+    if next_review.tzinfo is not None:
+        next_review = next_review.astimezone().replace(tzinfo=None)
+    return (next_review - _EPOCH) // _MICROSECOND
+
+
+def _position(queue: Dict[str, Any], key: int, card_id: int) -> int:
+    # index of the first entry greater than (key, card_id)
+    next_reviews, card_ids = queue["next_reviews"], queue["card_ids"]
+    lo = int(np.searchsorted(next_reviews, key, "left"))
+    hi = int(np.searchsorted(next_reviews, key, "right"))
+    return lo + int(np.searchsorted(card_ids[lo:hi], card_id, "right"))
+
+
+def _report_size():
+    set_gauge("due_queue_cache.users", len(due_queues))
+    set_gauge("due_queue_cache.entries", due_queue_entries)
+
+
+def _drop_queue(user_id: int) -> bool:
+    global due_queue_entries
+    queue = due_queues.pop(user_id, None)
+    if queue is None:
+        return False
+    due_queue_entries -= len(queue["card_ids"])
+    return True
+
+
+def _bump_generation(user_id: int):
+    due_queue_generations[user_id] = next(_generations)
+    due_queue_generations.move_to_end(user_id)
+    while len(due_queue_generations) > DUE_QUEUE_GENERATION_MAX_USERS:
+        due_queue_generations.popitem(last=False)
+
+
+def due_queue_generation(user_id: int) -> int:
+    """获取用户当前的写入代数，在读取队列数据之前调用，传给 load_due_queue"""
+    return due_queue_generations.get(user_id, 0)
+
+
+def due_queue_horizon() -> datetime:
+    """新加载的队列需要包含的最晚到期时间，之后到期的卡片在队列过期前不会用到"""
+    return datetime.now() + timedelta(seconds=DUE_QUEUE_CACHE_TTL_SECONDS)
+
+
+def lookup_due_queue(user_id: int) -> Optional[Dict[str, Any]]:
+    """获取用户的待复习队列，未命中或已过期时返回 None"""
+    queue = due_queues.get(user_id)
+    if queue is not None and queue["expires_at"] <= time.time():
+        _drop_queue(user_id)
+        _report_size()
+        queue = None
+    if queue is None:
+        incr_counter("due_queue_cache.misses")
+        return None
+    due_queues.move_to_end(user_id)
+    incr_counter("due_queue_cache.hits")
+    return queue
+
+
+def load_due_queue(
+    user_id: int,
+    rows: Iterable[Tuple[Optional[Union[datetime, str]], int]],
+    generation: int,
+    horizon: datetime,
+) -> Dict[str, Any]:
+    """用数据库中的 (next_review, card_id) 填充用户的待复习队列
+
+    读取数据期间用户有写入（代数变化）时，队列只返回给本次调用而不缓存。
+    rows 达到 DUE_QUEUE_FILL_MAX_ENTRIES 条时视为被截断，队列的 horizon
+    提前到最后一条之前。
+
+    Args:
+        user_id: 用户ID
+        rows: 用户在 horizon 之前到期的卡片按 (next_review, card_id) 排序的
+            前 DUE_QUEUE_FILL_MAX_ENTRIES 条，next_review 可以是 ISO 格式字符串
+        generation: 读取数据之前 due_queue_generation 的返回值
+        horizon: 读取数据时使用的 due_queue_horizon，也是队列的过期时间
+
+    Returns:
+        待复习队列
+    """
+    global due_queue_entries
+    entries = [(next_review, card_id) for next_review, card_id in rows if next_review]
+    next_reviews, card_ids = zip(*entries) if entries else ((), ())
+    if all(isinstance(next_review, str) for next_review in next_reviews):
+        # numpy parses ISO strings in bulk, about 4x faster than per row
+        keys = np.array(next_reviews, dtype="datetime64[us]").astype(np.int64)
+    else:
+        keys = np.fromiter(map(_to_key, next_reviews), np.int64, len(next_reviews))
+    ids = np.array(card_ids, dtype=np.int64)
+    horizon_key = _to_key(horizon)
+    if len(ids) >= DUE_QUEUE_FILL_MAX_ENTRIES:
+        # cards tied with the last row read may be missing
+        horizon_key = int(keys.max()) - 1
+        kept = keys <= horizon_key
+        keys, ids = keys[kept], ids[kept]
+    order = np.lexsort((ids, keys))
+    by_id = np.argsort(ids, kind="stable")
+    queue = {
+        "next_reviews": keys[order],
+        "card_ids": ids[order],
+        "ids_by_id": ids[by_id],
+        "next_reviews_by_id": keys[by_id],
+        "horizon": horizon_key,
+        "expires_at": horizon.timestamp(),
+    }
+    if due_queue_generation(user_id) != generation:
+        incr_counter("due_queue_cache.stale_fills")
+        return queue
+    if len(ids) > DUE_QUEUE_CACHE_MAX_ENTRIES:
+        return queue
+    _drop_queue(user_id)
+    due_queues[user_id] = queue
+    due_queue_entries += len(ids)
+    while due_queue_entries > DUE_QUEUE_CACHE_MAX_ENTRIES:
+        _drop_queue(next(iter(due_queues)))
+        incr_counter("due_queue_cache.evictions")
+    _report_size()
+    return queue
+
+
+def due_card_ids(
+    queue: Dict[str, Any],
+    now: datetime,
+    skip: int = 0,
+    limit: int = 100,
+    after_next_review: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+) -> Optional[List[int]]:
+    """按 (next_review, card_id) 顺序获取已到期的卡片ID
+
+    Args:
+        queue: 待复习队列
+        now: 参考时间
+        skip: 跳过的条数
+        limit: 返回的最大条数
+        after_next_review: 游标，上一页最后一张卡片的下次复习时间
+        after_id: 游标，上一页最后一张卡片的ID
+
+    Returns:
+        卡片ID列表；这一页超出了队列包含的卡片时返回 None，需要查询数据库
+    """
+    start = 0
+    if after_next_review is not None and after_id is not None:
+        start = _position(queue, _to_key(after_next_review), after_id)
+    start += skip
+    now_key = _to_key(now)
+    end = int(np.searchsorted(queue["next_reviews"], now_key, "right"))
+    if start + limit > end and now_key > queue["horizon"]:
+        # cards due after the horizon are not in the queue
+        return None
+    end = min(start + limit, end)
+    return queue["card_ids"][start:end].tolist() if start < end else []
+
+
+def upsert_due_card(user_id: int, card_id: int, next_review: Optional[datetime]):
+    """卡片写入后更新已缓存的队列，未缓存的用户会在下次读取时加载"""
+    global due_queue_entries
+    _bump_generation(user_id)
+    queue = due_queues.get(user_id)
+    if queue is None:
+        return
+    ids_by_id = queue["ids_by_id"]
+    i = int(np.searchsorted(ids_by_id, card_id))
+    if i < len(ids_by_id) and ids_by_id[i] == card_id:
+        index = _position(queue, int(queue["next_reviews_by_id"][i]), card_id) - 1
+        queue["next_reviews"] = np.delete(queue["next_reviews"], index)
+        queue["card_ids"] = np.delete(queue["card_ids"], index)
+        queue["ids_by_id"] = np.delete(ids_by_id, i)
+        queue["next_reviews_by_id"] = np.delete(queue["next_reviews_by_id"], i)
+        due_queue_entries -= 1
+    if next_review is None:
+        return
+    key = _to_key(next_review)
+    if key > queue["horizon"]:
+        # not due before the queue expires
+        return
+    index = _position(queue, key, card_id)
+    queue["next_reviews"] = np.insert(queue["next_reviews"], index, key)
+    queue["card_ids"] = np.insert(queue["card_ids"], index, card_id)
+    queue["ids_by_id"] = np.insert(queue["ids_by_id"], i, card_id)
+    queue["next_reviews_by_id"] = np.insert(queue["next_reviews_by_id"], i, key)
+    due_queue_entries += 1
+
+
+def invalidate_due_queue(user_id: int):
+    """丢弃用户的待复习队列，用于批量写入等无法逐条更新的场景"""
+    _bump_generation(user_id)
+    if _drop_queue(user_id):
+        _report_size()
+
+
+def _connect_redis():
+    # a new client per caller: the import worker runs each job in its own
+    # event loop
+    from redis import asyncio as aioredis
+
+    return aioredis.Redis.from_url(
+        f"redis://:{settings.REDIS_PASSWORD}@{settings.REDIS_SERVER_ENDPOINT}/{settings.REDIS_CACHE_DB}",
+        decode_responses=True,
+    )
+
+
+async def publish_due_queue_invalidation(user_id: int):
+    """在 API 之外的进程写入卡片后丢弃用户的待复习队列，开启 Redis 时通知
+    所有 API 进程；未开启时其他进程的队列在有效期结束后重新加载"""
+    invalidate_due_queue(user_id)
+    if not settings.DUE_QUEUE_CACHE_REDIS_ENABLED:
+        return
+    redis_client = _connect_redis()
+    try:
+        await redis_client.publish(DUE_QUEUE_REDIS_CHANNEL, user_id)
+    except Exception as exc:
+        loguru_logger.warning(f"Failed to invalidate due queue cache, err: {exc}")
+    finally:
+        await redis_client.aclose()
+
+
+async def listen_due_queue_invalidations():
+    """订阅其他进程发布的失效通知，直到任务被取消"""
+    redis_client = _connect_redis()
+    try:
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(DUE_QUEUE_REDIS_CHANNEL)
+                # drop whatever may have been missed while unsubscribed
+                for user_id in list(due_queues):
+                    invalidate_due_queue(user_id)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        invalidate_due_queue(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                loguru_logger.warning(f"Due queue subscription lost, err: {exc}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+    finally:
+        await redis_client.aclose()
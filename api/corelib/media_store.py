@@ -0,0 +1,113 @@
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from typing import IO, Dict, Tuple
+
+from anki_parser import iter_media_members
+from corelib.config import settings
+
+# 流式复制和计算哈希时每次读取的字节数
+MEDIA_CHUNK_BYTES = 1024 * 1024
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+# 可以按原类型内联返回的媒体类型。文件名由上传者控制，其他类型（HTML、SVG、
+# JavaScript 等）在 API 的源下内联返回会造成存储型 XSS，一律作为附件下载
+INLINE_CONTENT_TYPES = frozenset(
+    {
+        "audio/aac",
+        "audio/flac",
+        "audio/mp4",
+        "audio/mpeg",
+        "audio/ogg",
+        "audio/wav",
+        "audio/webm",
+        "audio/x-wav",
+        "image/avif",
+        "image/bmp",
+        "image/gif",
+        "image/jpeg",
+        "image/png",
+        "image/webp",
+    }
+)
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+
+def media_path(sha256: str) -> str:
+    """媒体文件的存储路径，按哈希前四位分两级目录，避免单个目录下文件过多"""
+    return os.path.join(settings.MEDIA_ROOT_PATH, sha256[:2], sha256[2:4], sha256)
+
+
+def is_inline_content_type(content_type: str) -> bool:
+    return content_type in INLINE_CONTENT_TYPES
+
+
+def guess_content_type(filename: str) -> str:
+    """按文件名猜测媒体类型，不在 INLINE_CONTENT_TYPES 中的类型视为二进制文件"""
+    content_type, _ = mimetypes.guess_type(filename)
+    if content_type is None or not is_inline_content_type(content_type):
+        return DEFAULT_CONTENT_TYPE
+    return content_type
+
+
+def _hash_stream(src: IO[bytes]) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := src.read(MEDIA_CHUNK_BYTES):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def store_media(open_src) -> Tuple[str, int, bool]:
+    """把媒体内容写入存储，内容已存在时不写入任何字节
+
+    先只计算哈希，命中已有文件时直接返回；否则再读一遍写入临时文件，
+    原子地重命名到最终路径。内存中只保留一个分块。
+
+    Args:
+        open_src: 无参函数，每次调用返回一个新的只读二进制文件对象
+
+    Returns:
+        (sha256, 字节数, 是否新写入)
+    """
+    with open_src() as src:
+        sha256, size = _hash_stream(src)
+    path = media_path(sha256)
+    if os.path.exists(path):
+        return sha256, size, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as dst, open_src() as src:
+            shutil.copyfileobj(src, dst, MEDIA_CHUNK_BYTES)
+        # concurrent writers of the same content end with the same bytes
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return sha256, size, True
+
+
+def store_apkg_media(apkg_path: str) -> Dict[str, Dict]:
+    """把 .apkg 中的媒体文件逐个流式写入存储，在导入进程池中执行
+
+    Args:
+        apkg_path: .apkg 文件路径
+
+    Returns:
+        {原始文件名: {"sha256", "size", "content_type", "is_new"}}
+    """
+    stored = {}
+    for filename, open_src in iter_media_members(apkg_path):
+        sha256, size, is_new = store_media(open_src)
+        stored[filename] = {
+            "sha256": sha256,
+            "size": size,
+            "content_type": guess_content_type(filename),
+            "is_new": is_new,
+        }
+    return stored
@@ -0,0 +1,31 @@
+from collections import defaultdict
+from typing import Dict
+
+# 进程内指标，计数器只增不减，仪表值为最近一次的观测值
+counters: Dict[str, float] = defaultdict(float)
+gauges: Dict[str, float] = {}
+
+
+def incr_counter(name: str, value: float = 1):
+    """累加计数器
+
+    Args:
+        name: 指标名称
+        value: 增量
+    """
+    counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    """设置仪表值
+
+    Args:
+        name: 指标名称
+        value: 观测值
+    """
+    gauges[name] = value
+
+
+def get_metrics() -> Dict[str, Dict[str, float]]:
+    """获取当前进程的全部指标"""
+    return {"counters": dict(counters), "gauges": dict(gauges)}
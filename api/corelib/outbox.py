@@ -0,0 +1,264 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from loguru import logger as loguru_logger
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from corelib.db import get_session_local
+from corelib.metrics import incr_counter
+from models.outbox import OutboxMessage
+
+# 认领后的租约时长（秒），投递器在租约内崩溃时消息会被其他投递器重新认领
+OUTBOX_CLAIM_LEASE_SECONDS = 60
+# 投递失败后的重试间隔上限（秒）
+OUTBOX_MAX_RETRY_DELAY_SECONDS = 300
+
+relay_task: Optional[asyncio.Task] = None
+relay_wakeup: Optional[asyncio.Event] = None
+
+
+def new_outbox_message(
+    task_name: str,
+    task_id: str,
+    task_params: str,
+    countdown: Optional[int] = None,
+    expires: Optional[int] = None,
+) -> OutboxMessage:
+    """构造一条待投递的 Celery 任务，由调用方在业务事务中写入
+
+    Args:
+        task_name: Celery 任务名
+        task_id: Celery 任务ID
+        task_params: 任务参数
+        countdown: 投递后延迟执行秒数
+        expires: 投递后过期秒数
+
+    Returns:
+        OutboxMessage: 尚未加入会话的消息
+    """
+    return OutboxMessage(
+        task_name=task_name,
+        task_id=task_id,
+        args=[task_params],
+        countdown=countdown,
+        expires=expires,
+        attempts=0,
+        next_attempt_at=datetime.now(),
+    )
+
+
+def notify_outbox():
+    """事务提交后唤醒投递器，不必等到下一次轮询"""
+    if relay_wakeup is not None:
+        relay_wakeup.set()
+
+
+async def _claim_batch(
+    db: AsyncSession, relay_id: str, batch_size: int, max_attempts: int
+) -> List[Tuple]:
+    now = datetime.now()
+    candidate_ids = (
+        await db.scalars(
+            select(OutboxMessage.id)
+            .where(
+                OutboxMessage.next_attempt_at <= now,
+                OutboxMessage.attempts < max_attempts,
+            )
+            .order_by(OutboxMessage.id)
+            .limit(batch_size)
+        )
+    ).all()
+    if not candidate_ids:
+        return []
+    # another relay may have claimed some of them since the select
+    await db.execute(
+        update(OutboxMessage)
+        .where(
+            OutboxMessage.id.in_(candidate_ids),
+            OutboxMessage.next_attempt_at <= now,
+        )
+        .values(
+            claimed_by=relay_id,
+            next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_LEASE_SECONDS),
+        )
+    )
+    await db.commit()
+    result = await db.execute(
+        select(
+            OutboxMessage.id,
+            OutboxMessage.task_name,
+            OutboxMessage.task_id,
+            OutboxMessage.args,
+            OutboxMessage.countdown,
+            OutboxMessage.expires,
+            OutboxMessage.attempts,
+        )
+        .where(
+            OutboxMessage.id.in_(candidate_ids),
+            OutboxMessage.claimed_by == relay_id,
+        )
+        .order_by(OutboxMessage.id)
+    )
+    return result.all()
+
+
+def _publish_batch(celery_app, messages: List[Tuple]) -> List[Tuple[int, str]]:
+    # one broker connection for the whole batch; runs in a worker thread
+    failures = []
+    with celery_app.producer_or_acquire() as producer:
+        # fail the whole batch at once when the broker is down
+        producer.connection.ensure_connection(max_retries=1)
+        for id_, task_name, task_id, args, countdown, expires, _ in messages:
+            try:
+                celery_app.send_task(
+                    task_name,
+                    args=args,
+                    task_id=task_id,
+                    countdown=countdown,
+                    expires=expires,
+                    producer=producer,
+                    retry=False,
+                )
+            except Exception as exc:
+                failures.append((id_, str(exc)))
+    return failures
+
+
+async def relay_outbox_once(
+    session_local: async_sessionmaker,
+    celery_app,
+    batch_size: int,
+    max_attempts: int,
+) -> int:
+    """认领一批到期消息并投递到 Celery
+
+    Args:
+        session_local: 读写会话工厂
+        celery_app: Celery 实例
+        batch_size: 单批最多投递的消息数
+        max_attempts: 单条消息最多尝试投递的次数，超过后不再投递
+
+    Returns:
+        int: 本批认领的消息数
+    """
+    relay_id = uuid.uuid4().hex
+    async with session_local() as db:
+        messages = await _claim_batch(db, relay_id, batch_size, max_attempts)
+        if not messages:
+            return 0
+        try:
+            failures = await asyncio.to_thread(_publish_batch, celery_app, messages)
+        except Exception as exc:
+            # the broker connection itself failed
+            failures = [(message[0], str(exc)) for message in messages]
+        failed_ids = {id_ for id_, _ in failures}
+        published_ids = [
+            message[0] for message in messages if message[0] not in failed_ids
+        ]
+        if published_ids:
+            await db.execute(
+                delete(OutboxMessage).where(OutboxMessage.id.in_(published_ids))
+            )
+        attempts_by_id = {message[0]: message[6] for message in messages}
+        now = datetime.now()
+        for id_, error in failures:
+            attempts = attempts_by_id[id_] + 1
+            delay = min(2**attempts, OUTBOX_MAX_RETRY_DELAY_SECONDS)
+            await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == id_)
+                .values(
+                    attempts=attempts,
+                    next_attempt_at=now + timedelta(seconds=delay),
+                    claimed_by=None,
+                    last_error=error,
+                )
+            )
+            if attempts >= max_attempts:
+                incr_counter("outbox.dead")
+                loguru_logger.error(
+                    f"Give up publishing outbox message {id_} after {attempts} attempts, err: {error}"
+                )
+        await db.commit()
+    incr_counter("outbox.published", len(published_ids))
+    if failures:
+        incr_counter("outbox.publish_failures", len(failures))
+        loguru_logger.warning(f"Failed to publish {len(failures)} outbox messages")
+    return len(messages)
+
+
+async def _run_relay(
+    wakeup: asyncio.Event,
+    session_local: async_sessionmaker,
+    celery_app,
+    interval_seconds: float,
+    batch_size: int,
+    max_attempts: int,
+):
+    while True:
+        wakeup.clear()
+        try:
+            n_claimed = await relay_outbox_once(
+                session_local, celery_app, batch_size, max_attempts
+            )
+        except Exception as exc:
+            loguru_logger.error(f"Failed to relay outbox, err: {exc}")
+            n_claimed = 0
+        if n_claimed >= batch_size:
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_outbox_relay(
+    interval_seconds: float,
+    batch_size: int,
+    max_attempts: int,
+    session_local: Optional[async_sessionmaker] = None,
+    celery_app=None,
+):
+    """启动后台投递器
+
+    Args:
+        interval_seconds: 没有新消息通知时的轮询间隔（秒）
+        batch_size: 单批最多投递的消息数
+        max_attempts: 单条消息最多尝试投递的次数
+        session_local: 投递器使用的会话工厂，默认为当前数据库后端的读写会话工厂
+        celery_app: 投递目标，默认为 API 进程的 Celery 客户端
+    """
+    global relay_task, relay_wakeup
+    if relay_task is not None:
+        return
+    if celery_app is None:
+        from celery_client_instance import celery_inst as celery_app
+    relay_wakeup = asyncio.Event()
+    relay_task = asyncio.create_task(
+        _run_relay(
+            relay_wakeup,
+            session_local or get_session_local(),
+            celery_app,
+            interval_seconds,
+            batch_size,
+            max_attempts,
+        )
+    )
+
+
+async def stop_outbox_relay():
+    """停止后台投递器，未投递的消息留在表中由下次启动继续投递"""
+    global relay_task, relay_wakeup
+    if relay_task is None:
+        return
+    task = relay_task
+    relay_task = None
+    relay_wakeup = None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
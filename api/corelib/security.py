@@ -1,4 +1,6 @@
+import asyncio
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -10,9 +12,21 @@ from loguru import logger as loguru_logger
 from passlib.context import CryptContext
 
 from corelib.config import settings
+from corelib.metrics import incr_counter, set_gauge
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt 每次计算约 200ms, 在独立线程池中执行以免阻塞事件循环.
+# 线程数即并发上限, 应小于 CPU 核数, 给事件循环留出一个核;
+# 排队中的任务超过 PASSWORD_HASH_MAX_PENDING 时直接拒绝.
+password_executor: Optional[ThreadPoolExecutor] = None
+pending_password_jobs = 0
+
+
+class PasswordHashBusyError(Exception):
+    pass
+
+
 # AES encryption key and IV
 AES_KEY = settings.SECRET_KEY[:32].encode()  # Use first 32 bytes of SECRET_KEY
 AES_IV = bytes(
@@ -75,6 +89,99 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _get_password_executor() -> ThreadPoolExecutor:
+    global password_executor
+    if password_executor is None:
+        password_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash",
+        )
+    return password_executor
+
+
+def _report_queue_depth():
+    set_gauge(
+        "password_hash.queue_depth",
+        max(0, pending_password_jobs - settings.PASSWORD_HASH_WORKERS),
+    )
+
+
+def is_password_hash_busy() -> bool:
+    """排队的密码任务是否已达上限, 用于在占用数据库连接之前提前拒绝请求"""
+    return pending_password_jobs >= settings.PASSWORD_HASH_MAX_PENDING
+
+
+def _release_password_job():
+    global pending_password_jobs
+    pending_password_jobs -= 1
+    _report_queue_depth()
+
+
+async def _run_password_job(func, *args):
+    global pending_password_jobs
+    if is_password_hash_busy():
+        incr_counter("password_hash.rejected")
+        raise PasswordHashBusyError(
+            f"{pending_password_jobs} password hash jobs pending"
+        )
+    loop = asyncio.get_running_loop()
+    future = _get_password_executor().submit(func, *args)
+    pending_password_jobs += 1
+    _report_queue_depth()
+
+    def on_done(_):
+        # the slot is held until the job leaves the pool, not until the caller
+        # stops waiting: a cancelled request (client disconnect) cancels a
+        # queued job but a running bcrypt finishes anyway
+        try:
+            loop.call_soon_threadsafe(_release_password_job)
+        except RuntimeError:
+            # the event loop is closed, nobody is counting anymore
+            pass
+
+    future.add_done_callback(on_done)
+    return await asyncio.wrap_future(future)
+
+
+async def aget_password_hash(password: str) -> str:
+    """在密码线程池中计算密码哈希
+
+    Args:
+        password: 明文密码
+
+    Returns:
+        str: bcrypt 哈希
+
+    Raises:
+        PasswordHashBusyError: 排队任务已达上限
+    """
+    return await _run_password_job(get_password_hash, password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """在密码线程池中校验密码
+
+    Args:
+        plain_password: 明文密码
+        hashed_password: bcrypt 哈希
+
+    Returns:
+        bool: 密码是否匹配
+
+    Raises:
+        PasswordHashBusyError: 排队任务已达上限
+    """
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+def shutdown_password_executor():
+    """关闭密码线程池, 等待进行中的任务完成"""
+    global password_executor
+    if password_executor is not None:
+        password_executor.shutdown(wait=True)
+        password_executor = None
+
+
 def create_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
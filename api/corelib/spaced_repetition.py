@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
 
 # 艾宾浩斯遗忘曲线间隔（小时）
 EBINGHAUS_INTERVALS = [
@@ -17,12 +20,22 @@ EBINGHAUS_INTERVALS = [
 ]
 
 
-def calculate_next_review(review_count: int, rating: int) -> datetime:
+# 复习次数达到该值后卡片视为已掌握
+MASTERED_REVIEW_COUNT = 5
+
+# 卡片状态，下标即 get_review_statuses 返回的状态编码
+REVIEW_STATUSES = np.array(["learning", "reviewing", "mastered"])
+
+
+def calculate_next_review(
+    review_count: int, rating: int, now: Optional[datetime] = None
+) -> datetime:
     """根据复习次数和评分计算下次复习时间
 
     Args:
         review_count: 当前复习次数
         rating: 评分（1-5）
+        now: 参考时间，默认为当前时间
 
     Returns:
         下次复习时间
@@ -42,7 +55,7 @@ def calculate_next_review(review_count: int, rating: int) -> datetime:
     # 确保间隔至少为1小时
     interval = max(1, interval)
 
-    return datetime.now() + timedelta(hours=interval)
+    return (now or datetime.now()) + timedelta(hours=interval)
 
 
 def get_review_status(review_count: int) -> str:
@@ -56,7 +69,81 @@ def get_review_status(review_count: int) -> str:
     """
     if review_count == 0:
         return "learning"
-    elif review_count < 5:
+    elif review_count < MASTERED_REVIEW_COUNT:
         return "reviewing"
     else:
         return "mastered"
+
+
+def _build_interval_table() -> np.ndarray:
+    """按 (复习次数, 评分档位) 预先计算间隔（微秒）
+
+    通过 timedelta 换算，保证与 calculate_next_review 的取整结果完全一致。
+    评分档位：0 为记得不好（<=2），1 为一般，2 为记得很好（>=4）。
+    """
+    table = np.empty((len(EBINGHAUS_INTERVALS), 3), dtype=np.int64)
+    for i, interval in enumerate(EBINGHAUS_INTERVALS):
+        for j, factor in enumerate((0.5, 1, 1.5)):
+            table[i, j] = timedelta(hours=max(1, interval * factor)) // timedelta(
+                microseconds=1
+            )
+    return table
+
+
+# 下次复习间隔查找表（微秒），形状为 (len(EBINGHAUS_INTERVALS), 3)
+INTERVAL_TABLE_US = _build_interval_table()
+
+
+def calculate_next_reviews(
+    review_counts: np.ndarray, ratings: np.ndarray, now: datetime | np.ndarray
+) -> np.ndarray:
+    """批量计算下次复习时间，与 calculate_next_review 逐元素结果一致
+
+    Args:
+        review_counts: 当前复习次数数组（非负整数）
+        ratings: 评分数组（1-5）
+        now: 参考时间，或与 review_counts 等长的参考时间数组
+
+    Returns:
+        下次复习时间数组，dtype 为 datetime64[us]
+    """
+    review_counts = np.asarray(review_counts, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.int64)
+    rows = np.minimum(review_counts, len(EBINGHAUS_INTERVALS) - 1)
+    cols = np.where(ratings >= 4, 2, np.where(ratings <= 2, 0, 1))
+    return np.asarray(now, dtype="datetime64[us]") + INTERVAL_TABLE_US[
+        rows, cols
+    ].astype("timedelta64[us]")
+
+
+def get_review_statuses(review_counts: np.ndarray) -> np.ndarray:
+    """批量获取卡片状态编码，与 get_review_status 逐元素结果一致
+
+    Args:
+        review_counts: 当前复习次数数组
+
+    Returns:
+        状态编码数组，可通过 REVIEW_STATUSES[codes] 得到状态名
+    """
+    review_counts = np.asarray(review_counts, dtype=np.int64)
+    return np.where(
+        review_counts == 0, 0, np.where(review_counts < MASTERED_REVIEW_COUNT, 1, 2)
+    )
+
+
+def schedule_reviews(
+    review_counts: np.ndarray, ratings: np.ndarray, now: datetime | np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """批量复习一组卡片，返回复习后的下次复习时间和状态
+
+    Args:
+        review_counts: 复习前的复习次数数组
+        ratings: 评分数组（1-5）
+        now: 参考时间，或与 review_counts 等长的参考时间数组
+
+    Returns:
+        (下次复习时间数组 datetime64[us], 复习后的状态名数组)
+    """
+    next_reviews = calculate_next_reviews(review_counts, ratings, now)
+    statuses = REVIEW_STATUSES[get_review_statuses(np.asarray(review_counts) + 1)]
+    return next_reviews, statuses
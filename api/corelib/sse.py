@@ -16,6 +16,11 @@ async def event_generator(request: Request, connection_type: Optional[str] = Non
     sse_connections[connection_id] = {"queue": queue, "type": connection_type}
 
     try:
+        # 客户端需要连接ID才能让其他请求（如卡片导入）向该连接推送消息
+        yield {
+            "event": "connected",
+            "data": json.dumps({"connection_id": connection_id}),
+        }
         while True:
             if await request.is_disconnected():
                 break
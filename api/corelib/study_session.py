@@ -0,0 +1,81 @@
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+# 学习会话的有效期（秒）
+STUDY_SESSION_TTL_SECONDS = 2 * 60 * 60
+
+# 存储所有进行中的学习会话，会话创建时即固化待复习队列
+# 会话只保存在创建它的进程内：多个 uvicorn worker 时，落到其他 worker 的请求
+# 找不到会话，按会话已过期处理（404），客户端需要重新创建会话
+study_sessions: Dict[str, Dict[str, Any]] = {}
+
+
+def _purge_expired_sessions(now: float):
+    expired = [
+        session_id
+        for session_id, session in study_sessions.items()
+        if session["expires_at"] <= now
+    ]
+    for session_id in expired:
+        study_sessions.pop(session_id, None)
+
+
+def create_study_session(user_id: int, cards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """创建学习会话，每个用户同时只保留一个会话
+
+    Args:
+        user_id: 用户ID
+        cards: 已序列化的待复习卡片队列
+
+    Returns:
+        学习会话
+    """
+    now = time.time()
+    _purge_expired_sessions(now)
+    for session_id, session in list(study_sessions.items()):
+        if session["user_id"] == user_id:
+            study_sessions.pop(session_id, None)
+
+    session = {
+        "id": uuid4().hex,
+        "user_id": user_id,
+        "cards": cards,
+        "cursor": 0,
+        "created_at": now,
+        "expires_at": now + STUDY_SESSION_TTL_SECONDS,
+    }
+    study_sessions[session["id"]] = session
+    return session
+
+
+def get_study_session(session_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """获取用户的学习会话，已过期或不属于该用户时返回 None"""
+    session = study_sessions.get(session_id)
+    if session is None or session["user_id"] != user_id:
+        return None
+    if session["expires_at"] <= time.time():
+        study_sessions.pop(session_id, None)
+        return None
+    return session
+
+
+def next_study_cards(session: Dict[str, Any], n: int) -> List[Dict[str, Any]]:
+    """从会话队列中取出接下来的 n 张卡片
+
+    Args:
+        session: 学习会话
+        n: 卡片数量
+
+    Returns:
+        卡片列表
+    """
+    start = session["cursor"]
+    cards = session["cards"][start : start + n]
+    session["cursor"] = start + len(cards)
+    return cards
+
+
+def end_study_session(session_id: str):
+    """结束学习会话"""
+    study_sessions.pop(session_id, None)
@@ -1,3 +1,4 @@
 from .email_task import SendActivationEmailTask, SendPasswordResetEmailTask
+from .import_task import ImportApkgTask
 
-__all__ = ["SendActivationEmailTask", "SendPasswordResetEmailTask"]
+__all__ = ["ImportApkgTask", "SendActivationEmailTask", "SendPasswordResetEmailTask"]
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import celery
+from loguru import logger as loguru_logger
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from corelib.apkg_import import iter_apkg_card_batches, read_apkg_collection
+from corelib.config import settings
+from corelib.db import dispose_engines, get_session_local
+from corelib.due_queue_cache import publish_due_queue_invalidation
+from corelib.media_store import store_apkg_media
+from crud.crud_card import import_cards
+from crud.crud_import_job import get_import_job, record_import_job_batch
+from crud.crud_media import register_media_blobs
+from models.import_job import ImportJob
+from models.user import User  # noqa: F401, resolves Card.owner in the worker
+
+# 重试间隔上限（秒）
+IMPORT_JOB_MAX_RETRY_DELAY_SECONDS = 300
+IMPORT_JOB_FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def import_job_path(job_id: str) -> str:
+    """导入任务的 .apkg 文件路径，由 API 写入，worker 在任务结束后删除"""
+    return os.path.join(settings.APKG_IMPORT_JOB_ROOT_PATH, f"{job_id}.apkg")
+
+
+async def _finish_import_job(
+    db, job_id: str, owner_id: int, status: str, error: Optional[str] = None
+):
+    await db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id)
+        .values(status=status, error=error, finished_at=func.now())
+    )
+    await db.commit()
+    # once per job: the committed batches are the owner's new due cards
+    await publish_due_queue_invalidation(owner_id)
+    try:
+        os.remove(import_job_path(job_id))
+    except FileNotFoundError:
+        pass
+
+
+async def run_import_job(
+    job_id: str,
+    session_local: async_sessionmaker,
+    executor: Executor,
+    max_attempts: int,
+) -> Tuple[Optional[str], int]:
+    """执行导入任务，从最后一个已提交的批次之后继续
+
+    每批卡片与任务进度在同一事务中提交，worker 中断后重新执行不会重复导入。
+
+    Args:
+        job_id: 导入任务ID
+        session_local: 读写会话工厂
+        executor: 解析 .apkg 使用的执行器
+        max_attempts: 最多执行次数，出错且未达到该次数时任务回到 pending 等待重试
+
+    Returns:
+        (任务状态, 已执行次数)，任务不存在时状态为 None
+    """
+    async with session_local() as db:
+        job = await get_import_job(db, job_id)
+        if job is None or job.status in IMPORT_JOB_FINISHED_STATUSES:
+            return (job.status if job else None), (job.attempts if job else 0)
+        job.status = "running"
+        job.attempts += 1
+        await db.commit()
+        attempts = job.attempts
+        owner_id, merge_policy = job.owner_id, job.merge_policy
+        after_note_id = job.last_note_id
+        apkg_path = import_job_path(job_id)
+        loop = asyncio.get_running_loop()
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                collection = await loop.run_in_executor(
+                    executor, read_apkg_collection, apkg_path, temp_dir
+                )
+                if collection is None:
+                    await _finish_import_job(
+                        db, job_id, owner_id, "failed", "Invalid .apkg file"
+                    )
+                    return "failed", attempts
+
+                # files stored by an earlier attempt are only hashed again
+                stored_media = await loop.run_in_executor(
+                    executor, store_apkg_media, apkg_path
+                )
+                await register_media_blobs(db, stored_media.values())
+                if job.media_files is None:
+                    job.media_files = len(stored_media)
+                    job.new_media_bytes = sum(
+                        blob["size"] for blob in stored_media.values() if blob["is_new"]
+                    )
+                job.total_notes = collection["note_count"]
+                await db.commit()
+
+                n_notes = 0
+                last_note_id = after_note_id
+
+                async def card_batches():
+                    nonlocal n_notes, last_note_id
+                    async for cards, n_notes, last_note_id in iter_apkg_card_batches(
+                        collection,
+                        settings.APKG_IMPORT_BATCH_SIZE,
+                        after_note_id=after_note_id,
+                        executor=executor,
+                    ):
+                        yield cards
+
+                async def on_batch(n_imported: int, n_duplicates: int):
+                    await record_import_job_batch(
+                        db, job_id, n_notes, n_imported, n_duplicates, last_note_id
+                    )
+
+                await import_cards(
+                    db=db,
+                    user_id=owner_id,
+                    batches=card_batches(),
+                    media={
+                        filename: blob["sha256"]
+                        for filename, blob in stored_media.items()
+                    },
+                    merge_policy=merge_policy,
+                    on_batch=on_batch,
+                )
+            await _finish_import_job(db, job_id, owner_id, "succeeded")
+            return "succeeded", attempts
+        except Exception as exc:
+            loguru_logger.error(f"Failed to import job {job_id}, err: {exc}")
+            await db.rollback()
+            if attempts >= max_attempts:
+                await _finish_import_job(db, job_id, owner_id, "failed", str(exc))
+                return "failed", attempts
+            await db.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job_id)
+                .values(status="pending", error=str(exc))
+            )
+            await db.commit()
+            return "pending", attempts
+
+
+async def _run_import_job_in_worker(job_id: str) -> Tuple[Optional[str], int]:
+    # a prefork child cannot start the import process pool, parse in a thread;
+    # engines are bound to this task's event loop and disposed with it
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return await run_import_job(
+                job_id,
+                get_session_local(),
+                executor,
+                settings.APKG_IMPORT_JOB_MAX_ATTEMPTS,
+            )
+    finally:
+        await dispose_engines()
+
+
+class ImportApkgTask(celery.Task):
+    name = "import-apkg-task"
+    # acknowledged after it ran: a task on a killed worker is delivered again
+    # and resumes from the last committed batch
+    acks_late = True
+    reject_on_worker_lost = True
+
+    def run(self, task_params: str):
+        params = json.loads(task_params)
+        task_id = params["task_id"]
+        job_id = params["job_id"]
+
+        with loguru_logger.contextualize(task_id=task_id):
+            loguru_logger.info("To exec task...")
+            loguru_logger.debug(f"Task params: {params}.")
+            start_at = time.perf_counter()
+            try:
+                status, attempts = asyncio.run(_run_import_job_in_worker(job_id))
+                loguru_logger.info(f"Import job {job_id} is {status}.")
+                if status == "pending":
+                    raise self.retry(
+                        countdown=min(2**attempts, IMPORT_JOB_MAX_RETRY_DELAY_SECONDS),
+                        max_retries=None,
+                    )
+            finally:
+                end_at = time.perf_counter()
+                loguru_logger.info(
+                    f"Finished task, used time: {end_at - start_at:.3f}s."
+                )
@@ -0,0 +1,6 @@
+from celery_client_instance import celery_inst as app
+
+
+@app.task(name="import-apkg-task")
+def import_apkg_task(task_params: str):
+    pass
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from itertools import count
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger as loguru_logger
+from sqlalchemy import DateTime
+
+from corelib.config import settings
+from corelib.metrics import incr_counter, set_gauge
+from models.user import User
+
+# 最多缓存的用户数，超出后按 LRU 淘汰
+USER_CACHE_MAX_USERS = 10000
+# 缓存条目的有效期（秒），未开启 Redis 时也是其他 worker 看到用户变更的最长延迟
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_REDIS_KEY_PREFIX = "anki_ai:user:"
+USER_CACHE_REDIS_CHANNEL = "anki_ai:user:invalidate"
+USER_CACHE_REDIS_GENERATION_KEY_PREFIX = "anki_ai:user:generation:"
+# 失效代数在 Redis 中的有效期，远长于一次数据库读取
+USER_CACHE_REDIS_GENERATION_TTL_SECONDS = 86400
+# 最多记录失效代数的用户数
+USER_CACHE_GENERATION_MAX_USERS = 65536
+# 只有 Redis 中的失效代数未变化时才写入快照，读取和写入之间的失效不会被覆盖
+USER_CACHE_REDIS_SET_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") == ARGV[1] then
+    redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+    return 1
+end
+return 0
+"""
+# 不进入缓存的列，密码哈希只在登录时从数据库读取
+USER_CACHE_EXCLUDED_COLUMNS = ("hashed_password",)
+
+# email (token sub) -> 用户快照。快照是列名到列值的字典，命中时构造一个不属于
+# 任何会话的 User 对象返回，不会触发懒加载。
+cached_users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# email -> 本进程最近一次失效时的代数；订阅中断后整个缓存被清空时记录在
+# users_cleared_generation 中，对所有用户生效
+user_generations: "OrderedDict[str, int]" = OrderedDict()
+users_cleared_generation = 0
+_generations = count(1)
+redis_client = None
+
+
+def _get_redis():
+    global redis_client
+    if redis_client is None:
+        from redis import asyncio as aioredis
+
+        redis_client = aioredis.Redis.from_url(
+            f"redis://:{settings.REDIS_PASSWORD}@{settings.REDIS_SERVER_ENDPOINT}/{settings.REDIS_CACHE_DB}",
+            decode_responses=True,
+        )
+    return redis_client
+
+
+def _report_size():
+    set_gauge("user_cache.users", len(cached_users))
+
+
+def _bump_generation(email: str):
+    user_generations[email] = next(_generations)
+    user_generations.move_to_end(email)
+    while len(user_generations) > USER_CACHE_GENERATION_MAX_USERS:
+        user_generations.popitem(last=False)
+
+
+def _local_generation(email: str) -> int:
+    return max(user_generations.get(email, 0), users_cleared_generation)
+
+
+def _clear_local():
+    global users_cleared_generation
+    users_cleared_generation = next(_generations)
+    cached_users.clear()
+    _report_size()
+
+
+def _to_snapshot(user: User) -> Dict[str, Any]:
+    return {
+        column.key: getattr(user, column.key)
+        for column in User.__table__.columns
+        if column.key not in USER_CACHE_EXCLUDED_COLUMNS
+    }
+
+
+def _dumps(snapshot: Dict[str, Any]) -> str:
+    return json.dumps(
+        {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in snapshot.items()
+        }
+    )
+
+
+def _loads(payload: str) -> Dict[str, Any]:
+    snapshot = json.loads(payload)
+    for column in User.__table__.columns:
+        value = snapshot.get(column.key)
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            snapshot[column.key] = datetime.fromisoformat(value)
+    return snapshot
+
+
+def _store_local(email: str, snapshot: Dict[str, Any]):
+    cached_users[email] = {
+        "snapshot": snapshot,
+        "expires_at": time.time() + USER_CACHE_TTL_SECONDS,
+    }
+    cached_users.move_to_end(email)
+    while len(cached_users) > USER_CACHE_MAX_USERS:
+        cached_users.popitem(last=False)
+        incr_counter("user_cache.evictions")
+    _report_size()
+
+
+async def get_cached_user(email: str) -> Optional[User]:
+    """获取已缓存的用户，依次查询进程内缓存和 Redis，未命中时返回 None
+
+    Args:
+        email: 用户邮箱，即 token 的 sub
+
+    Returns:
+        不属于任何会话的 User 对象
+    """
+    entry = cached_users.get(email)
+    if entry is not None and entry["expires_at"] <= time.time():
+        cached_users.pop(email, None)
+        _report_size()
+        entry = None
+    if entry is not None:
+        cached_users.move_to_end(email)
+        incr_counter("user_cache.hits")
+        return User(**entry["snapshot"])
+
+    if settings.USER_CACHE_REDIS_ENABLED:
+        try:
+            payload = await _get_redis().get(USER_CACHE_REDIS_KEY_PREFIX + email)
+        except Exception as exc:
+            loguru_logger.warning(f"Failed to read user cache from redis, err: {exc}")
+            payload = None
+        if payload is not None:
+            snapshot = _loads(payload)
+            _store_local(email, snapshot)
+            incr_counter("user_cache.redis_hits")
+            return User(**snapshot)
+
+    incr_counter("user_cache.misses")
+    return None
+
+
+async def user_cache_generation(email: str) -> Tuple[int, Optional[str]]:
+    """获取用户当前的失效代数，在从数据库读取用户之前调用，传给 cache_user
+
+    Returns:
+        (本进程的代数, Redis 中的代数)，未开启或无法读取 Redis 时后者为 None
+    """
+    redis_generation = None
+    if settings.USER_CACHE_REDIS_ENABLED:
+        try:
+            redis_generation = (
+                await _get_redis().get(USER_CACHE_REDIS_GENERATION_KEY_PREFIX + email)
+                or "0"
+            )
+        except Exception as exc:
+            loguru_logger.warning(
+                f"Failed to read user cache generation from redis, err: {exc}"
+            )
+    return _local_generation(email), redis_generation
+
+
+async def cache_user(user: User, generation: Tuple[int, Optional[str]]):
+    """缓存从数据库读取的用户
+
+    读取之后用户被失效过（代数变化）时不缓存，避免旧快照覆盖失效。
+
+    Args:
+        user: 从数据库读取的用户
+        generation: 读取之前 user_cache_generation 的返回值
+    """
+    local_generation, redis_generation = generation
+    if _local_generation(user.email) != local_generation:
+        incr_counter("user_cache.stale_fills")
+        return
+    snapshot = _to_snapshot(user)
+    _store_local(user.email, snapshot)
+    if settings.USER_CACHE_REDIS_ENABLED and redis_generation is not None:
+        try:
+            is_set = await _get_redis().eval(
+                USER_CACHE_REDIS_SET_SCRIPT,
+                2,
+                USER_CACHE_REDIS_KEY_PREFIX + user.email,
+                USER_CACHE_REDIS_GENERATION_KEY_PREFIX + user.email,
+                redis_generation,
+                _dumps(snapshot),
+                USER_CACHE_TTL_SECONDS,
+            )
+            if not is_set:
+                # invalidated by another worker meanwhile, its message may
+                # still be on the way
+                cached_users.pop(user.email, None)
+                _report_size()
+                incr_counter("user_cache.stale_fills")
+        except Exception as exc:
+            loguru_logger.warning(f"Failed to write user cache to redis, err: {exc}")
+
+
+async def invalidate_cached_user(email: str):
+    """用户变更提交后丢弃其缓存，开启 Redis 时通知其他 worker 一并丢弃"""
+    _bump_generation(email)
+    if cached_users.pop(email, None) is not None:
+        _report_size()
+    if settings.USER_CACHE_REDIS_ENABLED:
+        try:
+            generation_key = USER_CACHE_REDIS_GENERATION_KEY_PREFIX + email
+            async with _get_redis().pipeline(transaction=True) as pipe:
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, USER_CACHE_REDIS_GENERATION_TTL_SECONDS)
+                pipe.delete(USER_CACHE_REDIS_KEY_PREFIX + email)
+                pipe.publish(USER_CACHE_REDIS_CHANNEL, email)
+                await pipe.execute()
+        except Exception as exc:
+            loguru_logger.warning(f"Failed to invalidate user cache, err: {exc}")
+
+
+async def listen_user_invalidations():
+    """订阅其他 worker 发布的失效通知，直到任务被取消"""
+    while True:
+        pubsub = _get_redis().pubsub()
+        try:
+            await pubsub.subscribe(USER_CACHE_REDIS_CHANNEL)
+            # drop whatever may have been missed while unsubscribed
+            _clear_local()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _bump_generation(message["data"])
+                    if cached_users.pop(message["data"], None) is not None:
+                        _report_size()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            loguru_logger.warning(f"User cache subscription lost, err: {exc}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
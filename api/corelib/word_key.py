@@ -0,0 +1,23 @@
+import html
+import re
+
+HTML_TAG = re.compile(r"<[^>]+>")
+
+# 重复卡片的合并策略
+# keep: 保留已有卡片不变
+# overwrite: 新内容中非空的列覆盖已有卡片
+# fill_empty: 新内容只填充已有卡片中为空的列
+MERGE_POLICIES = ("keep", "overwrite", "fill_empty")
+
+
+def normalize_word(word: str) -> str:
+    """计算单词的去重键：去掉 HTML 标签，大小写折叠，合并空白
+
+    Args:
+        word: 卡片上的单词
+
+    Returns:
+        str: 同一用户下唯一的去重键
+    """
+    text = html.unescape(HTML_TAG.sub("", word or ""))
+    return " ".join(text.casefold().split())
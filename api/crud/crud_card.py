@@ -1,55 +1,249 @@
 from datetime import datetime
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import (
+    String,
+    and_,
+    case,
+    func,
+    insert,
+    or_,
+    select,
+    type_coerce,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer_group
 
-from corelib.spaced_repetition import calculate_next_review, get_review_status
-from models.card import Card
-from schemas.card import CardCreate, CardUpdate
+from corelib.db import (
+    insert_ignore,
+    insert_or_update,
+    is_group_commit_enabled,
+    submit_write,
+)
+from corelib.due_queue_cache import (
+    DUE_QUEUE_FILL_MAX_ENTRIES,
+    due_card_ids,
+    due_queue_generation,
+    due_queue_horizon,
+    invalidate_due_queue,
+    load_due_queue,
+    lookup_due_queue,
+    upsert_due_card,
+)
+from corelib.spaced_repetition import (
+    EBINGHAUS_INTERVALS,
+    MASTERED_REVIEW_COUNT,
+    calculate_next_review,
+    get_review_status,
+    schedule_reviews,
+)
+from corelib.word_key import normalize_word
+from crud.crud_media import link_card_media
+from crud.crud_statistic import record_daily_stats
+from models.card import Card, Review
+from schemas.card import CardCreate, CardUpdate, ReviewBatchItem, ReviewBatchResult
 
 
-async def get_due_cards(
-    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100
+def _after_cursor(after_next_review: Optional[datetime], after_id: Optional[int]):
+    # keyset predicate for ORDER BY next_review, id
+    if after_next_review is None or after_id is None:
+        return None
+    return or_(
+        Card.next_review > after_next_review,
+        and_(Card.next_review == after_next_review, Card.id > after_id),
+    )
+
+
+async def _query_due_cards(
+    db: AsyncSession,
+    user_id: int,
+    now: datetime,
+    skip: int,
+    limit: int,
+    after_next_review: Optional[datetime],
+    after_id: Optional[int],
 ):
-    result = await db.execute(
+    # keyset page over the (owner_id, next_review) index
+    query = (
         select(Card)
-        .filter(Card.owner_id == user_id, Card.next_review <= datetime.now())
-        .offset(skip)
-        .limit(limit)
+        .filter(Card.owner_id == user_id, Card.next_review <= now)
+        .options(undefer_group("content"))
+    )
+    after = _after_cursor(after_next_review, after_id)
+    if after is not None:
+        query = query.filter(after)
+    result = await db.execute(
+        query.order_by(Card.next_review, Card.id).offset(skip).limit(limit)
     )
     return result.scalars().all()
 
 
+async def _fill_due_queue(db: AsyncSession, user_id: int):
+    # a review committed while the rows are read bumps the generation and the
+    # snapshot is not cached
+    generation = due_queue_generation(user_id)
+    horizon = due_queue_horizon()
+    # a range of the (owner_id, next_review) index, no card content is read;
+    # next_review is read as text and parsed by the cache
+    result = await db.execute(
+        select(type_coerce(Card.next_review, String), Card.id)
+        .filter(Card.owner_id == user_id, Card.next_review <= horizon)
+        .order_by(Card.next_review, Card.id)
+        .limit(DUE_QUEUE_FILL_MAX_ENTRIES)
+    )
+    load_due_queue(user_id, result.all(), generation, horizon)
+
+
+async def get_due_cards(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after_next_review: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+):
+    now = datetime.now()
+    page = (now, skip, limit, after_next_review, after_id)
+    queue = lookup_due_queue(user_id)
+    if queue is None:
+        # the miss is served like an uncached read, the queue is filled for
+        # the next pages with at most DUE_QUEUE_FILL_MAX_ENTRIES cards
+        cards = await _query_due_cards(db, user_id, *page)
+        await _fill_due_queue(db, user_id)
+        return cards
+    card_ids = due_card_ids(
+        queue,
+        now,
+        skip=skip,
+        limit=limit,
+        after_next_review=after_next_review,
+        after_id=after_id,
+    )
+    if card_ids is None:
+        # past the cards the queue holds
+        return await _query_due_cards(db, user_id, *page)
+    if not card_ids:
+        return []
+    # look up by primary key only: with owner_id in the WHERE clause SQLite
+    # picks the (owner_id, next_review) index and scans all the user's cards
+    result = await db.execute(
+        select(Card).filter(Card.id.in_(card_ids)).options(undefer_group("content"))
+    )
+    cards = {
+        card.id: card for card in result.scalars().all() if card.owner_id == user_id
+    }
+    return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+
 async def get_user_cards(
-    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after_next_review: Optional[datetime] = None,
+    after_id: Optional[int] = None,
 ):
+    query = (
+        select(Card).filter(Card.owner_id == user_id).options(undefer_group("content"))
+    )
+    after = _after_cursor(after_next_review, after_id)
+    if after is not None:
+        query = query.filter(after)
     result = await db.execute(
-        select(Card).filter(Card.owner_id == user_id).offset(skip).limit(limit)
+        query.order_by(Card.next_review, Card.id).offset(skip).limit(limit)
     )
     return result.scalars().all()
 
 
 async def get_cards(db: AsyncSession, skip: int = 0, limit: int = 100):
-    result = await db.execute(select(Card).offset(skip).limit(limit))
+    result = await db.execute(
+        select(Card).options(undefer_group("content")).offset(skip).limit(limit)
+    )
     return result.scalars().all()
 
 
 async def get_card(db: AsyncSession, card_id: int):
-    result = await db.execute(select(Card).filter(Card.id == card_id))
+    # plain refresh() skips deferred columns, so writes reload through here
+    result = await db.execute(
+        select(Card)
+        .filter(Card.id == card_id)
+        .options(undefer_group("content"))
+        .execution_options(populate_existing=True)
+    )
     return result.scalar_one_or_none()
 
 
-async def create_card(db: AsyncSession, card: CardCreate, user_id: int):
+EXPORTED_CARD_COLUMNS = (
+    "id",
+    "word",
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "pronunciation",
+    "tags",
+    "review_count",
+    "next_review",
+    "created_at",
+)
+
+
+async def iter_user_card_batches(
+    db: AsyncSession, user_id: int, batch_size: int
+) -> AsyncIterator[List[Any]]:
+    """Yield all of a user's cards, ``batch_size`` rows at a time.
+
+    The rows (EXPORTED_CARD_COLUMNS) are fetched through a server-side cursor,
+    only one batch is held in memory.
+    """
+    result = await db.stream(
+        select(*(getattr(Card, column) for column in EXPORTED_CARD_COLUMNS))
+        .filter(Card.owner_id == user_id)
+        # the (owner_id, next_review) index order, ORDER BY id alone would
+        # sort all the user's cards in a temp b-tree before the first row
+        .order_by(Card.next_review, Card.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in result.partitions():
+        yield rows
+
+
+async def create_card(
+    db: AsyncSession, card: CardCreate, user_id: int, merge_policy: str = "keep"
+):
+    """Create a card, or merge it into the user's card for the same word."""
     try:
-        db_card = Card(
+        row = {
             **card.model_dump(),
-            owner_id=user_id,
-            next_review=datetime.now(),
-            status="learning",
-        )
-        db.add(db_card)
+            "word_key": normalize_word(card.word),
+            "owner_id": user_id,
+            "next_review": datetime.now(),
+            "review_count": 0,
+            "status": "learning",
+        }
+        inserted, merged = await _upsert_cards(db, user_id, [row], merge_policy)
+        if inserted:
+            await record_daily_stats(db, user_id, status_changes=[(None, "learning")])
         await db.commit()
-        await db.refresh(db_card)
+        db_card = await get_card(db, (inserted or merged)[row["word_key"]])
+        if inserted:
+            upsert_due_card(user_id, db_card.id, db_card.next_review)
         return db_card
     except Exception as exc:
         await db.rollback()
@@ -63,25 +257,432 @@ async def update_card(db: AsyncSession, card_id: int, card_update: CardUpdate):
             update_data = card_update.model_dump(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(db_card, field, value)
+            if "word" in update_data:
+                db_card.word_key = normalize_word(db_card.word)
             await db.commit()
-            await db.refresh(db_card)
+            db_card = await get_card(db, card_id)
+            upsert_due_card(db_card.owner_id, db_card.id, db_card.next_review)
         return db_card
     except Exception as exc:
         await db.rollback()
         raise exc
 
 
-async def create_review(db: AsyncSession, card_id: int, rating: int):
-    try:
-        db_card = await get_card(db, card_id)
-        if db_card:
-            next_interval = calculate_next_review(rating, db_card.review_count)
-            db_card.next_review = datetime.now() + next_interval
-            db_card.review_count += 1
-            db_card.status = get_review_status(db_card.review_count)
+async def _apply_review(db: AsyncSession, card_id: int, user_id: int, rating: int):
+    now = datetime.now()
+    last_interval = len(EBINGHAUS_INTERVALS) - 1
+    # MySQL evaluates SET assignments left to right, review_count goes last so
+    # every dialect computes the schedule from the count before the review
+    statement = (
+        update(Card)
+        .where(Card.id == card_id, Card.owner_id == user_id)
+        .ordered_values(
+            (
+                Card.next_review,
+                case(
+                    {
+                        review_count: calculate_next_review(review_count, rating, now)
+                        for review_count in range(last_interval)
+                    },
+                    value=Card.review_count,
+                    else_=calculate_next_review(last_interval, rating, now),
+                ),
+            ),
+            (
+                Card.status,
+                case(
+                    (
+                        Card.review_count + 1 < MASTERED_REVIEW_COUNT,
+                        get_review_status(1),
+                    ),
+                    else_=get_review_status(MASTERED_REVIEW_COUNT),
+                ),
+            ),
+            (Card.review_count, Card.review_count + 1),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if db.bind.dialect.update_returning:
+        result = await db.execute(
+            statement.returning(Card)
+            .options(undefer_group("content"))
+            .execution_options(populate_existing=True)
+        )
+        db_card = result.scalar_one_or_none()
+    else:
+        # no UPDATE ... RETURNING (MySQL), read the card back in the transaction
+        result = await db.execute(statement)
+        db_card = await get_card(db, card_id) if result.rowcount else None
+    if db_card is None:
+        return None
+    await db.execute(
+        insert(Review).values(
+            card_id=card_id,
+            rating=rating,
+            review_date=now,
+            next_interval=(db_card.next_review - now).days,
+        )
+    )
+    await record_daily_stats(
+        db,
+        user_id,
+        reviews=1,
+        ratings=[rating],
+        status_changes=[(get_review_status(db_card.review_count - 1), db_card.status)],
+    )
+    return db_card
+
+
+async def create_review(db: AsyncSession, card_id: int, user_id: int, rating: int):
+    """Apply a review with one UPDATE ... RETURNING and one INSERT.
+
+    The next review time only depends on the current review count for a given
+    rating, so every candidate is computed up front and picked by a CASE on
+    ``review_count``. The ownership check is part of the WHERE clause: a card
+    that does not exist or belongs to another user matches no row and
+    ``None`` is returned. With group commit enabled the review is committed
+    by the single writer, together with the reviews that arrived alongside it.
+    On a backend without UPDATE ... RETURNING the card is read back instead.
+    """
+    if is_group_commit_enabled():
+        db_card = await submit_write(
+            partial(_apply_review, card_id=card_id, user_id=user_id, rating=rating)
+        )
+    else:
+        try:
+            db_card = await _apply_review(db, card_id, user_id, rating)
+            if db_card is None:
+                await db.rollback()
+                return None
             await db.commit()
-            await db.refresh(db_card)
-        return db_card
+        except Exception as exc:
+            await db.rollback()
+            raise exc
+    if db_card is not None:
+        upsert_due_card(user_id, db_card.id, db_card.next_review)
+    return db_card
+
+
+async def create_reviews(
+    db: AsyncSession, user_id: int, reviews: List[ReviewBatchItem]
+) -> List[ReviewBatchResult]:
+    """Apply a batch of reviews in one transaction.
+
+    Reviews are applied in ``reviewed_at`` order, so a card reviewed several
+    times in the batch advances once per review. Next review times are
+    computed with the batch scheduler, cards are updated with one executemany
+    and the review rows are bulk-inserted. The daily stats rollup is updated
+    once, on today's row, whatever the ``reviewed_at`` of each review.
+
+    Returns:
+        与 reviews 一一对应的复习结果
+    """
+    now = datetime.now()
+    reviewed_at = []
+    for item in reviews:
+        at = item.reviewed_at or now
+        if at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)
+        reviewed_at.append(min(at, now))
+
+    try:
+        result = await db.execute(
+            select(Card.id, Card.review_count)
+            .filter(
+                Card.id.in_({item.card_id for item in reviews}),
+                Card.owner_id == user_id,
+            )
+            .with_for_update()
+        )
+        card_review_counts = {
+            card_id: review_count or 0 for card_id, review_count in result.all()
+        }
+
+        applied = sorted(
+            (i for i, item in enumerate(reviews) if item.card_id in card_review_counts),
+            key=lambda i: (reviewed_at[i], i),
+        )
+        review_counts = []
+        for i in applied:
+            card_id = reviews[i].card_id
+            review_counts.append(card_review_counts[card_id])
+            card_review_counts[card_id] += 1
+
+        results = [
+            ReviewBatchResult(
+                card_id=item.card_id, success=False, detail="Card not found"
+            )
+            for item in reviews
+        ]
+        if not applied:
+            return results
+
+        next_reviews, statuses = schedule_reviews(
+            np.array(review_counts),
+            np.array([reviews[i].rating for i in applied]),
+            np.array([reviewed_at[i] for i in applied], dtype="datetime64[us]"),
+        )
+        next_reviews = next_reviews.tolist()
+        statuses = statuses.tolist()
+
+        card_updates = {}
+        review_rows = []
+        for k, i in enumerate(applied):
+            item = reviews[i]
+            card_updates[item.card_id] = {
+                "id": item.card_id,
+                "next_review": next_reviews[k],
+                "review_count": review_counts[k] + 1,
+                "status": statuses[k],
+            }
+            review_rows.append(
+                {
+                    "card_id": item.card_id,
+                    "rating": item.rating,
+                    "review_date": reviewed_at[i],
+                    "next_interval": (next_reviews[k] - reviewed_at[i]).days,
+                }
+            )
+            results[i] = ReviewBatchResult(
+                card_id=item.card_id,
+                success=True,
+                next_review=next_reviews[k],
+                review_count=review_counts[k] + 1,
+                status=statuses[k],
+            )
+
+        await db.execute(update(Card), list(card_updates.values()))
+        await db.execute(insert(Review), review_rows)
+        await record_daily_stats(
+            db,
+            user_id,
+            reviews=len(applied),
+            ratings=[reviews[i].rating for i in applied],
+            status_changes=[
+                (get_review_status(review_count), status)
+                for review_count, status in zip(review_counts, statuses)
+            ],
+        )
+        await db.commit()
+        for card_update in card_updates.values():
+            upsert_due_card(user_id, card_update["id"], card_update["next_review"])
+        return results
+    except Exception as exc:
+        await db.rollback()
+        raise exc
+
+
+IMPORTED_CARD_COLUMNS = (
+    "word",
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "tags",
+)
+# columns a duplicate card may bring into the existing one; the word itself
+# and the review schedule are never touched
+MERGEABLE_CARD_COLUMNS = (
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "pronunciation",
+    "tags",
+)
+
+
+def _merge_card_columns(columns: Sequence[str], merge_policy: str):
+    def update_columns(proposed):
+        values = {"updated_at": func.now()}
+        for column in columns:
+            existing = Card.__table__.c[column]
+            incoming = proposed[column]
+            if merge_policy == "overwrite":
+                values[column] = func.coalesce(func.nullif(incoming, ""), existing)
+            else:
+                values[column] = func.coalesce(func.nullif(existing, ""), incoming)
+        return values
+
+    return update_columns
+
+
+async def _upsert_cards(
+    db: AsyncSession, user_id: int, rows: List[Dict[str, Any]], merge_policy: str
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Insert cards against the (owner_id, word_key) unique index.
+
+    At most two statements whatever the number of rows: an INSERT that skips
+    conflicting rows, then one upsert (or, for ``keep``, one lookup) for the
+    rows that conflicted. Rows must have the same keys and distinct word_key.
+    Backends without RETURNING take two more lookups by word_key.
+
+    Returns:
+        ({word_key: 新卡片ID}, {word_key: 已有卡片ID})
+    """
+    if not db.bind.dialect.insert_executemany_returning:
+        return await _upsert_cards_without_returning(db, user_id, rows, merge_policy)
+    result = await db.execute(
+        insert_ignore(db, Card).returning(Card.id, Card.word_key), rows
+    )
+    inserted = {word_key: card_id for card_id, word_key in result.all()}
+    duplicates = [row for row in rows if row["word_key"] not in inserted]
+    if not duplicates:
+        return inserted, {}
+    if merge_policy == "keep":
+        result = await db.execute(
+            select(Card.id, Card.word_key).filter(
+                Card.owner_id == user_id,
+                Card.word_key.in_([row["word_key"] for row in duplicates]),
+            )
+        )
+    else:
+        columns = [column for column in MERGEABLE_CARD_COLUMNS if column in rows[0]]
+        result = await db.execute(
+            insert_or_update(
+                db,
+                Card,
+                ["owner_id", "word_key"],
+                _merge_card_columns(columns, merge_policy),
+            ).returning(Card.id, Card.word_key),
+            duplicates,
+        )
+    merged = {word_key: card_id for card_id, word_key in result.all()}
+    return inserted, merged
+
+
+async def _upsert_cards_without_returning(
+    db: AsyncSession, user_id: int, rows: List[Dict[str, Any]], merge_policy: str
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    # MySQL has no RETURNING: the existing cards are looked up first, under a
+    # locking read so no concurrent import can insert the same word keys before
+    # this transaction ends, and the new ids are read back after the INSERT
+    word_keys = [row["word_key"] for row in rows]
+    lookup = select(Card.id, Card.word_key).filter(
+        Card.owner_id == user_id, Card.word_key.in_(word_keys)
+    )
+    result = await db.execute(lookup.with_for_update())
+    merged = {word_key: card_id for card_id, word_key in result.all()}
+    new_rows = [row for row in rows if row["word_key"] not in merged]
+    if new_rows:
+        await db.execute(insert(Card), new_rows)
+    duplicates = [row for row in rows if row["word_key"] in merged]
+    if duplicates and merge_policy != "keep":
+        columns = [column for column in MERGEABLE_CARD_COLUMNS if column in rows[0]]
+        await db.execute(
+            insert_or_update(
+                db,
+                Card,
+                ["owner_id", "word_key"],
+                _merge_card_columns(columns, merge_policy),
+            ),
+            duplicates,
+        )
+    if not new_rows:
+        return {}, merged
+    result = await db.execute(
+        lookup.filter(Card.word_key.in_([row["word_key"] for row in new_rows]))
+    )
+    inserted = {word_key: card_id for card_id, word_key in result.all()}
+    return inserted, merged
+
+
+async def import_cards(
+    db: AsyncSession,
+    user_id: int,
+    batches: AsyncIterable[Sequence[Dict[str, Any]]],
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    media: Optional[Dict[str, str]] = None,
+    merge_policy: str = "keep",
+    on_batch: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> Tuple[int, int]:
+    """Bulk-upsert cards, one transaction per batch.
+
+    Each batch is upserted with a fixed number of statements (see
+    ``_upsert_cards``) and committed together with its daily stats rollup
+    change, so a failure keeps the batches committed before it. Cards whose
+    normalized word the user already has, in the database or earlier in the
+    batch, are merged according to ``merge_policy``. The user's cached due
+    queue is dropped once at the end instead of being updated card by card.
+    Media referenced by a card (its ``media`` list of file names) is linked in
+    the same transaction when the file is in ``media``; the blobs must already
+    be registered. A card's ``pronunciation`` file name is stored as the hash
+    of that file.
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        batches: 分批产出的卡片列值，键为 IMPORTED_CARD_COLUMNS 的子集、media
+            和 pronunciation
+        on_progress: 每个批次提交后以已导入数调用
+        media: 已存储的媒体文件 {文件名: sha256}
+        merge_policy: 重复卡片的合并策略，见 corelib.word_key.MERGE_POLICIES
+        on_batch: 每个批次（包括空批次）提交前以本批新建数和重复数调用，
+            可在同一事务中写入进度
+
+    Returns:
+        (新建的卡片数, 与已有卡片重复的笔记数)
+    """
+    n_imported = 0
+    n_duplicates = 0
+    try:
+        async for batch in batches:
+            n_batch_imported = 0
+            if batch:
+                now = datetime.now()
+                cards = {}
+                for card in batch:
+                    cards.setdefault(normalize_word(card["word"]), card)
+                rows = [
+                    {
+                        **{
+                            column: card.get(column, "")
+                            for column in IMPORTED_CARD_COLUMNS
+                        },
+                        "pronunciation": (media or {}).get(card.get("pronunciation")),
+                        "word_key": word_key,
+                        "owner_id": user_id,
+                        "next_review": now,
+                        "review_count": 0,
+                        "status": "learning",
+                    }
+                    for word_key, card in cards.items()
+                ]
+                inserted, merged = await _upsert_cards(db, user_id, rows, merge_policy)
+                if media:
+                    card_ids = inserted if merge_policy == "keep" else merged | inserted
+                    links = [
+                        {
+                            "card_id": card_ids[word_key],
+                            "sha256": media[filename],
+                            "filename": filename,
+                        }
+                        for word_key, card in cards.items()
+                        if word_key in card_ids
+                        for filename in card.get("media", ())
+                        if filename in media
+                    ]
+                    await link_card_media(db, links)
+                await record_daily_stats(
+                    db, user_id, status_changes=[(None, "learning")] * len(inserted)
+                )
+                n_batch_imported = len(inserted)
+            if on_batch is not None:
+                await on_batch(n_batch_imported, len(batch) - n_batch_imported)
+            if batch or on_batch is not None:
+                await db.commit()
+            n_imported += n_batch_imported
+            n_duplicates += len(batch) - n_batch_imported
+            if on_progress is not None:
+                await on_progress(n_imported)
     except Exception as exc:
         await db.rollback()
         raise exc
+    finally:
+        if n_imported:
+            invalidate_due_queue(user_id)
+    return n_imported, n_duplicates
@@ -0,0 +1,52 @@
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.import_job import ImportJob
+from models.outbox import OutboxMessage
+
+
+async def create_import_job(
+    db: AsyncSession, job: ImportJob, outbox_message: OutboxMessage
+) -> ImportJob:
+    """Save a job together with the outbox message that dispatches it."""
+    try:
+        db.add(job)
+        db.add(outbox_message)
+        await db.commit()
+        return job
+    except Exception as exc:
+        await db.rollback()
+        raise exc
+
+
+async def get_import_job(
+    db: AsyncSession, job_id: str, user_id: Optional[int] = None
+) -> Optional[ImportJob]:
+    query = select(ImportJob).filter(ImportJob.id == job_id)
+    if user_id is not None:
+        query = query.filter(ImportJob.owner_id == user_id)
+    result = await db.execute(query.execution_options(populate_existing=True))
+    return result.scalar_one_or_none()
+
+
+async def record_import_job_batch(
+    db: AsyncSession,
+    job_id: str,
+    n_notes: int,
+    n_imported: int,
+    n_duplicates: int,
+    last_note_id: Optional[int],
+):
+    """Add a batch to the job's progress, the caller commits it with the batch."""
+    await db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id)
+        .values(
+            processed_notes=ImportJob.processed_notes + n_notes,
+            imported=ImportJob.imported + n_imported,
+            duplicates=ImportJob.duplicates + n_duplicates,
+            last_note_id=last_note_id,
+        )
+    )
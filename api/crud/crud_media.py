@@ -0,0 +1,84 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from corelib.db import insert_ignore
+from models.card import Card
+from models.media import CardMedia, MediaBlob
+
+MEDIA_INSERT_CHUNK_SIZE = 1000
+
+
+async def register_media_blobs(db: AsyncSession, blobs: Iterable[Dict]):
+    """Record stored media files; blobs already known are left untouched.
+
+    Args:
+        db: 数据库会话
+        blobs: 媒体文件信息，包含 sha256、size、content_type
+    """
+    rows = {
+        blob["sha256"]: {
+            "sha256": blob["sha256"],
+            "size": blob["size"],
+            "content_type": blob["content_type"],
+        }
+        for blob in blobs
+    }
+    rows = list(rows.values())
+    for start in range(0, len(rows), MEDIA_INSERT_CHUNK_SIZE):
+        await db.execute(
+            insert_ignore(db, MediaBlob),
+            rows[start : start + MEDIA_INSERT_CHUNK_SIZE],
+        )
+
+
+async def link_card_media(db: AsyncSession, links: List[Dict]):
+    """Insert card to media references, the caller owns the transaction.
+
+    Args:
+        db: 数据库会话
+        links: 引用，包含 card_id、sha256、filename
+    """
+    for start in range(0, len(links), MEDIA_INSERT_CHUNK_SIZE):
+        await db.execute(
+            insert_ignore(db, CardMedia), links[start : start + MEDIA_INSERT_CHUNK_SIZE]
+        )
+
+
+async def get_media_blob(db: AsyncSession, sha256: str) -> Optional[MediaBlob]:
+    return await db.get(MediaBlob, sha256)
+
+
+async def get_card_media(db: AsyncSession, card_id: int) -> List:
+    """Media referenced by a card as (filename, sha256, content_type, size) rows."""
+    result = await db.execute(
+        select(
+            CardMedia.filename,
+            CardMedia.sha256,
+            MediaBlob.content_type,
+            MediaBlob.size,
+        )
+        .join(MediaBlob, MediaBlob.sha256 == CardMedia.sha256)
+        .filter(CardMedia.card_id == card_id)
+        .order_by(CardMedia.id)
+    )
+    return result.all()
+
+
+async def get_user_media(db: AsyncSession, user_id: int) -> AsyncIterator[Row]:
+    """Media referenced by a user's cards as (filename, sha256, size) rows.
+
+    A file name referenced by several cards is listed once per card, in the
+    order the references were created. Rows are fetched as they are consumed.
+    """
+    result = await db.stream(
+        select(CardMedia.filename, CardMedia.sha256, MediaBlob.size)
+        .join(MediaBlob, MediaBlob.sha256 == CardMedia.sha256)
+        .join(Card, Card.id == CardMedia.card_id)
+        .filter(Card.owner_id == user_id)
+        .order_by(CardMedia.id)
+        .execution_options(yield_per=MEDIA_INSERT_CHUNK_SIZE)
+    )
+    async for row in result:
+        yield row
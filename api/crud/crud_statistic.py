@@ -1,102 +1,279 @@
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from corelib.db import insert_ignore
+from corelib.spaced_repetition import get_review_status
 from models.card import Card, Review
+from models.statistic import UserDailyStats
 from schemas.statistics import Statistics
 
+CARD_STATUSES = ("learning", "reviewing", "mastered")
+REVIEW_RATINGS = range(1, 29)
+# ratings with a counter column in the rollup, as used by the review buttons
+COUNTED_RATINGS = range(1, 6)
+STATISTICS_WINDOW_DAYS = 30
+# cumulative columns carried from one day to the next
+SNAPSHOT_COLUMNS = (
+    *(f"rating_{rating}_count" for rating in COUNTED_RATINGS),
+    *(f"{card_status}_cards" for card_status in CARD_STATUSES),
+)
+
+
+def _day_key(value) -> str:
+    # func.date() returns a string on SQLite and a date on MySQL/PostgreSQL
+    return value.isoformat() if isinstance(value, date) else str(value)
+
 
 async def get_statistics(db: AsyncSession, user_id: int) -> Statistics:
-    # Get total cards
-    total_cards_query = select(func.count(Card.id)).filter(Card.owner_id == user_id)
-    total_cards = await db.scalar(total_cards_query)
+    now = datetime.now()
+    today = now.date()
+    window_start = today - timedelta(days=STATISTICS_WINDOW_DAYS - 1)
 
-    # Get cards by status
-    mastered_cards_query = select(func.count(Card.id)).filter(
-        Card.owner_id == user_id, Card.status == "mastered"
+    # Get due cards, the only figure that depends on the current time
+    due_cards = await db.scalar(
+        select(func.count(Card.id)).filter(
+            Card.owner_id == user_id, Card.next_review <= now
+        )
     )
-    mastered_cards = await db.scalar(mastered_cards_query)
 
-    learning_cards_query = select(func.count(Card.id)).filter(
-        Card.owner_id == user_id, Card.status == "learning"
+    # Get the rollup rows of the window, plus the last one before it so that
+    # snapshots can be carried forward into days without activity.
+    last_day_before_window = (
+        select(func.max(UserDailyStats.day))
+        .filter(UserDailyStats.user_id == user_id, UserDailyStats.day < window_start)
+        .scalar_subquery()
     )
-    learning_cards = await db.scalar(learning_cards_query)
-
-    reviewing_cards_query = select(func.count(Card.id)).filter(
-        Card.owner_id == user_id, Card.status == "reviewing"
+    result = await db.execute(
+        select(UserDailyStats)
+        .filter(
+            UserDailyStats.user_id == user_id,
+            UserDailyStats.day >= func.coalesce(last_day_before_window, window_start),
+            UserDailyStats.day <= today,
+        )
+        .order_by(UserDailyStats.day)
     )
-    reviewing_cards = await db.scalar(reviewing_cards_query)
+    rows = result.scalars().all()
+    latest = rows[-1] if rows else None
 
-    # Get due cards
-    due_cards_query = select(func.count(Card.id)).filter(
-        Card.owner_id == user_id, Card.next_review <= datetime.now()
-    )
-    due_cards = await db.scalar(due_cards_query)
+    def snapshot_at(day: date):
+        return next((row for row in reversed(rows) if row.day <= day), None)
+
+    # Get cards by status
+    status_counts = {
+        card_status: getattr(latest, f"{card_status}_cards", 0) or 0
+        for card_status in CARD_STATUSES
+    }
 
     # Get daily reviews for the last 30 days
+    daily_counts = {row.day: row.review_count for row in rows}
     daily_reviews = []
-    for i in range(29, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        daily_reviews_query = select(func.count(Review.id)).filter(
-            Review.card_id.in_(select(Card.id).filter(Card.owner_id == user_id)),
-            func.date(Review.review_date) == date.date(),
+    for i in range(STATISTICS_WINDOW_DAYS - 1, -1, -1):
+        day = today - timedelta(days=i)
+        daily_reviews.append(
+            {"date": day.isoformat(), "count": daily_counts.get(day, 0)}
         )
-        count = await db.scalar(daily_reviews_query)
-        daily_reviews.append({"date": date.date().isoformat(), "count": count})
 
     # Get review ratings distribution
-    review_ratings = []
-    for rating in range(1, 29):
-        ratings_query = select(func.count(Review.id)).filter(
-            Review.card_id.in_(select(Card.id).filter(Card.owner_id == user_id)),
-            Review.rating == rating,
-        )
-        count = await db.scalar(ratings_query)
-        review_ratings.append({"rating": rating, "count": count})
+    review_ratings = [
+        {"rating": rating, "count": getattr(latest, f"rating_{rating}_count", 0) or 0}
+        for rating in REVIEW_RATINGS
+    ]
 
     # Get card status trend
     card_status_trend = []
-    for i in range(30):
-        date = datetime.now() - timedelta(days=i)
+    for i in range(STATISTICS_WINDOW_DAYS):
+        day = today - timedelta(days=i)
+        snapshot = snapshot_at(day)
+        point = {"date": day.isoformat()}
+        for card_status in CARD_STATUSES:
+            point[card_status] = getattr(snapshot, f"{card_status}_cards", 0) or 0
+        card_status_trend.append(point)
 
-        learning_query = select(func.count(Card.id)).filter(
-            Card.owner_id == user_id,
-            Card.status == "learning",
-            func.date(Card.created_at) <= date.date(),
-        )
-        learning = await db.scalar(learning_query)
+    return Statistics(
+        total_cards=sum(status_counts.values()),
+        mastered_cards=status_counts["mastered"],
+        learning_cards=status_counts["learning"],
+        reviewing_cards=status_counts["reviewing"],
+        due_cards=due_cards,
+        daily_reviews=daily_reviews,
+        review_ratings=review_ratings,
+        card_status_trend=card_status_trend,
+    )
+
+
+async def record_daily_stats(
+    db: AsyncSession,
+    user_id: int,
+    *,
+    reviews: int = 0,
+    ratings: Iterable[int] = (),
+    status_changes: Iterable[Tuple[Optional[str], Optional[str]]] = (),
+):
+    """Apply card or review changes to today's rollup row.
+
+    The caller owns the transaction, so the changes are committed (or rolled
+    back) together with the card/review writes that caused them. Counters are
+    incremented in SQL (``col = col + n``) rather than read and written back,
+    so concurrent writers for the same user and day do not lose updates. Once
+    today's row exists this is a single UPDATE; the first write of the day
+    finds no row, inserts it with ``INSERT ... ON CONFLICT DO NOTHING`` and
+    updates it again. Ratings outside COUNTED_RATINGS are not counted.
 
-        reviewing_query = select(func.count(Card.id)).filter(
-            Card.owner_id == user_id,
-            Card.status == "reviewing",
-            func.date(Card.created_at) <= date.date(),
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        reviews: 新增的复习次数
+        ratings: 新增复习的评分
+        status_changes: 卡片状态变更 (变更前, 变更后)，新卡片的变更前状态为 None
+    """
+    deltas = Counter()
+    deltas["review_count"] += reviews
+    for rating in ratings:
+        if rating in COUNTED_RATINGS:
+            deltas[f"rating_{rating}_count"] += 1
+    for status_from, status_to in status_changes:
+        deltas[f"{status_from}_cards"] -= 1
+        deltas[f"{status_to}_cards"] += 1
+    values = {
+        column.key: column + deltas[column.key]
+        for column in UserDailyStats.__table__.columns
+        if deltas[column.key]
+    }
+    if not values:
+        return
+    today = datetime.now().date()
+    statement = (
+        update(UserDailyStats)
+        .filter(UserDailyStats.user_id == user_id, UserDailyStats.day == today)
+        .values(**values)
+    )
+    result = await db.execute(statement)
+    if result.rowcount:
+        return
+
+    # First change of the day, carry the snapshots of the last active day;
+    # a writer that loses the race keeps the row of the one that won
+    result = await db.execute(
+        select(UserDailyStats)
+        .filter(UserDailyStats.user_id == user_id, UserDailyStats.day < today)
+        .order_by(UserDailyStats.day.desc())
+        .limit(1)
+    )
+    latest = result.scalar_one_or_none()
+    await db.execute(
+        insert_ignore(db, UserDailyStats).values(
+            user_id=user_id,
+            day=today,
+            review_count=0,
+            **{
+                column: (getattr(latest, column) or 0) if latest else 0
+                for column in SNAPSHOT_COLUMNS
+            },
         )
-        reviewing = await db.scalar(reviewing_query)
+    )
+    await db.execute(statement)
+
+
+async def rebuild_daily_stats(
+    db: AsyncSession, user_id: int, chunk_size: int = 10000
+) -> int:
+    """Rebuild a user's rollup rows from the cards and reviews history.
+
+    Reviews are replayed in chunks of ``chunk_size`` ordered by id, so memory
+    stays bounded by the number of cards rather than the number of reviews.
+    The final snapshot is reconciled with the live card statuses, since cards
+    reviewed before reviews were recorded have no history to replay.
+
+    Returns:
+        写入的统计行数
+    """
+    deltas = defaultdict(
+        lambda: {"reviews": 0, "ratings": Counter(), "statuses": Counter()}
+    )
+
+    created_day = func.date(Card.created_at)
+    created_rows = await db.execute(
+        select(created_day, func.count(Card.id))
+        .filter(Card.owner_id == user_id)
+        .group_by(created_day)
+    )
+    for day, count in created_rows:
+        deltas[date.fromisoformat(_day_key(day))]["statuses"]["learning"] += count
 
-        mastered_query = select(func.count(Card.id)).filter(
-            Card.owner_id == user_id,
-            Card.status == "mastered",
-            func.date(Card.created_at) <= date.date(),
+    card_review_counts = defaultdict(int)
+    last_review_id = 0
+    while True:
+        result = await db.execute(
+            select(Review.id, Review.card_id, Review.rating, Review.review_date)
+            .join(Card, Card.id == Review.card_id)
+            .filter(Card.owner_id == user_id, Review.id > last_review_id)
+            .order_by(Review.id)
+            .limit(chunk_size)
         )
-        mastered = await db.scalar(mastered_query)
+        reviews = result.all()
+        if not reviews:
+            break
+        for _, card_id, rating, review_date in reviews:
+            delta = deltas[review_date.date()]
+            delta["reviews"] += 1
+            if rating in COUNTED_RATINGS:
+                delta["ratings"][rating] += 1
+            delta["statuses"][get_review_status(card_review_counts[card_id])] -= 1
+            card_review_counts[card_id] += 1
+            delta["statuses"][get_review_status(card_review_counts[card_id])] += 1
+        last_review_id = reviews[-1][0]
+
+    today = datetime.now().date()
+    live_rows = await db.execute(
+        select(Card.status, func.count(Card.id))
+        .filter(Card.owner_id == user_id)
+        .group_by(Card.status)
+    )
+    live_statuses = Counter(dict(live_rows.all()))
+    deltas[today]  # make sure the reconciled snapshot has a row
 
-        card_status_trend.append(
+    rows = []
+    ratings = Counter()
+    statuses = Counter()
+    for day in sorted(deltas):
+        delta = deltas[day]
+        ratings.update(delta["ratings"])
+        statuses.update(delta["statuses"])
+        if day == today:
+            statuses = Counter(
+                {
+                    card_status: live_statuses[card_status]
+                    for card_status in CARD_STATUSES
+                }
+            )
+        rows.append(
             {
-                "date": date.date().isoformat(),
-                "learning": learning,
-                "reviewing": reviewing,
-                "mastered": mastered,
+                "user_id": user_id,
+                "day": day,
+                "review_count": delta["reviews"],
+                **{
+                    f"rating_{rating}_count": ratings[rating]
+                    for rating in COUNTED_RATINGS
+                },
+                **{
+                    f"{card_status}_cards": statuses[card_status]
+                    for card_status in CARD_STATUSES
+                },
             }
         )
 
-    return Statistics(
-        total_cards=total_cards,
-        mastered_cards=mastered_cards,
-        learning_cards=learning_cards,
-        reviewing_cards=reviewing_cards,
-        due_cards=due_cards,
-        daily_reviews=daily_reviews,
-        review_ratings=review_ratings,
-        card_status_trend=card_status_trend,
-    )
+    try:
+        await db.execute(
+            delete(UserDailyStats).filter(UserDailyStats.user_id == user_id)
+        )
+        for i in range(0, len(rows), chunk_size):
+            await db.execute(insert(UserDailyStats), rows[i : i + chunk_size])
+        await db.commit()
+        return len(rows)
+    except Exception as exc:
+        await db.rollback()
+        raise exc
@@ -1,7 +1,13 @@
+from functools import partial
+from typing import Any, Dict, Sequence
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from corelib.security import get_password_hash
+from corelib.db import is_group_commit_enabled, submit_write
+from corelib.security import aget_password_hash
+from corelib.user_cache import invalidate_cached_user
+from models.outbox import OutboxMessage
 from models.user import User
 from schemas.user import UserCreate, UserUpdate
 
@@ -21,54 +27,80 @@ async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
     return result.scalars().all()
 
 
-async def create_user(db: AsyncSession, user: UserCreate):
+async def _write(db: AsyncSession, unit):
+    # with group commit enabled the unit is committed by the single writer,
+    # otherwise in the caller's session
+    if is_group_commit_enabled():
+        return await submit_write(unit)
     try:
-        hashed_password = get_password_hash(user.password)
-        db_user = User(email=user.email, hashed_password=hashed_password)
-        db.add(db_user)
+        result = await unit(db)
         await db.commit()
-        await db.refresh(db_user)
-        return db_user
+        return result
     except Exception as exc:
         await db.rollback()
         raise exc
 
 
+async def _add_user(
+    db: AsyncSession, db_user: User, outbox_messages: Sequence[OutboxMessage]
+):
+    db.add(db_user)
+    db.add_all(outbox_messages)
+    await db.flush()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def _apply_user_update(db: AsyncSession, user_id: int, values: Dict[str, Any]):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        for field, value in values.items():
+            setattr(db_user, field, value)
+        await db.flush()
+        await db.refresh(db_user)
+    return db_user
+
+
+async def _delete_user(db: AsyncSession, user_id: int):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        await db.delete(db_user)
+        await db.flush()
+    return db_user
+
+
+async def create_user(
+    db: AsyncSession, user: UserCreate, outbox_messages: Sequence[OutboxMessage] = ()
+):
+    """Create a user, committing outbox_messages in the same transaction."""
+    hashed_password = await aget_password_hash(user.password)
+    db_user = User(email=user.email, hashed_password=hashed_password)
+    return await _write(
+        db, partial(_add_user, db_user=db_user, outbox_messages=outbox_messages)
+    )
+
+
 async def update_user_profile(db: AsyncSession, user_id: int, user_update: UserUpdate):
-    try:
-        db_user = await get_user(db, user_id)
-        if db_user:
-            update_data = user_update.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(db_user, field, value)
-            await db.commit()
-            await db.refresh(db_user)
-        return db_user
-    except Exception as exc:
-        await db.rollback()
-        raise exc
+    values = user_update.model_dump(exclude_unset=True)
+    db_user = await _write(
+        db, partial(_apply_user_update, user_id=user_id, values=values)
+    )
+    if db_user:
+        await invalidate_cached_user(db_user.email)
+    return db_user
 
 
 async def cancel_subscription(db: AsyncSession, user_id: int):
-    try:
-        db_user = await get_user(db, user_id)
-        if db_user:
-            db_user.is_premium = False
-            await db.commit()
-            await db.refresh(db_user)
-        return db_user
-    except Exception as exc:
-        await db.rollback()
-        raise exc
+    db_user = await _write(
+        db, partial(_apply_user_update, user_id=user_id, values={"is_premium": False})
+    )
+    if db_user:
+        await invalidate_cached_user(db_user.email)
+    return db_user
 
 
 async def delete_user(db: AsyncSession, user_id: int):
-    try:
-        db_user = await get_user(db, user_id)
-        if db_user:
-            await db.delete(db_user)
-            await db.commit()
-        return db_user
-    except Exception as exc:
-        await db.rollback()
-        raise exc
+    db_user = await _write(db, partial(_delete_user, user_id=user_id))
+    if db_user:
+        await invalidate_cached_user(db_user.email)
+    return db_user
@@ -0,0 +1,77 @@
+"""add import jobs
+
+Revision ID: 2e6a8c0b4d57
+Revises: 9b3d5f7a1c24
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2e6a8c0b4d57"
+down_revision: Union[str, None] = "9b3d5f7a1c24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are created by Base.metadata.create_all on startup, which may
+    # already have built this one
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.String(length=32), nullable=False, comment="导入任务ID"),
+        sa.Column("owner_id", sa.Integer(), nullable=False, comment="用户ID"),
+        sa.Column("status", sa.String(), nullable=False, comment="任务状态"),
+        sa.Column("filename", sa.String(), nullable=False, comment="原始文件名"),
+        sa.Column(
+            "merge_policy", sa.String(), nullable=False, comment="重复卡片的合并策略"
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False, comment="已执行次数"),
+        sa.Column("total_notes", sa.Integer(), nullable=True, comment="笔记总数"),
+        sa.Column(
+            "processed_notes", sa.Integer(), nullable=False, comment="已处理笔记数"
+        ),
+        sa.Column("imported", sa.Integer(), nullable=False, comment="新建卡片数"),
+        sa.Column("duplicates", sa.Integer(), nullable=False, comment="重复笔记数"),
+        sa.Column(
+            "last_note_id", sa.BigInteger(), nullable=True, comment="已提交的笔记ID"
+        ),
+        sa.Column("media_files", sa.Integer(), nullable=True, comment="媒体文件数"),
+        sa.Column(
+            "new_media_bytes",
+            sa.BigInteger(),
+            nullable=True,
+            comment="新写入的媒体字节数",
+        ),
+        sa.Column("error", sa.Text(), nullable=True, comment="最近一次错误"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+            comment="创建时间",
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), nullable=True, comment="更新时间"
+        ),
+        sa.Column(
+            "finished_at", sa.DateTime(timezone=True), nullable=True, comment="完成时间"
+        ),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_import_jobs_owner_id", "import_jobs", ["owner_id"], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_import_jobs_owner_id", table_name="import_jobs", if_exists=True)
+    op.drop_table("import_jobs", if_exists=True)
@@ -0,0 +1,35 @@
+"""add cards owner_id next_review index
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9d7b10"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are created by Base.metadata.create_all on startup, which may
+    # already have built the index
+    op.create_index(
+        "ix_cards_owner_id_next_review",
+        "cards",
+        ["owner_id", "next_review"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_cards_owner_id_next_review", table_name="cards", if_exists=True)
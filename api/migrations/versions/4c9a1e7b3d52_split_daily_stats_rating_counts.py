@@ -0,0 +1,123 @@
+"""split user daily stats rating counts into counter columns
+
+Revision ID: 4c9a1e7b3d52
+Revises: 6b8d0e2f4a19
+Create Date: 2026-10-18 04:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4c9a1e7b3d52"
+down_revision: Union[str, None] = "6b8d0e2f4a19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+COUNTED_RATINGS = range(1, 6)
+
+
+def _rating_columns():
+    return [f"rating_{rating}_count" for rating in COUNTED_RATINGS]
+
+
+def _copy_rating_counts() -> None:
+    # the JSON map cannot be read portably in SQL, rows are converted here
+    bind = op.get_bind()
+    stats = sa.table(
+        "user_daily_stats",
+        sa.column("id", sa.Integer),
+        sa.column("rating_counts", sa.JSON),
+        *(sa.column(column, sa.Integer) for column in _rating_columns()),
+    )
+    rows = bind.execute(sa.select(stats.c.id, stats.c.rating_counts)).all()
+    updates = [
+        {
+            "stats_id": stats_id,
+            **{
+                f"count_{rating}": int((rating_counts or {}).get(str(rating), 0))
+                for rating in COUNTED_RATINGS
+            },
+        }
+        for stats_id, rating_counts in rows
+    ]
+    statement = (
+        sa.update(stats)
+        .where(stats.c.id == sa.bindparam("stats_id"))
+        .values(
+            {
+                f"rating_{rating}_count": sa.bindparam(f"count_{rating}")
+                for rating in COUNTED_RATINGS
+            }
+        )
+    )
+    for start in range(0, len(updates), BACKFILL_BATCH_SIZE):
+        bind.execute(statement, updates[start : start + BACKFILL_BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Base.metadata.create_all on startup builds the new columns (and no JSON
+    # one) for new databases
+    columns = {
+        column["name"]
+        for column in sa.inspect(op.get_bind()).get_columns("user_daily_stats")
+    }
+    with op.batch_alter_table("user_daily_stats") as batch_op:
+        for rating in COUNTED_RATINGS:
+            if f"rating_{rating}_count" not in columns:
+                batch_op.add_column(
+                    sa.Column(
+                        f"rating_{rating}_count",
+                        sa.Integer(),
+                        nullable=True,
+                        comment=f"累计评分为 {rating} 的复习数",
+                    )
+                )
+    if "rating_counts" in columns:
+        _copy_rating_counts()
+        with op.batch_alter_table("user_daily_stats") as batch_op:
+            batch_op.drop_column("rating_counts")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("user_daily_stats") as batch_op:
+        batch_op.add_column(
+            sa.Column("rating_counts", sa.JSON(), nullable=True, comment="累计评分分布")
+        )
+    bind = op.get_bind()
+    stats = sa.table(
+        "user_daily_stats",
+        sa.column("id", sa.Integer),
+        sa.column("rating_counts", sa.JSON),
+        *(sa.column(column, sa.Integer) for column in _rating_columns()),
+    )
+    rows = bind.execute(
+        sa.select(stats.c.id, *(stats.c[column] for column in _rating_columns()))
+    ).all()
+    statement = (
+        sa.update(stats)
+        .where(stats.c.id == sa.bindparam("stats_id"))
+        .values(rating_counts=sa.bindparam("counts"))
+    )
+    updates = [
+        {
+            "stats_id": row[0],
+            "counts": {
+                str(rating): count
+                for rating, count in zip(COUNTED_RATINGS, row[1:])
+                if count
+            },
+        }
+        for row in rows
+    ]
+    for start in range(0, len(updates), BACKFILL_BATCH_SIZE):
+        bind.execute(statement, updates[start : start + BACKFILL_BATCH_SIZE])
+    with op.batch_alter_table("user_daily_stats") as batch_op:
+        for column in _rating_columns():
+            batch_op.drop_column(column)
@@ -0,0 +1,70 @@
+"""add outbox messages
+
+Revision ID: 5c7e1b3a9f42
+Revises: 8a4e6c2f9d31
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c7e1b3a9f42"
+down_revision: Union[str, None] = "8a4e6c2f9d31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are created by Base.metadata.create_all on startup, which may
+    # already have built this one
+    op.create_table(
+        "outbox_messages",
+        sa.Column("id", sa.Integer(), nullable=False, comment="消息ID"),
+        sa.Column("task_name", sa.String(), nullable=False, comment="Celery 任务名"),
+        sa.Column("task_id", sa.String(), nullable=False, comment="Celery 任务ID"),
+        sa.Column("args", sa.JSON(), nullable=False, comment="任务位置参数"),
+        sa.Column(
+            "countdown", sa.Integer(), nullable=True, comment="投递后延迟执行秒数"
+        ),
+        sa.Column("expires", sa.Integer(), nullable=True, comment="投递后过期秒数"),
+        sa.Column("attempts", sa.Integer(), nullable=False, comment="已尝试投递次数"),
+        sa.Column(
+            "next_attempt_at", sa.DateTime(), nullable=False, comment="下次可投递时间"
+        ),
+        sa.Column(
+            "claimed_by", sa.String(), nullable=True, comment="认领该消息的投递器"
+        ),
+        sa.Column("last_error", sa.Text(), nullable=True, comment="最近一次投递错误"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+            comment="创建时间",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("task_id"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_outbox_messages_next_attempt_at",
+        "outbox_messages",
+        ["next_attempt_at"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_outbox_messages_next_attempt_at",
+        table_name="outbox_messages",
+        if_exists=True,
+    )
+    op.drop_table("outbox_messages", if_exists=True)
@@ -0,0 +1,212 @@
+"""add user daily stats and backfill them from cards and reviews
+
+Revision ID: 6b8d0e2f4a19
+Revises: 2e6a8c0b4d57
+Create Date: 2026-10-18 02:00:00.000000
+
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6b8d0e2f4a19"
+down_revision: Union[str, None] = "2e6a8c0b4d57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = 10000
+CARD_STATUSES = ("learning", "reviewing", "mastered")
+MASTERED_REVIEW_COUNT = 5
+
+
+def _review_status(review_count: int) -> str:
+    # frozen copy of corelib.spaced_repetition.get_review_status at this revision
+    if review_count == 0:
+        return "learning"
+    if review_count < MASTERED_REVIEW_COUNT:
+        return "reviewing"
+    return "mastered"
+
+
+def _day(value) -> date:
+    # func.date() returns a string on SQLite and a date on MySQL/PostgreSQL
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _backfill_user(bind, stats, cards, reviews, user_id: int) -> None:
+    # frozen copy of crud.crud_statistic.rebuild_daily_stats at this revision
+    deltas = defaultdict(
+        lambda: {"reviews": 0, "ratings": Counter(), "statuses": Counter()}
+    )
+    created_day = sa.func.date(cards.c.created_at)
+    for day, count in bind.execute(
+        sa.select(created_day, sa.func.count(cards.c.id))
+        .where(cards.c.owner_id == user_id)
+        .group_by(created_day)
+    ):
+        deltas[_day(day)]["statuses"]["learning"] += count
+
+    card_review_counts = defaultdict(int)
+    last_review_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                reviews.c.id,
+                reviews.c.card_id,
+                reviews.c.rating,
+                reviews.c.review_date,
+            )
+            .join(cards, cards.c.id == reviews.c.card_id)
+            .where(cards.c.owner_id == user_id, reviews.c.id > last_review_id)
+            .order_by(reviews.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        for _, card_id, rating, review_date in rows:
+            delta = deltas[review_date.date()]
+            delta["reviews"] += 1
+            if rating is not None:
+                delta["ratings"][str(rating)] += 1
+            delta["statuses"][_review_status(card_review_counts[card_id])] -= 1
+            card_review_counts[card_id] += 1
+            delta["statuses"][_review_status(card_review_counts[card_id])] += 1
+        last_review_id = rows[-1][0]
+
+    today = datetime.now().date()
+    live_statuses = Counter(
+        dict(
+            bind.execute(
+                sa.select(cards.c.status, sa.func.count(cards.c.id))
+                .where(cards.c.owner_id == user_id)
+                .group_by(cards.c.status)
+            ).all()
+        )
+    )
+    deltas[today]  # make sure the reconciled snapshot has a row
+
+    values = []
+    ratings = Counter()
+    statuses = Counter()
+    for day in sorted(deltas):
+        delta = deltas[day]
+        ratings.update(delta["ratings"])
+        statuses.update(delta["statuses"])
+        if day == today:
+            statuses = Counter(
+                {
+                    card_status: live_statuses[card_status]
+                    for card_status in CARD_STATUSES
+                }
+            )
+        values.append(
+            {
+                "user_id": user_id,
+                "day": day,
+                "review_count": delta["reviews"],
+                "rating_counts": dict(ratings),
+                **{
+                    f"{card_status}_cards": statuses[card_status]
+                    for card_status in CARD_STATUSES
+                },
+            }
+        )
+    # rows written since the table was created by create_all on startup
+    # carried snapshots from nothing, they are replaced
+    bind.execute(sa.delete(stats).where(stats.c.user_id == user_id))
+    for start in range(0, len(values), BACKFILL_CHUNK_SIZE):
+        bind.execute(sa.insert(stats), values[start : start + BACKFILL_CHUNK_SIZE])
+
+
+def _backfill_daily_stats() -> None:
+    bind = op.get_bind()
+    stats = sa.table(
+        "user_daily_stats",
+        sa.column("user_id", sa.Integer),
+        sa.column("day", sa.Date),
+        sa.column("review_count", sa.Integer),
+        sa.column("rating_counts", sa.JSON),
+        sa.column("learning_cards", sa.Integer),
+        sa.column("reviewing_cards", sa.Integer),
+        sa.column("mastered_cards", sa.Integer),
+    )
+    cards = sa.table(
+        "cards",
+        sa.column("id", sa.Integer),
+        sa.column("owner_id", sa.Integer),
+        sa.column("status", sa.String),
+        sa.column("created_at", sa.DateTime),
+    )
+    reviews = sa.table(
+        "reviews",
+        sa.column("id", sa.Integer),
+        sa.column("card_id", sa.Integer),
+        sa.column("rating", sa.Integer),
+        sa.column("review_date", sa.DateTime),
+    )
+    user_ids = bind.execute(
+        sa.select(cards.c.owner_id)
+        .where(cards.c.owner_id.is_not(None))
+        .distinct()
+        .order_by(cards.c.owner_id)
+    ).scalars()
+    for user_id in user_ids.all():
+        _backfill_user(bind, stats, cards, reviews, user_id)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are created by Base.metadata.create_all on startup, which may
+    # already have built this one
+    op.create_table(
+        "user_daily_stats",
+        sa.Column("id", sa.Integer(), nullable=False, comment="统计ID"),
+        sa.Column("user_id", sa.Integer(), nullable=True, comment="用户ID"),
+        sa.Column("day", sa.Date(), nullable=False, comment="统计日期"),
+        sa.Column("review_count", sa.Integer(), nullable=True, comment="当日复习次数"),
+        sa.Column("rating_counts", sa.JSON(), nullable=True, comment="累计评分分布"),
+        sa.Column(
+            "learning_cards", sa.Integer(), nullable=True, comment="学习中卡片数"
+        ),
+        sa.Column(
+            "reviewing_cards", sa.Integer(), nullable=True, comment="复习中卡片数"
+        ),
+        sa.Column(
+            "mastered_cards", sa.Integer(), nullable=True, comment="已掌握卡片数"
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+            comment="创建时间",
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), nullable=True, comment="更新时间"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "day"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_user_daily_stats_id",
+        "user_daily_stats",
+        ["id"],
+        unique=False,
+        if_not_exists=True,
+    )
+    _backfill_daily_stats()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_user_daily_stats_id", table_name="user_daily_stats", if_exists=True
+    )
+    op.drop_table("user_daily_stats", if_exists=True)
@@ -0,0 +1,63 @@
+"""add media blobs and card media
+
+Revision ID: 7d2e4f6a8b13
+Revises: 5c7e1b3a9f42
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2e4f6a8b13"
+down_revision: Union[str, None] = "5c7e1b3a9f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are created by Base.metadata.create_all on startup, which may
+    # already have built these
+    op.create_table(
+        "media_blobs",
+        sa.Column(
+            "sha256", sa.String(length=64), nullable=False, comment="内容的 SHA-256"
+        ),
+        sa.Column("size", sa.Integer(), nullable=False, comment="字节数"),
+        sa.Column("content_type", sa.String(), nullable=False, comment="MIME 类型"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+            comment="创建时间",
+        ),
+        sa.PrimaryKeyConstraint("sha256"),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "card_media",
+        sa.Column("id", sa.Integer(), nullable=False, comment="引用ID"),
+        sa.Column("card_id", sa.Integer(), nullable=False, comment="卡片ID"),
+        sa.Column("sha256", sa.String(length=64), nullable=False, comment="媒体文件"),
+        sa.Column("filename", sa.String(), nullable=False, comment="原始文件名"),
+        sa.ForeignKeyConstraint(["card_id"], ["cards.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["sha256"], ["media_blobs.sha256"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("card_id", "filename"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_card_media_sha256", "card_media", ["sha256"], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_card_media_sha256", table_name="card_media", if_exists=True)
+    op.drop_table("card_media", if_exists=True)
+    op.drop_table("media_blobs", if_exists=True)
@@ -0,0 +1,75 @@
+"""move cards schedule columns first
+
+Revision ID: 8a4e6c2f9d31
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4e6c2f9d31"
+down_revision: Union[str, None] = "3f1c2a9d7b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCHEDULE_FIRST_ORDER = (
+    "id",
+    "owner_id",
+    "next_review",
+    "review_count",
+    "status",
+    "word",
+    "created_at",
+    "updated_at",
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "pronunciation",
+    "tags",
+)
+CONTENT_FIRST_ORDER = (
+    "id",
+    "word",
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "pronunciation",
+    "tags",
+    "next_review",
+    "review_count",
+    "status",
+    "owner_id",
+    "created_at",
+    "updated_at",
+)
+
+
+def _reorder_cards_columns(order: tuple) -> None:
+    # only SQLite stores rows in declaration order with large values spilling
+    # into overflow pages; other backends are left untouched
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table(
+        "cards", recreate="always", partial_reordering=[order]
+    ) as batch_op:
+        batch_op.alter_column("id")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _reorder_cards_columns(SCHEDULE_FIRST_ORDER)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _reorder_cards_columns(CONTENT_FIRST_ORDER)
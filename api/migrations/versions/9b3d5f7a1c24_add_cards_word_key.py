@@ -0,0 +1,171 @@
+"""add cards word_key unique per user
+
+Revision ID: 9b3d5f7a1c24
+Revises: 7d2e4f6a8b13
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+
+import html
+import logging
+import re
+from collections import defaultdict
+from typing import List, Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3d5f7a1c24"
+down_revision: Union[str, None] = "7d2e4f6a8b13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+# content columns at this revision
+MERGED_CONTENT_COLUMNS = (
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "pronunciation",
+    "tags",
+)
+logger = logging.getLogger("alembic.runtime.migration")
+HTML_TAG = re.compile(r"<[^>]+>")
+
+
+def _normalize_word(word: str) -> str:
+    # frozen copy of corelib.word_key.normalize_word at this revision
+    text = html.unescape(HTML_TAG.sub("", word or ""))
+    return " ".join(text.casefold().split())
+
+
+def _merge_duplicates(bind, survivor_id: int, duplicate_ids: List[int]) -> None:
+    # the oldest card keeps its schedule, empty content is filled from the
+    # duplicates in id order, and their reviews and media links move over
+    cards = sa.table(
+        "cards", sa.column("id", sa.Integer), *map(sa.column, MERGED_CONTENT_COLUMNS)
+    )
+    reviews = sa.table("reviews", sa.column("card_id", sa.Integer))
+    card_media = sa.table(
+        "card_media",
+        sa.column("card_id", sa.Integer),
+        sa.column("filename", sa.String),
+    )
+    ids = [survivor_id, *duplicate_ids]
+    rows = {
+        row.id: row
+        for row in bind.execute(sa.select(cards).where(cards.c.id.in_(ids))).all()
+    }
+    values = {}
+    for column in MERGED_CONTENT_COLUMNS:
+        if getattr(rows[survivor_id], column):
+            continue
+        for duplicate_id in duplicate_ids:
+            if getattr(rows[duplicate_id], column):
+                values[column] = getattr(rows[duplicate_id], column)
+                break
+    if values:
+        bind.execute(sa.update(cards).where(cards.c.id == survivor_id).values(values))
+    bind.execute(
+        sa.update(reviews)
+        .where(reviews.c.card_id.in_(duplicate_ids))
+        .values(card_id=survivor_id)
+    )
+    for duplicate_id in duplicate_ids:
+        # a file name the survivor already links stays with the survivor's copy
+        linked = sa.select(card_media.c.filename).where(
+            card_media.c.card_id == survivor_id
+        )
+        bind.execute(
+            sa.update(card_media)
+            .where(
+                card_media.c.card_id == duplicate_id,
+                card_media.c.filename.not_in(linked.scalar_subquery()),
+            )
+            .values(card_id=survivor_id)
+        )
+    bind.execute(sa.delete(card_media).where(card_media.c.card_id.in_(duplicate_ids)))
+    bind.execute(sa.delete(cards).where(cards.c.id.in_(duplicate_ids)))
+
+
+def _backfill_word_keys() -> None:
+    # the unique index ignores NULL keys, so a duplicate left without its key
+    # would escape deduplication for good: the oldest card of each duplicate
+    # group gets the key and the others are merged into it
+    bind = op.get_bind()
+    cards = sa.table(
+        "cards",
+        sa.column("id", sa.Integer),
+        sa.column("owner_id", sa.Integer),
+        sa.column("word", sa.String),
+        sa.column("word_key", sa.String),
+    )
+    updates = []
+    rows = bind.execute(
+        sa.select(
+            cards.c.id, cards.c.owner_id, cards.c.word, cards.c.word_key
+        ).order_by(cards.c.id)
+    ).all()
+    # cards written by newer code already have their key
+    survivors = {
+        (owner_id, word_key): card_id
+        for card_id, owner_id, _, word_key in rows
+        if word_key is not None
+    }
+    duplicates = defaultdict(list)
+    for card_id, owner_id, word, existing_key in rows:
+        if existing_key is not None:
+            continue
+        word_key = _normalize_word(word)
+        if (owner_id, word_key) in survivors:
+            duplicates[survivors[owner_id, word_key]].append(card_id)
+            continue
+        survivors[owner_id, word_key] = card_id
+        updates.append({"card_id": card_id, "key": word_key})
+    for survivor_id, duplicate_ids in duplicates.items():
+        _merge_duplicates(bind, survivor_id, duplicate_ids)
+    if duplicates:
+        logger.info(
+            "merged %d duplicate cards into %d cards",
+            sum(map(len, duplicates.values())),
+            len(duplicates),
+        )
+    statement = (
+        sa.update(cards)
+        .where(cards.c.id == sa.bindparam("card_id"))
+        .values(word_key=sa.bindparam("key"))
+    )
+    for start in range(0, len(updates), BACKFILL_BATCH_SIZE):
+        bind.execute(statement, updates[start : start + BACKFILL_BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Base.metadata.create_all on startup builds the column for new databases
+    columns = {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("cards")
+    }
+    if "word_key" not in columns:
+        with op.batch_alter_table("cards") as batch_op:
+            batch_op.add_column(
+                sa.Column("word_key", sa.String(), nullable=True, comment="单词去重键")
+            )
+    _backfill_word_keys()
+    op.create_index(
+        "ix_cards_owner_id_word_key",
+        "cards",
+        ["owner_id", "word_key"],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_cards_owner_id_word_key", table_name="cards", if_exists=True)
+    with op.batch_alter_table("cards") as batch_op:
+        batch_op.drop_column("word_key")
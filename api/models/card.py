@@ -1,5 +1,5 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 from models.base import Base
@@ -7,29 +7,49 @@ from models.base import Base
 
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (
+        # due queue and keyset pagination: owner_id = ? ORDER BY next_review, id
+        Index("ix_cards_owner_id_next_review", "owner_id", "next_review"),
+        # one card per normalized word and user, target of import upserts
+        Index("ix_cards_owner_id_word_key", "owner_id", "word_key", unique=True),
+    )
 
+    # 调度相关的列放在前面：SQLite 按列顺序存储行数据，读取这些列时无需跨越
+    # 后面体积较大的内容列（可能位于溢出页）
     id = Column(Integer, primary_key=True, index=True, comment="卡片ID")
-    word = Column(String, index=True, comment="单词")
-    definition = Column(Text, nullable=False, comment="详细释义")
-    us_phonetic_symbols = Column(String, default="", comment="英美音标")
-    zh_definition = Column(Text, default="", comment="中文释义")
-    example = Column(Text, default="", comment="英文例句")
-    zh_example = Column(Text, default="", comment="中文例句")
-    notes = Column(Text, default="", comment="笔记")
-    pronunciation = Column(String, default="", comment="音频二进制数据")
-    tags = Column(String, default="", comment="标签")
+    owner_id = Column(Integer, ForeignKey("users.id"), comment="用户ID")
     next_review = Column(DateTime(timezone=True), comment="下次复习时间")
     review_count = Column(Integer, default=0, comment="复习次数")
     status = Column(
         String, default="learning", comment="学习状态"
     )  # learning, reviewing, mastered
-    owner_id = Column(Integer, ForeignKey("users.id"), comment="用户ID")
+    word = Column(String, index=True, comment="单词")
+    # 由 corelib.word_key.normalize_word 计算；迁移时重复的旧卡片已合并到最早的一张
+    word_key = Column(String, nullable=True, comment="单词去重键")
     created_at = Column(
         DateTime(timezone=True), server_default=func.now(), comment="创建时间"
     )
     updated_at = Column(
         DateTime(timezone=True), onupdate=func.now(), comment="更新时间"
     )
+    # 卡片内容只在展示时加载，查询时需使用 undefer_group("content")
+    definition = deferred(
+        Column(Text, nullable=False, comment="详细释义"), group="content"
+    )
+    us_phonetic_symbols = deferred(
+        Column(String, default="", comment="英美音标"), group="content"
+    )
+    zh_definition = deferred(
+        Column(Text, default="", comment="中文释义"), group="content"
+    )
+    example = deferred(Column(Text, default="", comment="英文例句"), group="content")
+    zh_example = deferred(Column(Text, default="", comment="中文例句"), group="content")
+    notes = deferred(Column(Text, default="", comment="笔记"), group="content")
+    # 音频本身存放在媒体存储中（media_blobs），这里只保存引用
+    pronunciation = deferred(
+        Column(String, default="", comment="发音音频的 SHA-256"), group="content"
+    )
+    tags = deferred(Column(String, default="", comment="标签"), group="content")
 
     owner = relationship("User", back_populates="cards")
     reviews = relationship("Review", back_populates="card")
@@ -0,0 +1,46 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+)
+from sqlalchemy.sql import func
+
+from models.base import Base
+
+
+class ImportJob(Base):
+    """在 Celery worker 上执行的 .apkg 导入任务，进度与每批卡片在同一事务中提交"""
+
+    __tablename__ = "import_jobs"
+
+    # 同时作为 Celery 任务ID
+    id = Column(String(32), primary_key=True, comment="导入任务ID")
+    owner_id = Column(
+        Integer, ForeignKey("users.id"), index=True, nullable=False, comment="用户ID"
+    )
+    status = Column(
+        String, default="pending", nullable=False, comment="任务状态"
+    )  # pending, running, succeeded, failed
+    filename = Column(String, nullable=False, comment="原始文件名")
+    merge_policy = Column(String, nullable=False, comment="重复卡片的合并策略")
+    attempts = Column(Integer, default=0, nullable=False, comment="已执行次数")
+    total_notes = Column(Integer, nullable=True, comment="笔记总数")
+    processed_notes = Column(Integer, default=0, nullable=False, comment="已处理笔记数")
+    imported = Column(Integer, default=0, nullable=False, comment="新建卡片数")
+    duplicates = Column(Integer, default=0, nullable=False, comment="重复笔记数")
+    # 最后一个已提交批次的最后一条笔记，重新执行时从这里继续
+    last_note_id = Column(BigInteger, nullable=True, comment="已提交的笔记ID")
+    media_files = Column(Integer, nullable=True, comment="媒体文件数")
+    new_media_bytes = Column(BigInteger, nullable=True, comment="新写入的媒体字节数")
+    error = Column(Text, nullable=True, comment="最近一次错误")
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), comment="创建时间"
+    )
+    updated_at = Column(
+        DateTime(timezone=True), onupdate=func.now(), comment="更新时间"
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
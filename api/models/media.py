@@ -0,0 +1,49 @@
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+
+from models.base import Base
+
+
+class MediaBlob(Base):
+    """按内容寻址的媒体文件，相同内容只存储一份"""
+
+    __tablename__ = "media_blobs"
+
+    sha256 = Column(String(64), primary_key=True, comment="内容的 SHA-256")
+    size = Column(Integer, nullable=False, comment="字节数")
+    content_type = Column(String, nullable=False, comment="MIME 类型")
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), comment="创建时间"
+    )
+
+
+class CardMedia(Base):
+    """卡片引用的媒体文件"""
+
+    __tablename__ = "card_media"
+    # also serves lookups by card_id
+    __table_args__ = (UniqueConstraint("card_id", "filename"),)
+
+    id = Column(Integer, primary_key=True, comment="引用ID")
+    card_id = Column(
+        Integer,
+        ForeignKey("cards.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="卡片ID",
+    )
+    sha256 = Column(
+        String(64),
+        ForeignKey("media_blobs.sha256"),
+        index=True,
+        nullable=False,
+        comment="媒体文件",
+    )
+    # 笔记字段中引用的文件名，如 [sound:word.mp3] 中的 word.mp3
+    filename = Column(String, nullable=False, comment="原始文件名")
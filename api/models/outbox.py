@@ -0,0 +1,26 @@
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from models.base import Base
+
+
+class OutboxMessage(Base):
+    """待投递到 Celery 的任务, 与触发它的业务数据在同一事务中写入"""
+
+    __tablename__ = "outbox_messages"
+    __table_args__ = (Index("ix_outbox_messages_next_attempt_at", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, comment="消息ID")
+    task_name = Column(String, nullable=False, comment="Celery 任务名")
+    task_id = Column(String, unique=True, nullable=False, comment="Celery 任务ID")
+    args = Column(JSON, nullable=False, comment="任务位置参数")
+    countdown = Column(Integer, nullable=True, comment="投递后延迟执行秒数")
+    expires = Column(Integer, nullable=True, comment="投递后过期秒数")
+    attempts = Column(Integer, default=0, nullable=False, comment="已尝试投递次数")
+    # 认领时推后到租约结束, 投递失败时推后到下次重试
+    next_attempt_at = Column(DateTime, nullable=False, comment="下次可投递时间")
+    claimed_by = Column(String, nullable=True, comment="认领该消息的投递器")
+    last_error = Column(Text, nullable=True, comment="最近一次投递错误")
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), comment="创建时间"
+    )
@@ -0,0 +1,39 @@
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Integer,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+
+from models.base import Base
+
+
+class UserDailyStats(Base):
+    __tablename__ = "user_daily_stats"
+    __table_args__ = (UniqueConstraint("user_id", "day"),)
+
+    id = Column(Integer, primary_key=True, index=True, comment="统计ID")
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), comment="用户ID"
+    )
+    day = Column(Date, nullable=False, comment="统计日期")
+    review_count = Column(Integer, default=0, comment="当日复习次数")
+    # cumulative snapshot as of the end of the day, one column per rating so
+    # that a review increments it in place
+    rating_1_count = Column(Integer, default=0, comment="累计评分为 1 的复习数")
+    rating_2_count = Column(Integer, default=0, comment="累计评分为 2 的复习数")
+    rating_3_count = Column(Integer, default=0, comment="累计评分为 3 的复习数")
+    rating_4_count = Column(Integer, default=0, comment="累计评分为 4 的复习数")
+    rating_5_count = Column(Integer, default=0, comment="累计评分为 5 的复习数")
+    learning_cards = Column(Integer, default=0, comment="学习中卡片数")
+    reviewing_cards = Column(Integer, default=0, comment="复习中卡片数")
+    mastered_cards = Column(Integer, default=0, comment="已掌握卡片数")
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), comment="创建时间"
+    )
+    updated_at = Column(
+        DateTime(timezone=True), onupdate=func.now(), comment="更新时间"
+    )
@@ -1,20 +1,39 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 
 class CardBase(BaseModel):
     word: str
     definition: str
+    us_phonetic_symbols: Optional[str] = None
+    zh_definition: Optional[str] = None
     example: Optional[str] = None
+    zh_example: Optional[str] = None
     notes: Optional[str] = None
+    tags: Optional[str] = None
 
 
 class CardCreate(CardBase):
     pass
 
 
+# a generated card is saved as is with POST /cards/
+class GeneratedCard(CardCreate):
+    pass
+
+
+class CardGenerationRequest(BaseModel):
+    words: List[str]
+
+
+class CardGenerationResult(BaseModel):
+    cards: List[GeneratedCard]
+    # words the provider returned no valid card for
+    failed: List[str]
+
+
 class CardUpdate(BaseModel):
     word: Optional[str] = None
     definition: Optional[str] = None
@@ -29,16 +48,91 @@ class Card(CardBase):
     review_count: int
     status: str
     owner_id: int
+    # SHA-256 of the pronunciation audio, served by GET /media/{sha256}
+    pronunciation: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+    @field_validator("pronunciation", mode="before")
+    @classmethod
+    def empty_pronunciation_to_none(cls, value):
+        return value or None
+
+
+class CardCursor(BaseModel):
+    after_next_review: datetime
+    after_id: int
+
+
+class CardPage(BaseModel):
+    items: List[Card]
+    next_cursor: Optional[CardCursor] = None
+
 
 class ReviewCreate(BaseModel):
     card_id: int
     rating: int
 
 
+class ReviewBatchItem(BaseModel):
+    card_id: int
+    rating: int
+    reviewed_at: Optional[datetime] = None
+
+
+class ReviewBatchResult(BaseModel):
+    card_id: int
+    success: bool
+    detail: Optional[str] = None
+    next_review: Optional[datetime] = None
+    review_count: Optional[int] = None
+    status: Optional[str] = None
+
+
+class CardMediaRef(BaseModel):
+    filename: str
+    sha256: str
+    content_type: str
+    size: int
+    url: str
+
+
+class ApkgUploadCreate(BaseModel):
+    filename: str
+    size: int
+    # hex SHA-256 of the whole file, checked when the upload is completed
+    sha256: str
+
+
+class ApkgUpload(BaseModel):
+    upload_id: str
+    size: int
+    # bytes received so far, the next chunk starts here
+    offset: int
+
+
+class ImportJob(BaseModel):
+    id: str
+    # pending, running, succeeded, failed
+    status: str
+    filename: str
+    total_notes: Optional[int] = None
+    processed_notes: int
+    imported: int
+    # notes whose word the user already has a card for, merged into it
+    duplicates: int
+    media_files: Optional[int] = None
+    # bytes written to the media store, files already stored cost nothing
+    new_media_bytes: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class Review(BaseModel):
     id: int
     card_id: int
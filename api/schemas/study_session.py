@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from schemas.card import Card
+
+# the due queue is snapshotted into process memory, one session holds at most
+# this many cards
+STUDY_SESSION_MAX_CARDS = 500
+
+
+class StudySessionCreate(BaseModel):
+    limit: int = Field(100, ge=1, le=STUDY_SESSION_MAX_CARDS)
+
+
+class StudySession(BaseModel):
+    id: str
+    total: int
+    remaining: int
+    created_at: datetime
+    expires_at: datetime
+
+
+class StudySessionCards(BaseModel):
+    items: List[Card]
+    remaining: int
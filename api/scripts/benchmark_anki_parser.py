@@ -0,0 +1,124 @@
+"""Compare peak memory and time of the .apkg parser APIs on a large deck.
+
+Each mode runs in a fresh interpreter so peak RSS is its own:
+
+- legacy: what `parse_apkg` used to do, extract the whole archive including
+  media, then `fetchall()` every note into one list
+- parse_apkg: the list API, which now only extracts the collection
+- open_apkg: the streaming API, notes are consumed one at a time
+
+Usage:
+    python -m scripts.benchmark_anki_parser --notes 200000 --media 200 --media-kb 512
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from anki_parser import FIELD_SEPARATOR, open_apkg, parse_apkg
+from scripts.benchmark_apkg_import import build_synthetic_apkg
+
+MODES = ("legacy", "parse_apkg", "open_apkg")
+
+
+def legacy_parse(apkg_path: str) -> int:
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with zipfile.ZipFile(apkg_path, "r") as zf:
+            zf.extractall(temp_dir)
+        conn = sqlite3.connect(os.path.join(temp_dir, "collection.anki2"))
+        (models_json_str,) = conn.execute("SELECT models FROM col").fetchone()
+        models = json.loads(models_json_str)
+        notes = []
+        for note_id, model_id, flds_str, tags_str in conn.execute(
+            "SELECT id, mid, flds, tags FROM notes"
+        ).fetchall():
+            field_names = [fld["name"] for fld in models[str(model_id)]["flds"]]
+            notes.append(
+                {
+                    "id": note_id,
+                    "fields": dict(zip(field_names, flds_str.split(FIELD_SEPARATOR))),
+                    "tags": tags_str.split(),
+                }
+            )
+        conn.close()
+        return len(notes)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def run_mode(mode: str, apkg_path: str):
+    baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    st = time.perf_counter()
+    if mode == "legacy":
+        n_notes = legacy_parse(apkg_path)
+    elif mode == "parse_apkg":
+        n_notes = len(parse_apkg(apkg_path)["notes"])
+    else:
+        with open_apkg(apkg_path) as apkg:
+            n_notes = sum(1 for _ in apkg["notes"])
+    elapsed = time.perf_counter() - st
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        json.dumps(
+            {
+                "notes": n_notes,
+                "seconds": elapsed,
+                "peak_rss_mb": peak_kib / 1024,
+                "delta_rss_mb": (peak_kib - baseline_kib) / 1024,
+            }
+        )
+    )
+
+
+def main(n_notes: int, n_media: int, media_kb: int):
+    tmp_dir = tempfile.mkdtemp()
+    apkg_path = build_synthetic_apkg(
+        os.path.join(tmp_dir, "large.apkg"), n_notes, n_media, media_kb * 1024
+    )
+    print(
+        f"deck: {n_notes} notes, {n_media} media files, "
+        f"{os.path.getsize(apkg_path) / 1e6:.1f}MB"
+    )
+    for mode in MODES:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "scripts.benchmark_anki_parser",
+                "--run",
+                mode,
+                apkg_path,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:<11} notes={stats['notes']:7d} time={stats['seconds']:6.2f}s "
+            f"peak rss={stats['peak_rss_mb']:7.1f}MB "
+            f"(+{stats['delta_rss_mb']:6.1f}MB while parsing)"
+        )
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--media", type=int, default=200)
+    parser.add_argument("--media-kb", type=int, default=512)
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "APKG_PATH"))
+    args = parser.parse_args()
+    if args.run:
+        run_mode(*args.run)
+    else:
+        main(args.notes, args.media, args.media_kb)
@@ -0,0 +1,255 @@
+"""Benchmark exporting cards as .apkg and check the export round-trips.
+
+For each size in `--cards` a user gets that many cards (every tenth with a
+pronunciation file) through `crud_card.import_cards`, then the collection is
+downloaded from `GET /cards/export.apkg` of the app in this process and
+written to disk as it streams in. The anonymous resident set size is sampled
+during the export (the database is read through mmap, file pages are left
+out); its peak growth must not depend on the number of cards. The file is
+parsed again with `anki_parser.parse_apkg` and every note must map back to
+its card, media included.
+
+Usage:
+    python -m scripts.benchmark_apkg_export --cards 5000 50000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from functools import partial
+
+from sqlalchemy import select
+from sqlalchemy.orm import undefer_group
+
+from corelib.config import settings
+
+# the export reads through the app's engine, point it at a scratch database
+work_dir = tempfile.mkdtemp()
+settings.SQLALCHEMY_DATABASE_URL = (
+    f"sqlite:///{os.path.join(work_dir, 'benchmark_apkg_export.db')}"
+)
+settings.MEDIA_ROOT_PATH = os.path.join(work_dir, "media")
+
+from anki_parser import parse_apkg  # noqa: E402
+from api.deps import get_current_active_user  # noqa: E402
+from app import app  # noqa: E402
+from corelib.apkg_import import note_to_card  # noqa: E402
+from corelib.db import dispose_engines, get_engine, get_session_local  # noqa: E402
+from corelib.media_store import store_media  # noqa: E402
+from crud.crud_card import import_cards  # noqa: E402
+from crud.crud_media import register_media_blobs  # noqa: E402
+from models.base import Base  # noqa: E402
+from models.card import Card  # noqa: E402
+from models.user import User  # noqa: E402
+from scripts.benchmark_chunked_upload import RssSampler  # noqa: E402
+
+BATCH_SIZE = 1000
+# allowed peak growth difference between the smallest and the largest export
+MAX_RSS_GROWTH_DIFF_MB = 16
+ROUND_TRIP_COLUMNS = ("word", "definition", "us_phonetic_symbols", "example", "notes")
+
+
+def anon_rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def make_cards(user_id: int, n_cards: int):
+    return [
+        {
+            "word": f"word{user_id}_{i}",
+            "definition": f"n. meaning of word {i} " + "x" * 200,
+            "us_phonetic_symbols": f"/wɜːd{i}/",
+            "example": f"An example sentence that uses word{i}.",
+            "notes": "<b>bold</b> &amp; [sound:ignored.mp3]" if i % 7 == 0 else "",
+            "tags": "cet4 exam" if i % 3 == 0 else "",
+            "media": [f"word{i}.mp3"] if i % 10 == 0 else [],
+            "pronunciation": f"word{i}.mp3" if i % 10 == 0 else None,
+        }
+        for i in range(n_cards)
+    ]
+
+
+def store_sounds(cards):
+    stored = {}
+    for card in cards:
+        for filename in card["media"]:
+            content = hashlib.sha256(filename.encode()).digest() * 32
+            sha256, size, _ = store_media(partial(io.BytesIO, content))
+            stored[filename] = {
+                "sha256": sha256,
+                "size": size,
+                "content_type": "audio/mpeg",
+            }
+    return stored
+
+
+async def populate(user_id: int, n_cards: int):
+    cards = make_cards(user_id, n_cards)
+    stored = store_sounds(cards)
+    async with get_session_local()() as db:
+        db.add(User(id=user_id, email=f"bench{user_id}@anki.ai", hashed_password="x"))
+        await db.commit()
+        await register_media_blobs(db, stored.values())
+        await db.commit()
+
+        async def batches():
+            for start in range(0, len(cards), BATCH_SIZE):
+                yield cards[start : start + BATCH_SIZE]
+
+        await import_cards(
+            db=db,
+            user_id=user_id,
+            batches=batches(),
+            media={filename: blob["sha256"] for filename, blob in stored.items()},
+        )
+    return stored
+
+
+async def export(apkg_path: str) -> int:
+    # called on the ASGI app directly: httpx's ASGITransport collects the
+    # whole response body before returning it
+    size = 0
+    status = None
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/cards/export.apkg",
+        "raw_path": b"/api/v1/cards/export.apkg",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+
+    is_requested = False
+    is_done = asyncio.Event()
+
+    async def receive():
+        nonlocal is_requested
+        if not is_requested:
+            is_requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await is_done.wait()
+        return {"type": "http.disconnect"}
+
+    with open(apkg_path, "wb") as f:
+
+        async def send(message):
+            nonlocal size, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message["body"])
+                f.write(message["body"])
+                if not message.get("more_body", False):
+                    is_done.set()
+
+        await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"export failed with status {status}")
+    return size
+
+
+async def check_round_trip(user_id: int, apkg_path: str, stored) -> bool:
+    apkg = parse_apkg(apkg_path)
+    if apkg is None:
+        print("[!] the export cannot be parsed")
+        return False
+    async with get_session_local()() as db:
+        result = await db.execute(
+            select(Card)
+            .filter(Card.owner_id == user_id)
+            .options(undefer_group("content"))
+        )
+        db_cards = result.scalars().all()
+    if len(apkg["notes"]) != len(db_cards):
+        print(f"[!] {len(apkg['notes'])} notes exported for {len(db_cards)} cards")
+        return False
+    sha256_by_filename = {name: blob["sha256"] for name, blob in stored.items()}
+    with zipfile.ZipFile(apkg_path) as zf:
+        for member, filename in apkg["media_files"].items():
+            if hashlib.sha256(zf.read(member)).hexdigest() != sha256_by_filename.get(
+                filename
+            ):
+                print(f"[!] media file {filename} does not match its card")
+                return False
+    if len(apkg["media_files"]) != len(stored):
+        print(f"[!] {len(apkg['media_files'])} media files for {len(stored)}")
+        return False
+    db_cards = {db_card.word: db_card for db_card in db_cards}
+    for note in apkg["notes"]:
+        card = note_to_card(note["fields"], note["tags"])
+        db_card = db_cards.pop(card["word"] if card else None, None)
+        if db_card is None:
+            print(f"[!] note {note['id']} has no card")
+            return False
+        expected = {
+            column: getattr(db_card, column) or "" for column in ROUND_TRIP_COLUMNS
+        }
+        actual = {column: card.get(column, "") for column in ROUND_TRIP_COLUMNS}
+        pronunciation = sha256_by_filename.get(card["pronunciation"])
+        if (
+            actual != expected
+            or card["tags"] != (db_card.tags or "")
+            or pronunciation != (db_card.pronunciation or None)
+        ):
+            print(f"[!] note {note['id']} does not match card {db_card.id}")
+            print(f"    exported {card}")
+            return False
+    return True
+
+
+async def main(sizes) -> bool:
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    growths = []
+    for user_id, n_cards in enumerate(sizes, start=1):
+        stored = await populate(user_id, n_cards)
+        user = User(id=user_id, email="bench@anki.ai", hashed_password="x")
+        user.is_active = True
+        app.dependency_overrides[get_current_active_user] = lambda user=user: user
+        apkg_path = os.path.join(work_dir, f"export_{user_id}.apkg")
+        with RssSampler(read=anon_rss_bytes) as sampler:
+            baseline = sampler.peak
+            st = time.perf_counter()
+            size = await export(apkg_path)
+            export_seconds = time.perf_counter() - st
+        growth_mb = (sampler.peak - baseline) / 1e6
+        growths.append(growth_mb)
+        st = time.perf_counter()
+        is_valid = await check_round_trip(user_id, apkg_path, stored)
+        parse_seconds = time.perf_counter() - st
+        print(
+            f"{n_cards:7d} cards export {export_seconds:6.2f}s "
+            f"size={size / 1e6:6.1f}MB peak rss growth={growth_mb:6.1f}MB "
+            f"round trip ok={is_valid} ({parse_seconds:.2f}s)"
+        )
+        if not is_valid:
+            return False
+    await dispose_engines()
+    if max(growths) - min(growths) > MAX_RSS_GROWTH_DIFF_MB:
+        print("[!] peak rss grows with the number of cards")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, nargs="+", default=[5000, 50000])
+    args = parser.parse_args()
+    if not asyncio.run(main(args.cards)):
+        sys.exit(1)
@@ -0,0 +1,179 @@
+"""Benchmark importing a large .apkg deck into cards.
+
+A synthetic exam deck (collection.anki2 plus media files) is built in a temp
+dir and imported the way the import worker does: read batch by batch on a
+thread and inserted with `crud_card.import_cards`. For
+reference the first notes are also imported one `create_card` call at a time.
+
+Usage:
+    python -m scripts.benchmark_apkg_import --notes 30000 [--batch-size 1000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.apkg_import import (
+    iter_apkg_card_batches,
+    read_apkg_cards,
+    read_apkg_collection,
+)
+from crud.crud_card import create_card, import_cards
+from models.base import Base
+from models.card import Card
+from models.user import User
+from schemas.card import CardCreate
+
+MODEL_ID = 1342697561419
+DECK_ID = 1
+N_CREATE_CARD_NOTES = 500
+
+
+def build_synthetic_apkg(
+    apkg_path: str, n_notes: int, n_media: int = 0, media_bytes: int = 0
+) -> str:
+    """Write an .apkg with n_notes word notes and n_media media files."""
+    work_dir = tempfile.mkdtemp()
+    collection_path = os.path.join(work_dir, "collection.anki2")
+    conn = sqlite3.connect(collection_path)
+    conn.execute("CREATE TABLE col (id INTEGER PRIMARY KEY, decks TEXT, models TEXT)")
+    conn.execute(
+        "CREATE TABLE notes (id INTEGER PRIMARY KEY, mid INTEGER, flds TEXT, tags TEXT)"
+    )
+    decks = {str(DECK_ID): {"id": DECK_ID, "name": "CET-4"}}
+    models = {
+        str(MODEL_ID): {
+            "id": MODEL_ID,
+            "name": "CET-4 word",
+            "flds": [
+                {"name": name} for name in ("单词", "音标", "释义", "例句", "发音")
+            ],
+        }
+    }
+    conn.execute(
+        "INSERT INTO col (id, decks, models) VALUES (1, ?, ?)",
+        (json.dumps(decks), json.dumps(models)),
+    )
+    conn.executemany(
+        "INSERT INTO notes (id, mid, flds, tags) VALUES (?, ?, ?, ?)",
+        (
+            (
+                i + 1,
+                MODEL_ID,
+                "\x1f".join(
+                    (
+                        f"<b>word{i}</b>",
+                        f"/wɜːd{i}/",
+                        f"n. meaning of word {i}; " * 4,
+                        f"An example sentence that uses word{i} in context. " * 2,
+                        f"[sound:word{i}.mp3]",
+                    )
+                ),
+                " CET4 vocabulary ",
+            )
+            for i in range(n_notes)
+        ),
+    )
+    conn.commit()
+    conn.close()
+    media_block = os.urandom(media_bytes)
+    with zipfile.ZipFile(apkg_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(collection_path, "collection.anki2")
+        zf.writestr(
+            "media", json.dumps({str(i): f"word{i}.mp3" for i in range(n_media)})
+        )
+        for i in range(n_media):
+            # media is already compressed audio, store it as is
+            zf.writestr(zipfile.ZipInfo(str(i)), i.to_bytes(8, "big") + media_block)
+    os.remove(collection_path)
+    os.rmdir(work_dir)
+    return apkg_path
+
+
+async def main(n_notes: int, batch_size: int):
+    tmp_dir = tempfile.mkdtemp()
+    apkg_path = build_synthetic_apkg(os.path.join(tmp_dir, "exam.apkg"), n_notes)
+    print(f"deck: {n_notes} notes, {os.path.getsize(apkg_path) / 1e6:.1f}MB")
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'benchmark_apkg_import.db')}"
+    )
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_local() as session:
+        users = [
+            User(email=f"bench-{i}@anki.ai", hashed_password="x") for i in range(2)
+        ]
+        session.add_all(users)
+        await session.commit()
+
+    st = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        collection = await asyncio.get_running_loop().run_in_executor(
+            executor, read_apkg_collection, apkg_path, tmp_dir
+        )
+
+        async def card_batches():
+            async for cards, _, _ in iter_apkg_card_batches(
+                collection, batch_size, executor
+            ):
+                yield cards
+
+        async with session_local() as session:
+            n_imported, _ = await import_cards(session, users[0].id, card_batches())
+    import_seconds = time.perf_counter() - st
+    print(
+        f"import       {import_seconds:6.2f}s "
+        f"({n_imported / import_seconds:8.0f} cards/s, batch size {batch_size}, "
+        "parsed on a thread while inserting)"
+    )
+
+    cards, _, _ = read_apkg_cards(
+        collection["db_path"], collection["models"], None, N_CREATE_CARD_NOTES
+    )
+    st = time.perf_counter()
+    async with session_local() as session:
+        for card in cards:
+            await create_card(
+                session,
+                CardCreate(
+                    word=card["word"],
+                    definition=card["definition"],
+                    example=card.get("example"),
+                ),
+                users[1].id,
+            )
+    create_seconds = time.perf_counter() - st
+    rate = N_CREATE_CARD_NOTES / create_seconds
+    print(
+        f"create_card  {create_seconds:6.2f}s "
+        f"({rate:8.0f} cards/s, {N_CREATE_CARD_NOTES} cards, "
+        f"~{n_notes / rate:.0f}s for the whole deck)"
+    )
+
+    async with session_local() as session:
+        n_cards = await session.scalar(
+            select(func.count(Card.id)).filter(Card.owner_id == users[0].id)
+        )
+    assert n_cards == n_notes, (n_cards, n_notes)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=30000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.notes, args.batch_size))
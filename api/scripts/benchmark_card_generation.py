@@ -0,0 +1,96 @@
+"""Benchmark generating cards against a fake LLM with simulated latency.
+
+`corelib.card_generation.generate_cards` is run for `--words` words with a
+`FakeCardProvider` whose calls take `--latency` seconds plus `--per-word`
+seconds per word in the prompt. Every batch size in `--batch-sizes` is run
+with `--concurrency` calls in flight at most. Every word must get its card,
+the provider must never see more calls at once than allowed, and a word the
+provider leaves out of its answer must be reported as failed.
+
+Usage:
+    python -m scripts.benchmark_card_generation --words 200 --batch-sizes 1 10
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+
+from corelib.card_generation import FakeCardProvider, generate_cards
+
+
+class DroppingFakeCardProvider(FakeCardProvider):
+    """Leaves the last word of every batch out of its answer."""
+
+    async def generate(self, system_prompt: str, prompt: str) -> str:
+        text = await super().generate(system_prompt, prompt)
+        cards = json.loads(text.removeprefix("```json\n").removesuffix("\n```"))
+        return json.dumps(cards[:-1], ensure_ascii=False)
+
+
+async def check_dropped_words() -> bool:
+    words = [f"word{i}" for i in range(6)]
+    provider = DroppingFakeCardProvider(max_batch_size=3)
+    cards, failed = await generate_cards(words, provider, max_concurrency=2)
+    expected_failed = ["word2", "word5"]
+    if failed != expected_failed or len(cards) != len(words) - len(expected_failed):
+        print(f"[!] expected {expected_failed} to fail, got {failed}")
+        return False
+    return True
+
+
+async def main(
+    n_words: int,
+    batch_sizes,
+    max_concurrency: int,
+    latency_seconds: float,
+    per_word_seconds: float,
+) -> bool:
+    # duplicates in other spellings are generated once
+    words = [f"word{i}" for i in range(n_words)] + ["WORD0", " word1 "]
+    has_failed = False
+    for batch_size in batch_sizes:
+        provider = FakeCardProvider(
+            max_batch_size=batch_size,
+            latency_seconds=latency_seconds,
+            per_word_seconds=per_word_seconds,
+        )
+        st = time.perf_counter()
+        cards, failed = await generate_cards(words, provider, max_concurrency)
+        seconds = time.perf_counter() - st
+        print(
+            f"batch size {batch_size:3d} concurrency {max_concurrency:3d} "
+            f"{seconds:6.2f}s {len(cards) / seconds:8.1f} words/s "
+            f"calls={provider.n_calls} max in flight={provider.max_in_flight} "
+            f"failed={len(failed)}"
+        )
+        if failed or [card.word for card in cards] != words[:n_words]:
+            print("[!] some words did not get their card, or not in order")
+            has_failed = True
+        if provider.n_calls != math.ceil(n_words / batch_size):
+            print(f"[!] expected {math.ceil(n_words / batch_size)} calls")
+            has_failed = True
+        if provider.max_in_flight > max_concurrency:
+            print("[!] more calls in flight than the concurrency limit")
+            has_failed = True
+    if not await check_dropped_words():
+        has_failed = True
+    return not has_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--per-word", type=float, default=0.02)
+    args = parser.parse_args()
+    if not asyncio.run(
+        main(
+            args.words, args.batch_sizes, args.concurrency, args.latency, args.per_word
+        )
+    ):
+        sys.exit(1)
@@ -0,0 +1,144 @@
+"""Benchmark server memory while uploading .apkg files in chunks.
+
+Files of each size in `--sizes-mb` are sent through the chunked upload
+endpoints (init, PUT chunks with offsets) of the app in this process, the
+request bodies streamed in small pieces the way a server receives them. The
+resident set size is sampled during the upload and the checksum verification.
+The peak growth must not depend on the file size.
+
+Usage:
+    python -m scripts.benchmark_chunked_upload --sizes-mb 16 192 --chunk-mb 8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+from api.deps import get_current_active_user
+from app import app
+from corelib.chunked_upload import delete_upload, get_upload, verify_upload
+from models.user import User
+
+# size of the pieces a request body arrives in, as sent by uvicorn
+BODY_PIECE_BYTES = 64 * 1024
+# allowed peak growth difference between the smallest and the largest file
+MAX_RSS_GROWTH_DIFF_MB = 16
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+class RssSampler:
+    def __init__(self, interval_seconds: float = 0.005, read=rss_bytes):
+        self.interval_seconds = interval_seconds
+        self.read = read
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.read())
+            time.sleep(self.interval_seconds)
+
+    def __enter__(self):
+        self.peak = self.read()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def file_pieces(size: int, block: bytes):
+    # deterministic content, generated on the fly so the client holds no file
+    for offset in range(0, size, BODY_PIECE_BYTES):
+        n = min(BODY_PIECE_BYTES, size - offset)
+        prefix = offset.to_bytes(8, "big")
+        yield (prefix + block)[:n]
+
+
+async def upload(client: httpx.AsyncClient, size: int, chunk_bytes: int, block: bytes):
+    digest = hashlib.sha256()
+    for piece in file_pieces(size, block):
+        digest.update(piece)
+    r = await client.post(
+        "/api/v1/cards/import/uploads",
+        json={"filename": "deck.apkg", "size": size, "sha256": digest.hexdigest()},
+    )
+    upload_id = r.json()["upload_id"]
+
+    pieces = file_pieces(size, block)
+    offset = 0
+    while offset < size:
+        n_pieces = min(chunk_bytes, size - offset) // BODY_PIECE_BYTES or 1
+
+        async def body():
+            for _ in range(n_pieces):
+                piece = next(pieces, None)
+                if piece is not None:
+                    yield piece
+
+        r = await client.put(
+            f"/api/v1/cards/import/uploads/{upload_id}",
+            params={"offset": offset},
+            content=body(),
+        )
+        r.raise_for_status()
+        offset = r.json()["offset"]
+    return upload_id
+
+
+async def main(sizes_mb, chunk_mb: int) -> bool:
+    user = User(id=1, email="bench@anki.ai", hashed_password="x", is_active=True)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    block = os.urandom(BODY_PIECE_BYTES)
+    transport = httpx.ASGITransport(app=app)
+    growths = []
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # warm up imports and allocator arenas
+        delete_upload(await upload(client, 4 * 1024 * 1024, chunk_mb << 20, block))
+        for size_mb in sizes_mb:
+            size = size_mb << 20
+            with RssSampler() as sampler:
+                baseline = sampler.peak
+                st = time.perf_counter()
+                upload_id = await upload(client, size, chunk_mb << 20, block)
+                upload_seconds = time.perf_counter() - st
+                is_valid = verify_upload(get_upload(upload_id, user.id))
+            delete_upload(upload_id)
+            growth_mb = (sampler.peak - baseline) / 1e6
+            growths.append(growth_mb)
+            print(
+                f"{size_mb:5d}MB upload {upload_seconds:6.2f}s "
+                f"({size_mb / upload_seconds:6.0f}MB/s) checksum ok={is_valid} "
+                f"peak rss growth={growth_mb:6.1f}MB"
+            )
+            if not is_valid:
+                print(f"[!] {size_mb}MB upload failed its checksum")
+                return False
+    if max(growths) - min(growths) > MAX_RSS_GROWTH_DIFF_MB:
+        print("[!] peak rss grows with the file size")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 192])
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    args = parser.parse_args()
+    if not asyncio.run(main(args.sizes_mb, args.chunk_mb)):
+        sys.exit(1)
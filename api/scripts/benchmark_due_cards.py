@@ -0,0 +1,173 @@
+"""Benchmark due-queue reads before and after splitting hot and content columns.
+
+"Before" is the legacy layout (content columns first) queried the legacy way:
+full rows with OFFSET paging. "After" is the schedule-first layout read
+through `crud_card.get_due_cards` with keyset cursors.
+
+Usage:
+    python -m scripts.benchmark_due_cards --cards 100000 --content-bytes 2048
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.due_queue_cache import invalidate_due_queue
+from crud.crud_card import get_due_cards
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+SEED_BATCH_SIZE = 5000
+PAGE_SIZE = 100
+LEGACY_COLUMN_ORDER = (
+    "id, word, definition, us_phonetic_symbols, zh_definition, example, "
+    "zh_example, notes, pronunciation, tags, next_review, review_count, status, "
+    "owner_id, created_at, updated_at"
+)
+
+
+async def seed(session: AsyncSession, n_cards: int, content_bytes: int) -> int:
+    now = datetime.now()
+    user = User(email="bench@anki.ai", hashed_password="x", is_verified=True)
+    session.add(user)
+    await session.flush()
+    rows = []
+    for i in range(n_cards):
+        rows.append(
+            {
+                "word": f"word-{i}",
+                "definition": "d" * (content_bytes // 4),
+                "example": "e" * (content_bytes // 8),
+                "notes": "n" * (content_bytes // 8),
+                "pronunciation": "p" * (content_bytes // 2),
+                "owner_id": user.id,
+                "status": "reviewing",
+                "review_count": 1,
+                "next_review": now - timedelta(minutes=random.randint(1, 60 * 24)),
+            }
+        )
+        if len(rows) == SEED_BATCH_SIZE:
+            await session.execute(insert(Card), rows)
+            rows = []
+    if rows:
+        await session.execute(insert(Card), rows)
+    await session.commit()
+    return user.id
+
+
+async def to_legacy_layout(session: AsyncSession):
+    await session.execute(
+        text(f"CREATE TABLE cards_legacy AS SELECT {LEGACY_COLUMN_ORDER} FROM cards")
+    )
+    await session.execute(text("DROP TABLE cards"))
+    await session.execute(text("ALTER TABLE cards_legacy RENAME TO cards"))
+    await session.execute(
+        text(
+            "CREATE INDEX ix_cards_owner_id_next_review ON cards (owner_id, next_review)"
+        )
+    )
+    await session.commit()
+    await session.execute(text("VACUUM"))
+
+
+async def timed(label: str, func, rounds: int):
+    latencies = []
+    for _ in range(rounds):
+        st = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - st)
+    latencies.sort()
+    print(
+        f"{label:<44} p50={latencies[len(latencies) // 2] * 1000:8.2f}ms "
+        f"max={latencies[-1] * 1000:8.2f}ms"
+    )
+
+
+async def run(db_path: str, n_cards: int, content_bytes: int, rounds: int, legacy):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_local() as session:
+        user_id = await seed(session, n_cards, content_bytes)
+        if legacy:
+            await to_legacy_layout(session)
+
+    deep_offset = n_cards // 2
+    async with session_local() as session:
+        due_at = {"now": datetime.now()}
+
+        async def count_by_status():
+            await session.execute(
+                text(
+                    "SELECT status, count(*) FROM cards WHERE owner_id = :uid GROUP BY status"
+                ),
+                {"uid": user_id},
+            )
+
+        await timed(
+            f"{'before' if legacy else 'after'}: status scan", count_by_status, rounds
+        )
+        if legacy:
+
+            async def legacy_page():
+                result = await session.execute(
+                    text(
+                        "SELECT * FROM cards WHERE owner_id = :uid AND next_review <= :now "
+                        "LIMIT :limit OFFSET :offset"
+                    ),
+                    {
+                        "uid": user_id,
+                        "now": due_at["now"],
+                        "limit": PAGE_SIZE,
+                        "offset": deep_offset,
+                    },
+                )
+                result.all()
+
+            await timed("before: /cards/due deep page (OFFSET)", legacy_page, rounds)
+        else:
+            first_page = await get_due_cards(
+                session, user_id, skip=deep_offset - 1, limit=1
+            )
+            cursor = {
+                "after_next_review": first_page[0].next_review,
+                "after_id": first_page[0].id,
+            }
+
+            async def cold_page():
+                invalidate_due_queue(user_id)
+                await get_due_cards(session, user_id, limit=PAGE_SIZE, **cursor)
+
+            async def warm_page():
+                await get_due_cards(session, user_id, limit=PAGE_SIZE, **cursor)
+
+            await timed("after: /cards/due deep page (cache miss)", cold_page, rounds)
+            await timed("after: /cards/due deep page (cache hit)", warm_page, rounds)
+    await engine.dispose()
+
+
+async def main(n_cards: int, content_bytes: int, rounds: int):
+    tmp_dir = tempfile.mkdtemp()
+    for legacy in (True, False):
+        db_path = os.path.join(tmp_dir, f"benchmark_due_cards_{legacy}.db")
+        await run(db_path, n_cards, content_bytes, rounds, legacy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--content-bytes", type=int, default=2048)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.cards, args.content_bytes, args.rounds))
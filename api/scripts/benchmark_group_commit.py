@@ -0,0 +1,124 @@
+"""Load test review throughput on SQLite with and without group commit.
+
+Every review is sent the way a request handler would: its own session and a
+call to `crud_card.create_review`. Without group commit each review is its
+own transaction; with it the single writer commits whatever arrived within
+the window together.
+
+Usage:
+    python -m scripts.benchmark_group_commit --reviews 5000 --concurrency 64
+    ANKI_AI_SQLITE_SYNCHRONOUS=FULL python -m scripts.benchmark_group_commit
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.db import apply_sqlite_pragmas, start_group_commit, stop_group_commit
+from corelib.metrics import get_metrics
+from crud.crud_card import create_review
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+
+async def seed(session: AsyncSession, n_users: int, n_cards: int):
+    users = [
+        User(email=f"bench-{i}@anki.ai", hashed_password="x", is_verified=True)
+        for i in range(n_users)
+    ]
+    session.add_all(users)
+    await session.flush()
+    now = datetime.now()
+    rows = [
+        {
+            "word": f"word-{i}",
+            "definition": "definition",
+            "owner_id": users[i % n_users].id,
+            "status": "learning",
+            "review_count": 0,
+            "next_review": now,
+        }
+        for i in range(n_cards)
+    ]
+    await session.execute(insert(Card), rows)
+    await session.commit()
+    return [(i + 1, users[i % n_users].id) for i in range(n_cards)]
+
+
+async def run(
+    db_path: str,
+    args: argparse.Namespace,
+    is_group_commit: bool,
+):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_local() as session:
+        cards = await seed(session, args.users, args.cards)
+
+    if is_group_commit:
+        start_group_commit(args.window_ms, args.max_batch_size, session_local)
+    batches_before = get_metrics()["counters"].get("group_commit.batches", 0)
+    remaining = args.reviews
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            card_id, user_id = random.choice(cards)
+            st = time.perf_counter()
+            try:
+                async with session_local() as session:
+                    await create_review(session, card_id, user_id, random.randint(1, 5))
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - st)
+
+    st = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - st
+    if is_group_commit:
+        await stop_group_commit()
+    batches = get_metrics()["counters"].get("group_commit.batches", 0) - batches_before
+    await engine.dispose()
+
+    latencies.sort()
+    label = "group commit" if is_group_commit else "commit per review"
+    print(
+        f"{label:<18} {args.reviews / elapsed:8.0f} reviews/s "
+        f"p50={latencies[len(latencies) // 2] * 1000:7.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:7.2f}ms "
+        f"errors={errors}" + (f" batches={batches:.0f}" if is_group_commit else "")
+    )
+
+
+async def main(args: argparse.Namespace):
+    tmp_dir = tempfile.mkdtemp()
+    for is_group_commit in (False, True):
+        db_path = os.path.join(tmp_dir, f"benchmark_group_commit_{is_group_commit}.db")
+        await run(db_path, args, is_group_commit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--cards", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--window-ms", type=int, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""Benchmark importing a deck that overlaps the user's existing cards.
+
+The user first gets `--existing` cards, then a deck of `--notes` notes is
+imported whose first `--existing` words are already there (case and markup
+differ, so only the normalized word key matches). Every merge policy is run
+and the SQL statements are counted on the engine: they must grow with the
+number of batches, not with the number of notes.
+
+Usage:
+    python -m scripts.benchmark_import_dedup --existing 20000 --notes 30000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.word_key import MERGE_POLICIES
+from crud.crud_card import import_cards
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+# statements per batch: insert, merge, daily stats read and write
+MAX_STATEMENTS_PER_BATCH = 6
+
+
+def make_cards(start: int, stop: int, is_deck: bool):
+    return [
+        {
+            # the deck spells the words differently from the existing cards
+            "word": f"<b>Word{i}</b> " if is_deck else f"word{i}",
+            "definition": f"n. meaning of word {i}" if is_deck else "",
+            "example": f"An example sentence that uses word{i}.",
+        }
+        for i in range(start, stop)
+    ]
+
+
+async def batches_of(cards, batch_size: int):
+    for start in range(0, len(cards), batch_size):
+        yield cards[start : start + batch_size]
+
+
+async def main(n_existing: int, n_notes: int, batch_size: int) -> bool:
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark_import_dedup.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statement_count = 0
+
+    def count_statements(*args, **kwargs):
+        nonlocal statement_count
+        statement_count += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statements)
+
+    deck = make_cards(0, n_notes, is_deck=True)
+    n_batches = -(-n_notes // batch_size)
+    budget = n_batches * MAX_STATEMENTS_PER_BATCH
+    has_failed = False
+    for merge_policy in MERGE_POLICIES:
+        async with session_local() as session:
+            user = User(email=f"bench-{merge_policy}@anki.ai", hashed_password="x")
+            session.add(user)
+            await session.commit()
+            await import_cards(
+                session,
+                user.id,
+                batches_of(make_cards(0, n_existing, is_deck=False), batch_size),
+            )
+
+            statement_count = 0
+            st = time.perf_counter()
+            n_imported, n_duplicates = await import_cards(
+                session,
+                user.id,
+                batches_of(deck, batch_size),
+                merge_policy=merge_policy,
+            )
+            elapsed = time.perf_counter() - st
+            n_statements = statement_count
+            n_cards = await session.scalar(
+                select(func.count(Card.id)).filter(Card.owner_id == user.id)
+            )
+        print(
+            f"{merge_policy:<10} {elapsed:6.2f}s imported={n_imported} "
+            f"duplicates={n_duplicates} cards={n_cards} "
+            f"statements={n_statements} (budget {budget})"
+        )
+        expected_new = max(n_notes - n_existing, 0)
+        if n_imported != expected_new or n_cards != max(n_existing, n_notes):
+            print(f"[!] {merge_policy}: expected {expected_new} new cards")
+            has_failed = True
+        if n_statements > budget:
+            print(f"[!] {merge_policy}: {n_statements} statements for {n_notes} notes")
+            has_failed = True
+    await engine.dispose()
+    return not has_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--existing", type=int, default=20000)
+    parser.add_argument("--notes", type=int, default=30000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    if not asyncio.run(main(args.existing, args.notes, args.batch_size)):
+        sys.exit(1)
@@ -0,0 +1,146 @@
+"""Benchmark resuming an import job after its worker died.
+
+A synthetic deck is imported through `run_import_job` the way the Celery
+worker runs it. The first run is killed (a BaseException, which the job's
+error handling does not see, like SIGKILL) once `--crash-after` batches have
+been read. The second run must resume from the last committed batch: no
+note is read twice, and every note ends up as exactly one card.
+
+Usage:
+    python -m scripts.benchmark_import_job_resume --notes 20000 --crash-after 8
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.apkg_import import read_apkg_cards
+from corelib.config import settings
+from corelib.tasks.import_task import import_job_path, run_import_job
+from crud.crud_import_job import get_import_job
+from models.base import Base
+from models.card import Card
+from models.import_job import ImportJob
+from models.user import User
+from scripts.benchmark_apkg_import import build_synthetic_apkg
+
+
+class WorkerKilled(BaseException):
+    pass
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Counts the batches read, optionally dies after `crash_after` of them."""
+
+    def __init__(self, crash_after=None):
+        super().__init__(max_workers=1)
+        self.crash_after = crash_after
+        self.n_batch_reads = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if fn is read_apkg_cards:
+            if self.crash_after is not None and self.n_batch_reads >= self.crash_after:
+                raise WorkerKilled()
+            self.n_batch_reads += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+async def main(n_notes: int, crash_after: int) -> bool:
+    tmp_dir = tempfile.mkdtemp()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'benchmark_import_job.db')}"
+    )
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    job_id = "0" * 32
+    apkg_path = build_synthetic_apkg(os.path.join(tmp_dir, "deck.apkg"), n_notes)
+    os.makedirs(settings.APKG_IMPORT_JOB_ROOT_PATH, exist_ok=True)
+    shutil.copy(apkg_path, import_job_path(job_id))
+    async with session_local() as session:
+        user = User(email="bench@anki.ai", hashed_password="x")
+        session.add(user)
+        await session.flush()
+        session.add(
+            ImportJob(
+                id=job_id,
+                owner_id=user.id,
+                status="pending",
+                filename="deck.apkg",
+                merge_policy="keep",
+                attempts=0,
+                processed_notes=0,
+                imported=0,
+                duplicates=0,
+            )
+        )
+        await session.commit()
+
+    batch_size = settings.APKG_IMPORT_BATCH_SIZE
+    has_failed = False
+    with CountingExecutor(crash_after) as executor:
+        st = time.perf_counter()
+        try:
+            await run_import_job(job_id, session_local, executor, max_attempts=3)
+            print("[!] the first run was not killed, use a smaller --crash-after")
+            has_failed = True
+        except WorkerKilled:
+            pass
+        killed_seconds = time.perf_counter() - st
+    async with session_local() as session:
+        job = await get_import_job(session, job_id)
+        committed = job.processed_notes
+    print(
+        f"killed run   {killed_seconds:6.2f}s status={job.status} "
+        f"committed notes={committed} ({executor.n_batch_reads} batches read)"
+    )
+
+    with CountingExecutor() as executor:
+        st = time.perf_counter()
+        status, attempts = await run_import_job(
+            job_id, session_local, executor, max_attempts=3
+        )
+        resumed_seconds = time.perf_counter() - st
+    async with session_local() as session:
+        job = await get_import_job(session, job_id)
+        n_cards = await session.scalar(select(func.count(Card.id)))
+    # the last read returns no notes and ends the job
+    n_notes_read = (executor.n_batch_reads - 1) * batch_size
+    reread = max(committed + n_notes_read - n_notes, 0)
+    print(
+        f"resumed run  {resumed_seconds:6.2f}s status={status} attempts={attempts} "
+        f"batches read={executor.n_batch_reads} notes re-read={reread} "
+        f"processed={job.processed_notes} imported={job.imported} cards={n_cards}"
+    )
+    await engine.dispose()
+
+    if status != "succeeded" or n_cards != n_notes or job.imported != n_notes:
+        print(f"[!] expected {n_notes} cards from a succeeded job")
+        has_failed = True
+    if job.processed_notes != n_notes:
+        print("[!] progress counted some notes twice or not at all")
+        has_failed = True
+    if reread:
+        print("[!] the resumed run read committed notes again")
+        has_failed = True
+    return not has_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=20000)
+    parser.add_argument("--crash-after", type=int, default=8)
+    args = parser.parse_args()
+    if not asyncio.run(main(args.notes, args.crash_after)):
+        sys.exit(1)
@@ -0,0 +1,87 @@
+"""Benchmark import time of the API and the Celery worker entry points.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+so the numbers match what a process start or worker fork pays. The run fails
+when an entry point goes over its budget or imports a database driver the
+configured backend does not need.
+
+Usage:
+    python -m scripts.benchmark_import_time [--rounds 5] [--max-ms 3000]
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+from corelib.config import settings
+
+ENTRY_POINTS = ("app", "celery_worker")
+# 数据库驱动只应在对应后端被使用时导入
+BACKEND_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "aiomysql",
+    "postgresql": "asyncpg",
+}
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_times(module: str):
+    """Return {module name: (self us, cumulative us, depth)} for one import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            times[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return times
+
+
+def main(rounds: int, max_ms: float, top: int) -> int:
+    unused_drivers = [
+        driver
+        for backend, driver in BACKEND_DRIVERS.items()
+        if backend != settings.DB_BACKEND
+    ]
+    has_failed = False
+    for module in ENTRY_POINTS:
+        runs = [import_times(module) for _ in range(rounds)]
+        totals = sorted(times[module][1] / 1000 for times in runs)
+        median_ms = statistics.median(totals)
+        print(
+            f"{module:<16} median={median_ms:8.1f}ms "
+            f"min={totals[0]:8.1f}ms max={totals[-1]:8.1f}ms"
+        )
+        slowest = sorted(runs[-1].items(), key=lambda item: -item[1][0])[:top]
+        for name, (self_us, cumulative_us, _) in slowest:
+            print(
+                f"    {name:<48} self={self_us / 1000:7.1f}ms "
+                f"cumulative={cumulative_us / 1000:7.1f}ms"
+            )
+        if median_ms > max_ms:
+            print(f"[!] {module} takes {median_ms:.1f}ms to import, budget {max_ms}ms")
+            has_failed = True
+        for driver in unused_drivers:
+            if driver in runs[-1]:
+                print(
+                    f"[!] {module} imports {driver}, "
+                    f"but the database backend is {settings.DB_BACKEND}"
+                )
+                has_failed = True
+    return 1 if has_failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=3000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    sys.exit(main(args.rounds, args.max_ms, args.top))
@@ -0,0 +1,126 @@
+"""Measure media store cost when the same deck is imported repeatedly.
+
+A synthetic deck with media is imported by several users, the way
+`POST /cards/import` does: media is streamed from the zip into the
+content-addressed store, registered in `media_blobs` and linked to the new
+cards through `card_media`. Bytes on disk must not grow after the first
+import, and every card must reference its audio.
+
+Usage:
+    python -m scripts.benchmark_media_store --notes 2000 --media 500 --media-kb 64
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from anki_parser import extract_collection, iter_notes, read_metadata
+from corelib.apkg_import import note_to_card
+from corelib.config import settings
+from corelib.media_store import store_apkg_media
+from crud.crud_card import import_cards
+from crud.crud_media import register_media_blobs
+from models.base import Base
+from models.media import CardMedia, MediaBlob
+from models.user import User
+from scripts.benchmark_apkg_import import build_synthetic_apkg
+
+N_IMPORTS = 3
+
+
+def disk_bytes(root: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(dir_path, name))
+        for dir_path, _, names in os.walk(root)
+        for name in names
+    )
+
+
+async def main(n_notes: int, n_media: int, media_kb: int, batch_size: int) -> int:
+    tmp_dir = tempfile.mkdtemp()
+    settings.MEDIA_ROOT_PATH = os.path.join(tmp_dir, "media")
+    apkg_path = build_synthetic_apkg(
+        os.path.join(tmp_dir, "deck.apkg"), n_notes, n_media, media_kb * 1024
+    )
+    print(
+        f"deck: {n_notes} notes, {n_media} media files, "
+        f"{os.path.getsize(apkg_path) / 1e6:.1f}MB"
+    )
+    db_path = extract_collection(apkg_path, tmp_dir)
+    models = read_metadata(db_path)["models"]
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'benchmark_media_store.db')}"
+    )
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def card_batches():
+        batch = []
+        for note in iter_notes(db_path, models):
+            card = note_to_card(note["fields"], note["tags"])
+            if card is not None:
+                batch.append(card)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        yield batch
+
+    has_failed = False
+    for i in range(N_IMPORTS):
+        async with session_local() as session:
+            user = User(email=f"bench-{i}@anki.ai", hashed_password="x")
+            session.add(user)
+            await session.commit()
+
+            st = time.perf_counter()
+            stored = store_apkg_media(apkg_path)
+            await register_media_blobs(session, stored.values())
+            await session.commit()
+            media_seconds = time.perf_counter() - st
+            await import_cards(
+                session,
+                user.id,
+                card_batches(),
+                media={name: blob["sha256"] for name, blob in stored.items()},
+            )
+            n_blobs = await session.scalar(select(func.count()).select_from(MediaBlob))
+            n_links = await session.scalar(select(func.count()).select_from(CardMedia))
+        new_bytes = sum(blob["size"] for blob in stored.values() if blob["is_new"])
+        print(
+            f"import {i + 1}: media {media_seconds:5.2f}s "
+            f"new bytes={new_bytes / 1e6:7.2f}MB "
+            f"on disk={disk_bytes(settings.MEDIA_ROOT_PATH) / 1e6:7.2f}MB "
+            f"blobs={n_blobs} card_media={n_links}"
+        )
+        if i > 0 and new_bytes:
+            print(f"[!] re-import {i + 1} wrote {new_bytes} media bytes")
+            has_failed = True
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak rss={peak_mb:.1f}MB")
+    expected_links = N_IMPORTS * min(n_notes, n_media)
+    if n_links != expected_links:
+        print(f"[!] expected {expected_links} card_media rows, got {n_links}")
+        has_failed = True
+    await engine.dispose()
+    return 1 if has_failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--media", type=int, default=500)
+    parser.add_argument("--media-kb", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.notes, args.media, args.media_kb, args.batch_size)))
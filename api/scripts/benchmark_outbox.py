@@ -0,0 +1,137 @@
+"""Compare task dispatch from a request handler with and without the outbox.
+
+`direct` publishes with `apply_async` inside the handler, the way the
+register and password reset endpoints used to; `outbox` only inserts an
+`outbox_messages` row in the handler transaction. Both run against an
+unreachable broker to show what a broker outage costs a request.
+
+The relay is then checked end to end: a first pass against the unreachable
+broker must keep every message for a retry, and a second pass against
+Celery's in-memory broker must deliver all of them exactly once. The run
+fails when any message is lost or left behind.
+
+Usage:
+    python -m scripts.benchmark_outbox --messages 1000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import celery
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.metrics import get_metrics
+from corelib.outbox import new_outbox_message, relay_outbox_once
+from corelib.tasks.helper import new_task_params
+from models.base import Base
+from models.outbox import OutboxMessage
+
+TASK_NAME = "send-activation-email-task"
+UNREACHABLE_BROKER_URL = "redis://127.0.0.1:1/0"
+N_DIRECT_REQUESTS = 3
+
+
+def new_celery_app(broker_url: str) -> celery.Celery:
+    app = celery.Celery("benchmark_outbox", broker=broker_url, set_as_current=False)
+    app.conf.broker_connection_timeout = 1
+    return app
+
+
+async def main(n_messages: int, batch_size: int) -> int:
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark_outbox.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    unreachable_app = new_celery_app(UNREACHABLE_BROKER_URL)
+
+    latencies = []
+    for i in range(N_DIRECT_REQUESTS):
+        task_id, task_params = new_task_params(email=f"direct-{i}@anki.ai")
+        st = time.perf_counter()
+        try:
+            unreachable_app.send_task(
+                TASK_NAME, args=(task_params,), task_id=task_id, countdown=3
+            )
+        except Exception:
+            pass
+        latencies.append((time.perf_counter() - st) * 1000)
+    print(
+        f"direct  requests={N_DIRECT_REQUESTS:5d} "
+        f"p50={statistics.median(latencies):9.2f}ms max={max(latencies):9.2f}ms"
+    )
+
+    latencies = []
+    for i in range(n_messages):
+        task_id, task_params = new_task_params(email=f"outbox-{i}@anki.ai")
+        st = time.perf_counter()
+        async with session_local() as session:
+            session.add(
+                new_outbox_message(TASK_NAME, task_id, task_params, countdown=3)
+            )
+            await session.commit()
+        latencies.append((time.perf_counter() - st) * 1000)
+    print(
+        f"outbox  requests={n_messages:5d} "
+        f"p50={statistics.median(latencies):9.2f}ms max={max(latencies):9.2f}ms"
+    )
+
+    async def count_pending() -> int:
+        async with session_local() as session:
+            return await session.scalar(select(func.count(OutboxMessage.id)))
+
+    await relay_outbox_once(session_local, unreachable_app, batch_size, 10)
+    pending_after_outage = await count_pending()
+    # make the failed batch due again instead of waiting for its backoff
+    async with session_local() as session:
+        await session.execute(
+            update(OutboxMessage).values(next_attempt_at=OutboxMessage.created_at)
+        )
+        await session.commit()
+
+    memory_app = new_celery_app("memory://")
+    st = time.perf_counter()
+    while await relay_outbox_once(session_local, memory_app, batch_size, 10):
+        pass
+    elapsed = time.perf_counter() - st
+    with memory_app.connection_for_read() as conn:
+        n_delivered = conn.SimpleQueue("celery").qsize()
+    pending = await count_pending()
+    print(
+        f"relay   delivered={n_delivered}/{n_messages} in {elapsed:5.2f}s "
+        f"({n_delivered / elapsed:7.0f} messages/s) pending={pending}"
+    )
+    counters = get_metrics()["counters"]
+    print(
+        f"outbox.published={counters.get('outbox.published', 0):.0f} "
+        f"outbox.publish_failures={counters.get('outbox.publish_failures', 0):.0f}"
+    )
+    await engine.dispose()
+
+    has_failed = False
+    if pending_after_outage != n_messages:
+        print(
+            f"[!] {n_messages - pending_after_outage} messages dropped "
+            "while the broker was unreachable"
+        )
+        has_failed = True
+    if n_delivered != n_messages or pending:
+        print(f"[!] expected {n_messages} messages delivered and none pending")
+        has_failed = True
+    return 1 if has_failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.messages, args.batch_size)))
@@ -0,0 +1,158 @@
+"""Measure review latency while a burst of logins is being served.
+
+A probe submits reviews one after another, the way a steady client would,
+while a burst of concurrent logins runs bcrypt. With `inline` hashing every
+login blocks the event loop; with `thread pool` the logins go through
+`api.v1.endpoints.users.h_login`, which verifies the password on the bounded
+password thread pool and rejects what does not fit in the admission limit.
+The run fails when review p99 during the pooled burst exceeds the budget.
+
+Usage:
+    python -m scripts.benchmark_password_hashing --logins 100 [--max-p99-ms 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi import HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from api.v1.endpoints.users import h_login
+from corelib.metrics import get_metrics
+from corelib.security import get_password_hash, verify_password
+from crud.crud_card import create_review
+from crud.crud_user import get_user_by_email
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+EMAIL = "bench@anki.ai"
+PASSWORD = "benchmark-password"
+N_CARDS = 100
+
+
+async def seed(session: AsyncSession) -> int:
+    user = User(
+        email=EMAIL, hashed_password=get_password_hash(PASSWORD), is_verified=True
+    )
+    session.add(user)
+    await session.flush()
+    await session.execute(
+        insert(Card),
+        [
+            {
+                "word": f"word-{i}",
+                "definition": "definition",
+                "owner_id": user.id,
+                "status": "learning",
+                "review_count": 0,
+            }
+            for i in range(N_CARDS)
+        ],
+    )
+    await session.commit()
+    return user.id
+
+
+def percentile(latencies, q: float) -> float:
+    return sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * q))]
+
+
+async def main(n_logins: int, max_p99_ms: float) -> int:
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark_password_hashing.db")
+    url = f"sqlite+aiosqlite:///{db_path}"
+    write_engine = create_async_engine(url)
+    # enough read connections that logins never wait on the pool, so the
+    # numbers only reflect what bcrypt does to the event loop
+    read_engine = create_async_engine(url, pool_size=n_logins, max_overflow=0)
+    write_session_local = async_sessionmaker(
+        bind=write_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    read_session_local = async_sessionmaker(
+        bind=read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with write_session_local() as session:
+        user_id = await seed(session)
+
+    async def inline_login():
+        async with read_session_local() as session:
+            user = await get_user_by_email(session, email=EMAIL)
+            return verify_password(PASSWORD, user.hashed_password)
+
+    async def pooled_login():
+        form_data = OAuth2PasswordRequestForm(username=EMAIL, password=PASSWORD)
+        async with read_session_local() as session:
+            try:
+                await h_login(form_data=form_data, db=session)
+                return True
+            except HTTPException as exc:
+                if exc.status_code != 503:
+                    raise
+                return False
+
+    async def probe(stop: asyncio.Event):
+        latencies = []
+        i = 0
+        while not stop.is_set():
+            st = time.perf_counter()
+            async with write_session_local() as session:
+                await create_review(session, i % N_CARDS + 1, user_id, 3)
+            latencies.append((time.perf_counter() - st) * 1000)
+            i += 1
+            await asyncio.sleep(0.005)
+        return latencies
+
+    has_failed = False
+    for label, login in (
+        ("idle", None),
+        ("inline", inline_login),
+        ("thread pool", pooled_login),
+    ):
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(stop))
+        st = time.perf_counter()
+        if login is None:
+            await asyncio.sleep(1)
+            accepted = 0
+        else:
+            results = await asyncio.gather(*(login() for _ in range(n_logins)))
+            accepted = sum(results)
+        elapsed = time.perf_counter() - st
+        stop.set()
+        latencies = await probe_task
+        p99 = percentile(latencies, 0.99)
+        print(
+            f"{label:<12} reviews={len(latencies):4d} "
+            f"p50={statistics.median(latencies):7.1f}ms p99={p99:7.1f}ms "
+            f"max={max(latencies):7.1f}ms "
+            f"logins={accepted}/{n_logins if login else 0} in {elapsed:5.2f}s"
+        )
+        if login is pooled_login and p99 > max_p99_ms:
+            print(
+                f"[!] review p99 {p99:.1f}ms during the login burst, budget {max_p99_ms}ms"
+            )
+            has_failed = True
+    metrics = get_metrics()
+    print(
+        f"password_hash.rejected={metrics['counters'].get('password_hash.rejected', 0):.0f}"
+    )
+    await write_engine.dispose()
+    await read_engine.dispose()
+    return 1 if has_failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--max-p99-ms", type=float, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.logins, args.max_p99_ms)))
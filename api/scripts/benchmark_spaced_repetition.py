@@ -0,0 +1,45 @@
+"""Compare scalar and batch scheduling throughput.
+
+Usage:
+    python -m scripts.benchmark_spaced_repetition --cards 1000000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+
+from corelib.spaced_repetition import (
+    calculate_next_review,
+    get_review_status,
+    schedule_reviews,
+)
+
+
+def main(n_cards: int):
+    rng = np.random.default_rng(0)
+    review_counts = rng.integers(0, 20, size=n_cards)
+    ratings = rng.integers(1, 6, size=n_cards)
+    now = datetime.now()
+
+    st = time.perf_counter()
+    for review_count, rating in zip(review_counts.tolist(), ratings.tolist()):
+        calculate_next_review(review_count, rating, now)
+        get_review_status(review_count + 1)
+    scalar_elapsed = time.perf_counter() - st
+
+    st = time.perf_counter()
+    schedule_reviews(review_counts, ratings, now)
+    batch_elapsed = time.perf_counter() - st
+
+    print(f"Scalar: {scalar_elapsed:.3f}s ({n_cards / scalar_elapsed:,.0f} cards/s)")
+    print(f"Batch:  {batch_elapsed:.3f}s ({n_cards / batch_elapsed:,.0f} cards/s)")
+    print(f"Speedup: {scalar_elapsed / batch_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=1000000)
+    args = parser.parse_args()
+    main(args.cards)
@@ -0,0 +1,123 @@
+"""Benchmark `GET /statistics/` query count and latency on a large collection.
+
+Usage:
+    python -m scripts.benchmark_statistics --cards 50000 --reviews 500000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from crud.crud_statistic import get_statistics, rebuild_daily_stats
+from models.base import Base
+from models.card import Card, Review
+from models.user import User
+
+CARD_STATUSES = ("learning", "reviewing", "mastered")
+SEED_BATCH_SIZE = 10000
+
+
+async def seed(session: AsyncSession, n_cards: int, n_reviews: int) -> int:
+    now = datetime.now()
+    user = User(email="bench@anki.ai", hashed_password="x", is_verified=True)
+    session.add(user)
+    await session.flush()
+
+    rows = []
+    for i in range(n_cards):
+        rows.append(
+            {
+                "word": f"word-{i}",
+                "definition": "definition",
+                "owner_id": user.id,
+                "status": random.choice(CARD_STATUSES),
+                "review_count": random.randint(0, 10),
+                "next_review": now + timedelta(hours=random.randint(-240, 240)),
+                "created_at": now - timedelta(days=random.randint(0, 365)),
+            }
+        )
+        if len(rows) == SEED_BATCH_SIZE:
+            await session.execute(insert(Card), rows)
+            rows = []
+    if rows:
+        await session.execute(insert(Card), rows)
+
+    rows = []
+    for _ in range(n_reviews):
+        rows.append(
+            {
+                "card_id": random.randint(1, n_cards),
+                "rating": random.randint(1, 5),
+                "next_interval": 1,
+                "review_date": now - timedelta(minutes=random.randint(0, 60 * 24 * 90)),
+            }
+        )
+        if len(rows) == SEED_BATCH_SIZE:
+            await session.execute(insert(Review), rows)
+            rows = []
+    if rows:
+        await session.execute(insert(Review), rows)
+    await session.commit()
+    return user.id
+
+
+async def main(n_cards: int, n_reviews: int, rounds: int):
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark_statistics.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_local() as session:
+        st = time.perf_counter()
+        user_id = await seed(session, n_cards, n_reviews)
+        print(
+            f"Seeded {n_cards} cards and {n_reviews} reviews in {time.perf_counter() - st:.2f}s"
+        )
+        st = time.perf_counter()
+        n_rows = await rebuild_daily_stats(session, user_id)
+        print(f"Rebuilt {n_rows} rollup rows in {time.perf_counter() - st:.2f}s")
+
+    query_count = 0
+
+    def count_queries(*args, **kwargs):
+        nonlocal query_count
+        query_count += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_queries)
+
+    latencies = []
+    async with session_local() as session:
+        for _ in range(rounds):
+            query_count = 0
+            st = time.perf_counter()
+            await get_statistics(session, user_id)
+            latencies.append(time.perf_counter() - st)
+
+    latencies.sort()
+    print(f"Queries per call: {query_count}")
+    print(
+        f"Latency over {rounds} rounds: "
+        f"min={latencies[0] * 1000:.1f}ms "
+        f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+        f"max={latencies[-1] * 1000:.1f}ms"
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=50000)
+    parser.add_argument("--reviews", type=int, default=500000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.cards, args.reviews, args.rounds))
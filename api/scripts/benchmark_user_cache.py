@@ -0,0 +1,107 @@
+"""Benchmark per-request database queries with and without the user cache.
+
+Each simulated request resolves the user from a bearer token the way
+`api.deps.get_current_user` does, then runs a typical handler body (a
+review submission or a due-cards page). Queries are counted on the engine.
+
+Usage:
+    python -m scripts.benchmark_user_cache --requests 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from api.deps import get_current_user
+from corelib.security import create_token
+from corelib.user_cache import cached_users
+from crud.crud_card import create_review, get_due_cards
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+N_CARDS = 200
+
+
+async def seed(session: AsyncSession) -> User:
+    user = User(email="bench@anki.ai", hashed_password="x", is_verified=True)
+    session.add(user)
+    await session.flush()
+    now = datetime.now()
+    await session.execute(
+        insert(Card),
+        [
+            {
+                "word": f"word-{i}",
+                "definition": "definition",
+                "owner_id": user.id,
+                "status": "learning",
+                "review_count": 0,
+                "next_review": now,
+            }
+            for i in range(N_CARDS)
+        ],
+    )
+    await session.commit()
+    return user
+
+
+async def main(n_requests: int):
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark_user_cache.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_local() as session:
+        user = await seed(session)
+    token = create_token(data={"sub": user.email})
+
+    query_count = 0
+
+    def count_queries(*args, **kwargs):
+        nonlocal query_count
+        query_count += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_queries)
+
+    async def review_request(i: int):
+        async with session_local() as session:
+            current_user = await get_current_user(db=session, token=token)
+            await create_review(session, i % N_CARDS + 1, current_user.id, 3)
+
+    async def due_page_request(i: int):
+        async with session_local() as session:
+            current_user = await get_current_user(db=session, token=token)
+            await get_due_cards(session, current_user.id, limit=20)
+
+    for label, handler in (("due page", due_page_request), ("review", review_request)):
+        for is_cached in (False, True):
+            cached_users.clear()
+            query_count = 0
+            st = time.perf_counter()
+            for i in range(n_requests):
+                if not is_cached:
+                    cached_users.clear()
+                await handler(i)
+            elapsed = time.perf_counter() - st
+            print(
+                f"{label:<9} {'user cache' if is_cached else 'no cache':<11} "
+                f"queries/request={query_count / n_requests:5.2f} "
+                f"latency={elapsed / n_requests * 1000:6.2f}ms"
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
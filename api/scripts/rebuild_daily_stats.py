@@ -0,0 +1,51 @@
+"""Backfill the `user_daily_stats` rollup from existing cards and reviews.
+
+Usage:
+    python -m scripts.rebuild_daily_stats [--user-id 1] [--chunk-size 10000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from corelib.db import get_session_local
+from crud.crud_statistic import rebuild_daily_stats
+from models.user import User
+
+USER_BATCH_SIZE = 500
+
+
+async def main(user_id: int | None, chunk_size: int):
+    st = time.perf_counter()
+    rebuilt_users = 0
+    last_user_id = 0
+    async with get_session_local()() as session:
+        while True:
+            if user_id is not None:
+                user_ids = [user_id] if last_user_id == 0 else []
+            else:
+                result = await session.execute(
+                    select(User.id)
+                    .filter(User.id > last_user_id)
+                    .order_by(User.id)
+                    .limit(USER_BATCH_SIZE)
+                )
+                user_ids = result.scalars().all()
+            if not user_ids:
+                break
+            for uid in user_ids:
+                n_rows = await rebuild_daily_stats(session, uid, chunk_size=chunk_size)
+                rebuilt_users += 1
+                print(f"[*] Rebuilt {n_rows} daily stats rows for user {uid}.")
+            last_user_id = user_ids[-1]
+    print(f"[*] Rebuilt {rebuilt_users} users in {time.perf_counter() - st:.2f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id, args.chunk_size))
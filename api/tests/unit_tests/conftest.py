@@ -0,0 +1,13 @@
+from pathlib import Path
+
+import pytest
+from dotenv import load_dotenv
+
+# Settings has no defaults; variables not set in the environment (the Makefile
+# exports .env) fall back to the example values
+load_dotenv(Path(__file__).parents[2] / ".env.example", override=False)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
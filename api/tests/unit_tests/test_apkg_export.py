@@ -0,0 +1,182 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from api.v1.endpoints import cards as cards_endpoint
+from corelib.config import settings
+from corelib.due_queue_cache import (
+    due_queue_generation,
+    due_queue_horizon,
+    load_due_queue,
+    lookup_due_queue,
+)
+from corelib.media_store import store_media
+from corelib.tasks.import_task import import_job_path, run_import_job
+from crud.crud_card import import_cards
+from crud.crud_media import get_user_media, register_media_blobs
+from models.base import Base
+from models.card import Card
+from models.import_job import ImportJob
+from models.media import CardMedia
+from models.user import User
+
+EXPORTER_ID = 1
+IMPORTER_ID = 2
+ROUND_TRIP_COLUMNS = (
+    "word_key",
+    "word",
+    "definition",
+    "us_phonetic_symbols",
+    "zh_definition",
+    "example",
+    "zh_example",
+    "notes",
+    "tags",
+    "pronunciation",
+)
+
+CARDS = [
+    {
+        "word": f"word{i}",
+        "definition": f"n. meaning of word {i}",
+        "us_phonetic_symbols": f"/wɜːd{i}/",
+        "zh_definition": f"n. 单词 {i} 的释义",
+        "example": f"An example sentence that uses word{i}.",
+        "zh_example": f"一个使用 word{i} 的例句。",
+        "notes": "<b>bold</b> &amp; more" if i % 7 == 0 else "",
+        "tags": "cet4 exam" if i % 3 == 0 else "",
+        "media": [f"word{i}.mp3"] if i % 10 == 0 else [],
+        "pronunciation": f"word{i}.mp3" if i % 10 == 0 else None,
+    }
+    for i in range(50)
+]
+
+
+@pytest.fixture
+async def session_local(monkeypatch):
+    work_dir = tempfile.mkdtemp()
+    monkeypatch.setattr(settings, "MEDIA_ROOT_PATH", os.path.join(work_dir, "media"))
+    monkeypatch.setattr(
+        settings, "APKG_IMPORT_JOB_ROOT_PATH", os.path.join(work_dir, "jobs")
+    )
+    # small batches so the export and the import take several of them
+    monkeypatch.setattr(settings, "APKG_EXPORT_BATCH_SIZE", 7)
+    monkeypatch.setattr(settings, "APKG_IMPORT_BATCH_SIZE", 7)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(work_dir, 'test_apkg_export.db')}"
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    monkeypatch.setattr(
+        cards_endpoint, "get_session_local", lambda role="write": session_local
+    )
+    async with session_local() as db:
+        for user_id in (EXPORTER_ID, IMPORTER_ID):
+            db.add(User(id=user_id, email=f"{user_id}@anki.ai", hashed_password="x"))
+        await db.commit()
+    yield session_local
+    await engine.dispose()
+
+
+async def add_cards(session_local):
+    stored = {}
+    for card in CARDS:
+        for filename in card["media"]:
+            content = hashlib.sha256(filename.encode()).digest() * 32
+            sha256, size, _ = store_media(partial(io.BytesIO, content))
+            stored[filename] = {
+                "sha256": sha256,
+                "size": size,
+                "content_type": "audio/mpeg",
+            }
+
+    async def batches():
+        yield CARDS[:20]
+        yield CARDS[20:]
+
+    async with session_local() as db:
+        await register_media_blobs(db, stored.values())
+        await db.commit()
+        await import_cards(
+            db,
+            EXPORTER_ID,
+            batches(),
+            media={filename: blob["sha256"] for filename, blob in stored.items()},
+        )
+
+
+async def get_cards(session_local, user_id):
+    async with session_local() as db:
+        result = await db.execute(
+            select(*(getattr(Card, column) for column in ROUND_TRIP_COLUMNS))
+            .filter(Card.owner_id == user_id)
+            .order_by(Card.word_key)
+        )
+        cards = result.all()
+        result = await db.execute(
+            select(Card.word_key, CardMedia.filename, CardMedia.sha256)
+            .join(CardMedia, CardMedia.card_id == Card.id)
+            .filter(Card.owner_id == user_id)
+            .order_by(Card.word_key)
+        )
+        return cards, result.all()
+
+
+@pytest.mark.anyio
+async def test_user_media_is_streamed_in_reference_order(session_local):
+    await add_cards(session_local)
+    async with session_local() as db:
+        media = get_user_media(db, EXPORTER_ID)
+        assert not isinstance(media, list)
+        rows = [tuple(row) async for row in media]
+    assert [filename for filename, _, _ in rows] == [
+        f"word{i}.mp3" for i in range(0, 50, 10)
+    ]
+    assert all(size == 32 * 32 for _, _, size in rows)
+
+
+@pytest.mark.anyio
+async def test_export_import_round_trip(session_local):
+    await add_cards(session_local)
+    job_id = "0" * 32
+    os.makedirs(settings.APKG_IMPORT_JOB_ROOT_PATH)
+    with open(import_job_path(job_id), "wb") as f:
+        async for chunk in cards_endpoint._export_apkg(EXPORTER_ID):
+            f.write(chunk)
+
+    async with session_local() as db:
+        db.add(
+            ImportJob(
+                id=job_id,
+                owner_id=IMPORTER_ID,
+                filename="cards.apkg",
+                merge_policy="keep",
+            )
+        )
+        await db.commit()
+    generation = due_queue_generation(IMPORTER_ID)
+    load_due_queue(IMPORTER_ID, [], generation, due_queue_horizon())
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        status, _ = await run_import_job(job_id, session_local, executor, 1)
+    assert status == "succeeded"
+    # the worker dropped the importer's due queue when the job finished
+    assert lookup_due_queue(IMPORTER_ID) is None
+
+    exported, exported_media = await get_cards(session_local, EXPORTER_ID)
+    imported, imported_media = await get_cards(session_local, IMPORTER_ID)
+    assert len(exported) == len(CARDS)
+    assert imported == exported
+    assert imported_media == exported_media
+    async with session_local() as db:
+        job = await db.get(ImportJob, job_id)
+    assert (job.imported, job.duplicates, job.media_files) == (len(CARDS), 0, 5)
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from corelib.card_generation import (
+    FakeCardProvider,
+    generate_cards,
+    parse_generated_cards,
+)
+from corelib.config import settings
+
+CARD = {
+    "单词": "adhere",
+    "详细资料": "v. to stick fast to a surface",
+    "英美音标": "/ədˈhɪr/",
+    "标签": "verb",
+}
+
+
+class FlakyCardProvider(FakeCardProvider):
+    """Fake model that re-cases the words, leaves out ``missing`` and fails
+    the batches containing ``failing``."""
+
+    def __init__(self, max_batch_size, missing=(), failing=()):
+        super().__init__(max_batch_size)
+        self.missing = set(missing)
+        self.failing = set(failing)
+        self.prompts = []
+
+    async def generate(self, system_prompt, prompt):
+        words = prompt.splitlines()
+        self.prompts.append(words)
+        if self.failing & set(words):
+            raise ConnectionError("model unavailable")
+        prompt = "\n".join(word.upper() for word in words if word not in self.missing)
+        return await super().generate(system_prompt, prompt)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        json.dumps([CARD], ensure_ascii=False),
+        "```json\n" + json.dumps([CARD], ensure_ascii=False) + "\n```",
+        "```\n" + json.dumps([CARD], ensure_ascii=False) + "\n```",
+        json.dumps(CARD, ensure_ascii=False),
+    ],
+)
+def test_parse_fenced_array_or_single_object(text):
+    (card,) = parse_generated_cards(text)
+    assert card.word == "adhere"
+    assert card.definition == "v. to stick fast to a surface"
+    assert card.us_phonetic_symbols == "/ədˈhɪr/"
+    assert card.tags == "verb"
+
+
+def test_parse_skips_malformed_items():
+    items = [
+        CARD,
+        "not a card",
+        {"单词": "no definition"},
+        {"单词": "number", "详细资料": 42, "笔记": None, "unknown": "x"},
+    ]
+    cards = parse_generated_cards(json.dumps(items, ensure_ascii=False))
+    assert [card.word for card in cards] == ["adhere", "number"]
+    assert cards[1].definition == "42"
+    assert cards[1].notes is None
+
+
+@pytest.mark.parametrize("text", ["", "not json", "```json\n[{]\n```", '"a string"'])
+def test_parse_invalid_output_is_empty(text):
+    assert parse_generated_cards(text) == []
+
+
+@pytest.mark.anyio
+async def test_words_are_batched_by_max_batch_size():
+    provider = FlakyCardProvider(max_batch_size=3)
+    words = [f"word{i}" for i in range(7)]
+    cards, failed = await generate_cards(words, provider, max_concurrency=4)
+    assert provider.prompts == [words[0:3], words[3:6], words[6:7]]
+    assert [card.word for card in cards] == [word.upper() for word in words]
+    assert failed == []
+
+
+@pytest.mark.anyio
+async def test_words_are_deduplicated_on_the_word_key():
+    provider = FlakyCardProvider(max_batch_size=10)
+    cards, failed = await generate_cards(
+        ["Apple", " apple ", "<b>APPLE</b>", "pear", "", "   "],
+        provider,
+        max_concurrency=1,
+    )
+    assert provider.prompts == [["Apple", "pear"]]
+    assert [card.word for card in cards] == ["APPLE", "PEAR"]
+    assert failed == []
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_are_bounded():
+    provider = FakeCardProvider(max_batch_size=1, latency_seconds=0.02)
+    words = [f"word{i}" for i in range(12)]
+    cards, failed = await generate_cards(words, provider, max_concurrency=3)
+    assert len(cards) == 12
+    assert provider.n_calls == 12
+    assert provider.max_in_flight == 3
+
+
+@pytest.mark.anyio
+async def test_missing_and_failed_words_are_reported():
+    provider = FlakyCardProvider(max_batch_size=2, missing={"b"}, failing={"c"})
+    cards, failed = await generate_cards(
+        ["a", "b", "c", "d", "e"], provider, max_concurrency=2
+    )
+    assert [card.word for card in cards] == ["A", "E"]
+    assert failed == ["b", "c", "d"]
+
+
+@pytest.mark.anyio
+async def test_timed_out_batches_are_reported_as_failed(monkeypatch):
+    monkeypatch.setattr(settings, "CARD_GENERATION_TIMEOUT_SECONDS", 0.05)
+    provider = FakeCardProvider(max_batch_size=3, per_word_seconds=0.02)
+    # one word fits in the timeout, a batch of three does not
+    cards, failed = await generate_cards(
+        ["slow1", "slow2", "slow3", "fast"], provider, max_concurrency=2
+    )
+    assert [card.word for card in cards] == ["fast"]
+    assert failed == ["slow1", "slow2", "slow3"]
+    # the timed out call was cancelled
+    assert provider.n_in_flight == 0
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+import httpx
+import pytest
+
+from api.deps import get_current_active_user
+from corelib.chunked_upload import (
+    UploadOffsetError,
+    create_upload,
+    get_upload,
+    upload_data_path,
+    write_chunk,
+)
+from corelib.config import settings
+from models.user import User
+
+CONTENT = os.urandom(64 * 1024)
+
+
+@pytest.fixture(autouse=True)
+def upload_root(monkeypatch):
+    monkeypatch.setattr(settings, "APKG_UPLOAD_ROOT_PATH", tempfile.mkdtemp())
+
+
+@pytest.fixture
+def upload():
+    upload_id = create_upload(
+        1, "deck.apkg", len(CONTENT), hashlib.sha256(CONTENT).hexdigest()
+    )
+    return get_upload(upload_id, 1)
+
+
+async def pieces(content, started=None, resume=None):
+    yield content[:1024]
+    if started is not None:
+        started.set()
+        await resume.wait()
+    yield content[1024:]
+
+
+@pytest.mark.anyio
+async def test_chunks_are_appended_at_their_offset(upload):
+    assert await write_chunk(upload, 0, pieces(CONTENT[:4096])) == 4096
+    with pytest.raises(UploadOffsetError) as e:
+        await write_chunk(upload, 0, pieces(CONTENT[:4096]))
+    assert e.value.offset == 4096
+    assert await write_chunk(upload, 4096, pieces(CONTENT[4096:])) == len(CONTENT)
+    with open(upload_data_path(upload["upload_id"]), "rb") as f:
+        assert f.read() == CONTENT
+
+
+@pytest.mark.anyio
+async def test_concurrent_chunk_at_the_same_offset_is_rejected(upload):
+    started, resume = asyncio.Event(), asyncio.Event()
+    first = asyncio.ensure_future(
+        write_chunk(upload, 0, pieces(CONTENT, started, resume))
+    )
+    await started.wait()
+    # the retry of a chunk whose request is still being written
+    with pytest.raises(UploadOffsetError):
+        await write_chunk(upload, 0, pieces(CONTENT))
+    resume.set()
+    assert await first == len(CONTENT)
+    with open(upload_data_path(upload["upload_id"]), "rb") as f:
+        assert f.read() == CONTENT
+
+
+@pytest.mark.anyio
+async def test_put_conflict_returns_the_current_offset(upload):
+    from app import app
+
+    app.dependency_overrides[get_current_active_user] = lambda: User(id=1)
+    url = f"{settings.API_V1_STR}/cards/import/uploads/{upload['upload_id']}"
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.put(url, params={"offset": 0}, content=CONTENT[:10])
+            assert response.json()["offset"] == 10
+            response = await client.put(url, params={"offset": 0}, content=CONTENT[:10])
+    finally:
+        app.dependency_overrides.pop(get_current_active_user)
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == "10"
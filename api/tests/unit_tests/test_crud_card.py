@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib import due_queue_cache
+from corelib.card_generation import parse_generated_cards
+from corelib.spaced_repetition import calculate_next_review, get_review_status
+from crud import crud_card
+from crud.crud_card import create_card, create_review, get_due_cards, import_cards
+from models.base import Base
+from models.card import Card
+from models.user import User
+from schemas.card import Card as CardSchema
+from schemas.card import CardCreate
+
+
+@pytest.fixture(params=["returning", "without_returning"])
+async def db(request):
+    db_path = os.path.join(tempfile.mkdtemp(), "test_crud_card.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    if request.param == "without_returning":
+        # SQLite standing in for a backend without RETURNING, such as MySQL
+        engine.dialect.update_returning = False
+        engine.dialect.insert_executemany_returning = False
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with session_local() as session:
+        session.add(User(id=1, email="user@anki.ai", hashed_password="hash"))
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+async def batches(*batches):
+    for batch in batches:
+        yield batch
+
+
+@pytest.mark.anyio
+async def test_create_card_merges_the_same_word(db):
+    card = await create_card(db, CardCreate(word="Apple", definition="a fruit"), 1)
+    merged = await create_card(
+        db,
+        CardCreate(word="apple ", definition="", example="an apple a day"),
+        1,
+        merge_policy="fill_empty",
+    )
+    assert merged.id == card.id
+    assert merged.definition == "a fruit"
+    assert merged.example == "an apple a day"
+    assert (await db.scalars(select(Card))).all() == [merged]
+
+
+@pytest.mark.anyio
+async def test_import_cards_counts_new_and_duplicate_cards(db):
+    await create_card(db, CardCreate(word="apple", definition="a fruit"), 1)
+    n_imported, n_duplicates = await import_cards(
+        db,
+        1,
+        batches(
+            [{"word": "Apple", "definition": "fruit"}, {"word": "pear"}],
+            [{"word": "PEAR"}, {"word": "plum"}],
+        ),
+        merge_policy="overwrite",
+    )
+    assert (n_imported, n_duplicates) == (2, 2)
+    result = await db.execute(select(Card.word_key, Card.definition).order_by(Card.id))
+    assert result.all() == [
+        ("apple", "fruit"),
+        ("pear", ""),
+        ("plum", ""),
+    ]
+
+
+@pytest.mark.anyio
+async def test_review_advances_the_schedule_once(db):
+    card = await create_card(db, CardCreate(word="apple", definition="a fruit"), 1)
+    for review_count in range(6):
+        card = await create_review(db, card.id, 1, 3)
+        assert card.review_count == review_count + 1
+        assert card.status == get_review_status(review_count + 1)
+        expected = calculate_next_review(review_count, 3, datetime.now())
+        assert abs((card.next_review - expected).total_seconds()) < 5
+    # the rollback expires the card
+    card_id = card.id
+    assert await create_review(db, card_id, 2, 3) is None
+    assert await create_review(db, card_id + 1, 1, 3) is None
+
+
+@pytest.mark.anyio
+async def test_due_cards_past_the_capped_queue_come_from_the_database(db, monkeypatch):
+    monkeypatch.setattr(due_queue_cache, "DUE_QUEUE_FILL_MAX_ENTRIES", 5)
+    monkeypatch.setattr(crud_card, "DUE_QUEUE_FILL_MAX_ENTRIES", 5)
+    due_queue_cache.invalidate_due_queue(1)
+    now = datetime.now()
+    for i in range(12):
+        card = await create_card(db, CardCreate(word=f"word{i}", definition="x"), 1)
+        card.next_review = now - timedelta(minutes=i)
+    await db.commit()
+    expected = list(range(12, 0, -1))
+
+    pages, cursor = [], {}
+    while True:
+        cards = await get_due_cards(db, 1, limit=3, **cursor)
+        if not cards:
+            break
+        pages.append([card.id for card in cards])
+        cursor = {"after_next_review": cards[-1].next_review, "after_id": cards[-1].id}
+    assert sum(pages, []) == expected
+    # the miss filled a queue with the cards before the last one read
+    queue = due_queue_cache.lookup_due_queue(1)
+    assert queue["card_ids"].tolist() == expected[:4]
+    due_queue_cache.invalidate_due_queue(1)
+
+
+@pytest.mark.anyio
+async def test_generated_card_is_saved_with_all_its_fields(db):
+    generated = {
+        "单词": "adhere",
+        "详细资料": "v. to stick fast to a surface",
+        "英美音标": "/ədˈhɪr/",
+        "中文释义": "v. 黏附",
+        "英语例句": "Glue adheres to paper.",
+        "英语例句对应的中文翻译": "胶水粘在纸上。",
+        "笔记": "ad- + haerere",
+        "标签": "verb cet6",
+    }
+    (card,) = parse_generated_cards(json.dumps([generated], ensure_ascii=False))
+    # what POST /cards/ does with the request body
+    created = CardSchema.model_validate(
+        await create_card(db, CardCreate.model_validate(card.model_dump()), 1)
+    )
+    assert created.model_dump(include=set(card.model_dump())) == card.model_dump()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from crud.crud_card import create_card, create_review
+from crud.crud_statistic import get_statistics, rebuild_daily_stats, record_daily_stats
+from models.base import Base
+from models.statistic import UserDailyStats
+from models.user import User
+from schemas.card import CardCreate
+
+
+@pytest.fixture
+async def db():
+    db_path = os.path.join(tempfile.mkdtemp(), "test_crud_statistic.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with session_local() as session:
+        session.add(User(id=1, email="user@anki.ai", hashed_password="hash"))
+        await session.commit()
+        statements.clear()
+        session.statements = statements
+        yield session
+    await engine.dispose()
+
+
+async def get_rows(db):
+    result = await db.execute(select(UserDailyStats).order_by(UserDailyStats.day))
+    return result.scalars().all()
+
+
+@pytest.mark.anyio
+async def test_a_review_is_one_update_once_the_day_has_a_row(db):
+    await record_daily_stats(db, 1, status_changes=[(None, "learning")] * 2)
+    db.statements.clear()
+    await record_daily_stats(
+        db, 1, reviews=1, ratings=[4], status_changes=[("learning", "reviewing")]
+    )
+    assert len(db.statements) == 1
+    assert db.statements[0].startswith("UPDATE user_daily_stats")
+    (row,) = await get_rows(db)
+    assert row.review_count == 1
+    assert row.rating_4_count == 1
+    assert (row.learning_cards, row.reviewing_cards) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_first_change_of_the_day_carries_the_snapshots(db):
+    db.add(
+        UserDailyStats(
+            user_id=1,
+            day=datetime.now().date() - timedelta(days=3),
+            review_count=5,
+            rating_3_count=4,
+            rating_5_count=1,
+            reviewing_cards=2,
+            mastered_cards=1,
+        )
+    )
+    await db.commit()
+    await record_daily_stats(
+        db, 1, reviews=2, ratings=[3, 9], status_changes=[("reviewing", "mastered")]
+    )
+    _, today = await get_rows(db)
+    assert today.review_count == 2
+    # a rating without a counter column is not counted
+    assert (today.rating_3_count, today.rating_5_count) == (5, 1)
+    assert (today.reviewing_cards, today.mastered_cards) == (1, 2)
+
+
+@pytest.mark.anyio
+async def test_changes_without_effect_write_nothing(db):
+    await record_daily_stats(db, 1, status_changes=[("mastered", "mastered")])
+    assert db.statements == []
+
+
+@pytest.mark.anyio
+async def test_rebuild_matches_the_incremental_rollup(db):
+    cards = [
+        await create_card(db, CardCreate(word=f"word{i}", definition="x"), 1)
+        for i in range(3)
+    ]
+    for rating, card in zip([1, 4, 5, 4], cards + cards[:1]):
+        await create_review(db, card.id, 1, rating)
+    incremental = await get_statistics(db, 1)
+    await rebuild_daily_stats(db, 1)
+    assert await get_statistics(db, 1) == incremental
+    counts = {item["rating"]: item["count"] for item in incremental.review_ratings}
+    assert (counts[1], counts[4], counts[5], counts[6]) == (1, 2, 1, 0)
+    assert incremental.reviewing_cards == 3
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from corelib import due_queue_cache
+from corelib.due_queue_cache import (
+    due_card_ids,
+    due_queue_generation,
+    due_queue_horizon,
+    invalidate_due_queue,
+    load_due_queue,
+    lookup_due_queue,
+    upsert_due_card,
+)
+
+NOW = datetime.now()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    due_queue_cache.due_queues.clear()
+    due_queue_cache.due_queue_entries = 0
+    yield
+    due_queue_cache.due_queues.clear()
+    due_queue_cache.due_queue_entries = 0
+
+
+def fill(user_id, rows):
+    generation = due_queue_generation(user_id)
+    return load_due_queue(user_id, rows, generation, due_queue_horizon())
+
+
+def test_due_cards_in_review_order():
+    rows = [
+        (NOW - timedelta(minutes=1), 3),
+        (NOW - timedelta(minutes=5), 2),
+        (NOW - timedelta(minutes=1), 1),
+        (NOW + timedelta(minutes=1), 4),
+    ]
+    queue = fill(1, rows)
+    assert due_card_ids(queue, NOW) == [2, 1, 3]
+    assert due_card_ids(queue, NOW, limit=2) == [2, 1]
+    assert due_card_ids(
+        queue, NOW, after_next_review=NOW - timedelta(minutes=1), after_id=1
+    ) == [3]
+    assert due_card_ids(queue, NOW + timedelta(minutes=2)) == [2, 1, 3, 4]
+
+
+def test_upsert_moves_and_removes_cards():
+    fill(1, [(NOW - timedelta(minutes=i), i) for i in range(1, 6)])
+    upsert_due_card(1, 3, NOW + timedelta(days=1))
+    upsert_due_card(1, 1, NOW - timedelta(hours=1))
+    upsert_due_card(1, 6, NOW - timedelta(seconds=1))
+    upsert_due_card(1, 5, None)
+    queue = lookup_due_queue(1)
+    assert due_card_ids(queue, NOW) == [1, 4, 2, 6]
+    # beyond the horizon, the card is not kept in the queue at all
+    assert 3 not in queue["card_ids"].tolist()
+    assert due_queue_cache.due_queue_entries == 4
+
+
+def test_fill_racing_a_review_is_not_cached():
+    generation = due_queue_generation(1)
+    horizon = due_queue_horizon()
+    rows = [(NOW - timedelta(minutes=1), 1)]
+    # the review commits after the rows were read, the cache is still empty
+    upsert_due_card(1, 1, NOW + timedelta(days=1))
+    queue = load_due_queue(1, rows, generation, horizon)
+    assert due_card_ids(queue, NOW) == [1]
+    assert lookup_due_queue(1) is None
+    fill(1, [])
+    assert lookup_due_queue(1) is not None
+
+
+def test_invalidation_drops_the_queue_and_racing_fills():
+    generation = due_queue_generation(1)
+    fill(1, [(NOW, 1)])
+    invalidate_due_queue(1)
+    assert lookup_due_queue(1) is None
+    load_due_queue(1, [(NOW, 1)], generation, due_queue_horizon())
+    assert lookup_due_queue(1) is None
+
+
+def test_cache_is_bounded_by_entries(monkeypatch):
+    monkeypatch.setattr(due_queue_cache, "DUE_QUEUE_CACHE_MAX_ENTRIES", 10)
+    fill(1, [(NOW, i) for i in range(4)])
+    fill(2, [(NOW, i) for i in range(4)])
+    lookup_due_queue(1)
+    fill(3, [(NOW, i) for i in range(4)])
+    assert set(due_queue_cache.due_queues) == {1, 3}
+    assert due_queue_cache.due_queue_entries == 8
+    # a queue larger than the whole cache is served but not kept
+    queue = fill(4, [(NOW, i) for i in range(11)])
+    assert len(due_card_ids(queue, NOW)) == 11
+    assert 4 not in due_queue_cache.due_queues
+
+
+def test_capped_fill_only_answers_the_pages_it_holds(monkeypatch):
+    monkeypatch.setattr(due_queue_cache, "DUE_QUEUE_FILL_MAX_ENTRIES", 4)
+    # the fourth row ties with the (unread) fifth one, both are left out
+    rows = [(NOW - timedelta(minutes=10 - i), i) for i in range(3)]
+    queue = fill(1, rows + [(NOW - timedelta(minutes=1), 3)])
+    assert queue["card_ids"].tolist() == [0, 1, 2]
+    assert due_card_ids(queue, NOW, limit=3) == [0, 1, 2]
+    assert due_card_ids(queue, NOW, skip=1, limit=2) == [1, 2]
+    assert due_card_ids(queue, NOW, limit=4) is None
+    assert (
+        due_card_ids(
+            queue, NOW, after_next_review=NOW - timedelta(minutes=8), after_id=2
+        )
+        is None
+    )
+    # a card moved past the cut is left to the database
+    upsert_due_card(1, 1, NOW - timedelta(minutes=1))
+    assert due_card_ids(lookup_due_queue(1), NOW, limit=2) == [0, 2]
@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from scripts.benchmark_import_time import BACKEND_DRIVERS, ENTRY_POINTS, import_times
+
+# generous, the benchmark script reports the actual numbers
+IMPORT_TIME_BUDGET_MS = 3000
+
+CHECK_IMPORT = """
+import json, sys
+import {module}
+from corelib import db
+print(json.dumps({{
+    "engines": [list(key) for key in db.engines],
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_import_builds_no_engine(module):
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORT.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = json.loads(result.stdout.splitlines()[-1])
+    assert imported["engines"] == []
+    for driver in BACKEND_DRIVERS.values():
+        assert driver not in imported["modules"]
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_import_time_within_budget(module):
+    times = import_times(module)
+    assert times[module][1] / 1000 < IMPORT_TIME_BUDGET_MS
@@ -0,0 +1,115 @@
+import io
+import os
+import tempfile
+from functools import partial
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.config import settings
+from corelib.db import get_read_db
+from corelib.media_store import guess_content_type, store_media
+from models.base import Base
+from models.media import MediaBlob
+
+
+@pytest.mark.parametrize(
+    "filename, content_type",
+    [
+        ("word.mp3", "audio/mpeg"),
+        ("word.png", "image/png"),
+        ("word.jpg", "image/jpeg"),
+        ("x.html", "application/octet-stream"),
+        ("x.svg", "application/octet-stream"),
+        ("x.js", "application/octet-stream"),
+        ("no-extension", "application/octet-stream"),
+    ],
+)
+def test_guess_content_type_allows_only_audio_and_raster_images(filename, content_type):
+    assert guess_content_type(filename) == content_type
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    from app import app
+
+    work_dir = tempfile.mkdtemp()
+    monkeypatch.setattr(settings, "MEDIA_ROOT_PATH", os.path.join(work_dir, "media"))
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(work_dir, 'test_media.db')}"
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_test_db():
+        async with session_local() as session:
+            yield session
+
+    async def add_media(content: bytes, content_type: str) -> str:
+        sha256, size, _ = store_media(partial(io.BytesIO, content))
+        async with session_local() as session:
+            session.add(MediaBlob(sha256=sha256, size=size, content_type=content_type))
+            await session.commit()
+        return sha256
+
+    app.dependency_overrides[get_read_db] = get_test_db
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as http_client:
+        http_client.add_media = add_media
+        yield http_client
+    app.dependency_overrides.pop(get_read_db)
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_audio_is_served_inline(client):
+    sha256 = await client.add_media(b"ID3 audio", "audio/mpeg")
+    response = await client.get(f"{settings.API_V1_STR}/media/{sha256}")
+    assert response.status_code == 200
+    assert response.content == b"ID3 audio"
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert "content-disposition" not in response.headers
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("content_type", ["text/html", "image/svg+xml"])
+async def test_active_content_is_served_as_attachment(client, content_type):
+    # a blob recorded with its guessed type before the allowlist existed
+    sha256 = await client.add_media(b"<script>alert(1)</script>", content_type)
+    response = await client.get(f"{settings.API_V1_STR}/media/{sha256}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-disposition"].startswith("attachment")
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+@pytest.mark.anyio
+async def test_range_request_gets_the_partial_content(client):
+    sha256 = await client.add_media(b"0123456789" * 10, "audio/mpeg")
+    response = await client.get(
+        f"{settings.API_V1_STR}/media/{sha256}", headers={"Range": "bytes=10-19"}
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/100"
+    assert response.content == b"0123456789"
+    assert response.headers["etag"] == f'"{sha256}"'
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("if_none_match", ["{etag}", 'W/"other", W/{etag}', "*"])
+async def test_matching_etag_gets_not_modified(client, if_none_match):
+    sha256 = await client.add_media(b"ID3 audio", "audio/mpeg")
+    url = f"{settings.API_V1_STR}/media/{sha256}"
+    etag = (await client.get(url)).headers["etag"]
+    response = await client.get(
+        url, headers={"If-None-Match": if_none_match.format(etag=etag)}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+import celery
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib.outbox import (
+    OUTBOX_CLAIM_LEASE_SECONDS,
+    _claim_batch,
+    new_outbox_message,
+    relay_outbox_once,
+)
+from corelib.tasks.helper import new_task_params
+from models.base import Base
+from models.outbox import OutboxMessage
+
+TASK_NAME = "send-activation-email-task"
+MAX_ATTEMPTS = 3
+
+
+@pytest.fixture
+async def session_local():
+    db_path = os.path.join(tempfile.mkdtemp(), "test_outbox.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    await engine.dispose()
+
+
+class FlakyCelery(celery.Celery):
+    """In-memory broker whose first ``n_failures`` publishes raise."""
+
+    def __init__(self, n_failures=0):
+        super().__init__("test_outbox", broker="memory://", set_as_current=False)
+        # the memory transport is shared by the whole process
+        self.conf.task_default_queue = f"test-outbox-{uuid.uuid4().hex}"
+        self.n_failures = n_failures
+
+    def send_task(self, *args, **kwargs):
+        if self.n_failures > 0:
+            self.n_failures -= 1
+            raise ConnectionError("broker refused the message")
+        return super().send_task(*args, **kwargs)
+
+    def delivered_task_ids(self):
+        task_ids = []
+        with self.connection_for_read() as conn:
+            queue = conn.SimpleQueue(self.conf.task_default_queue)
+            while True:
+                try:
+                    message = queue.get(block=False)
+                except queue.Empty:
+                    break
+                task_ids.append(message.headers["id"])
+                message.ack()
+        return task_ids
+
+
+async def add_messages(session_local, n):
+    task_ids = []
+    async with session_local() as db:
+        for i in range(n):
+            task_id, task_params = new_task_params(email=f"user{i}@anki.ai")
+            db.add(new_outbox_message(TASK_NAME, task_id, task_params, countdown=3))
+            task_ids.append(task_id)
+        await db.commit()
+    return task_ids
+
+
+async def get_messages(session_local):
+    async with session_local() as db:
+        result = await db.scalars(select(OutboxMessage).order_by(OutboxMessage.id))
+        return result.all()
+
+
+async def make_due(session_local):
+    # skip the backoff or the lease instead of waiting for it
+    async with session_local() as db:
+        await db.execute(
+            update(OutboxMessage).values(next_attempt_at=datetime(2000, 1, 1))
+        )
+        await db.commit()
+
+
+@pytest.mark.anyio
+async def test_relay_publishes_and_deletes(session_local):
+    app = FlakyCelery()
+    task_ids = await add_messages(session_local, 5)
+    assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 5
+    assert app.delivered_task_ids() == task_ids
+    assert await get_messages(session_local) == []
+    assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 0
+
+
+@pytest.mark.anyio
+async def test_a_claimed_message_is_leased_to_one_relay(session_local):
+    await add_messages(session_local, 4)
+    async with session_local() as db_a, session_local() as db_b:
+        claimed_a = await _claim_batch(db_a, "relay-a", 10, MAX_ATTEMPTS)
+        claimed_b = await _claim_batch(db_b, "relay-b", 10, MAX_ATTEMPTS)
+    assert len(claimed_a) == 4
+    assert claimed_b == []
+    messages = await get_messages(session_local)
+    assert {message.claimed_by for message in messages} == {"relay-a"}
+    lease_end = datetime.now() + timedelta(seconds=OUTBOX_CLAIM_LEASE_SECONDS)
+    assert all(message.next_attempt_at <= lease_end for message in messages)
+
+    # relay-a died, once the lease is over relay-b takes the messages over
+    await make_due(session_local)
+    async with session_local() as db_b:
+        claimed_b = await _claim_batch(db_b, "relay-b", 10, MAX_ATTEMPTS)
+    assert [message[0] for message in claimed_b] == [
+        message[0] for message in claimed_a
+    ]
+
+
+@pytest.mark.anyio
+async def test_concurrent_relays_publish_each_message_once(session_local):
+    app = FlakyCelery()
+    task_ids = await add_messages(session_local, 200)
+
+    async def relay():
+        while await relay_outbox_once(session_local, app, 7, MAX_ATTEMPTS):
+            pass
+
+    await asyncio.gather(relay(), relay(), relay())
+    assert sorted(app.delivered_task_ids()) == sorted(task_ids)
+    assert await get_messages(session_local) == []
+
+
+@pytest.mark.anyio
+async def test_failed_publish_backs_off_exponentially(session_local):
+    app = FlakyCelery(n_failures=2)
+    await add_messages(session_local, 1)
+    delays = []
+    for attempts in (1, 2):
+        st = datetime.now()
+        assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 1
+        (message,) = await get_messages(session_local)
+        assert message.attempts == attempts
+        assert message.claimed_by is None
+        assert "broker refused" in message.last_error
+        delays.append((message.next_attempt_at - st).total_seconds())
+        # not due again before the backoff is over
+        assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 0
+        await make_due(session_local)
+    assert delays[0] == pytest.approx(2, abs=0.5)
+    assert delays[1] == pytest.approx(4, abs=0.5)
+    assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 1
+    assert len(app.delivered_task_ids()) == 1
+
+
+@pytest.mark.anyio
+async def test_message_is_given_up_after_max_attempts(session_local):
+    app = FlakyCelery(n_failures=MAX_ATTEMPTS)
+    await add_messages(session_local, 1)
+    for _ in range(MAX_ATTEMPTS):
+        assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 1
+        await make_due(session_local)
+    # kept for inspection, never published again
+    assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 0
+    (message,) = await get_messages(session_local)
+    assert message.attempts == MAX_ATTEMPTS
+    assert app.delivered_task_ids() == []
+
+
+@pytest.mark.anyio
+async def test_task_id_is_stable_across_republish(session_local):
+    app = FlakyCelery(n_failures=1)
+    (task_id,) = await add_messages(session_local, 1)
+    await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS)
+    (message,) = await get_messages(session_local)
+    assert message.task_id == task_id
+    await make_due(session_local)
+
+    # a relay that claimed the message and died before publishing
+    async with session_local() as db:
+        await _claim_batch(db, "dead-relay", 10, MAX_ATTEMPTS)
+    await make_due(session_local)
+
+    assert await relay_outbox_once(session_local, app, 10, MAX_ATTEMPTS) == 1
+    assert app.delivered_task_ids() == [task_id]
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from corelib import security
+from corelib.config import settings
+from corelib.db import get_db, get_read_db
+from corelib.security import (
+    PasswordHashBusyError,
+    aget_password_hash,
+    averify_password,
+)
+from models.base import Base
+from models.card import Card
+from models.user import User
+
+
+@pytest.fixture(autouse=True)
+def password_executor():
+    yield
+    security.shutdown_password_executor()
+    security.pending_password_jobs = 0
+
+
+@pytest.fixture
+def blocking_verify(monkeypatch):
+    """Make verify_password wait until the returned event is set."""
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def verify_password(plain_password, hashed_password):
+        started.release()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(security, "verify_password", verify_password)
+    yield release, started
+    release.set()
+
+
+async def wait_until(predicate, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_hash_and_verify_run_in_the_pool(monkeypatch):
+    threads = []
+    get_password_hash = security.get_password_hash
+
+    def recording_hash(password):
+        threads.append(threading.current_thread().name)
+        return get_password_hash(password)
+
+    monkeypatch.setattr(security, "get_password_hash", recording_hash)
+    hashed_password = await aget_password_hash("correct horse")
+    assert threads[0].startswith("password-hash")
+    assert await averify_password("correct horse", hashed_password)
+    assert not await averify_password("wrong horse", hashed_password)
+    assert security.pending_password_jobs == 0
+
+
+@pytest.mark.anyio
+async def test_admission_limit_rejects_extra_jobs(monkeypatch, blocking_verify):
+    release, _ = blocking_verify
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 2)
+    jobs = [asyncio.ensure_future(averify_password("pw", "hash")) for _ in range(2)]
+    await wait_until(lambda: security.pending_password_jobs == 2)
+    with pytest.raises(PasswordHashBusyError):
+        await averify_password("pw", "hash")
+    release.set()
+    assert await asyncio.gather(*jobs) == [True, True]
+    await wait_until(lambda: security.pending_password_jobs == 0)
+
+
+@pytest.mark.anyio
+async def test_login_flood_gets_503(monkeypatch, blocking_verify):
+    from app import app
+
+    release, _ = blocking_verify
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 1)
+    job = asyncio.ensure_future(averify_password("pw", "hash"))
+    await wait_until(lambda: security.pending_password_jobs == 1)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            f"{settings.API_V1_STR}/users/login",
+            data={"username": "flood@anki.ai", "password": "pw"},
+        )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    release.set()
+    await job
+
+
+@pytest.mark.anyio
+async def test_cancelled_request_holds_its_slot_until_the_job_ends(
+    monkeypatch, blocking_verify
+):
+    release, started = blocking_verify
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", 1)
+    running = asyncio.ensure_future(averify_password("pw", "hash"))
+    await asyncio.get_running_loop().run_in_executor(None, started.acquire)
+    queued = asyncio.ensure_future(averify_password("pw", "hash"))
+    await wait_until(lambda: security.pending_password_jobs == 2)
+
+    # a queued job is cancelled with its request and frees its slot
+    queued.cancel()
+    await wait_until(lambda: security.pending_password_jobs == 1)
+    # the running bcrypt cannot be interrupted, its slot stays taken
+    running.cancel()
+    await asyncio.sleep(0.1)
+    assert security.pending_password_jobs == 1
+    release.set()
+    await wait_until(lambda: security.pending_password_jobs == 0)
+
+
+@pytest.mark.anyio
+async def test_reviews_stay_fast_during_a_login_burst(monkeypatch):
+    from api.deps import get_current_active_user
+    from app import app
+
+    def slow_verify(plain_password, hashed_password):
+        # inline, the 100 logins would hold the event loop for 5s
+        time.sleep(0.05)
+        return True
+
+    monkeypatch.setattr(security, "verify_password", slow_verify)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", 4)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 100)
+    db_path = os.path.join(tempfile.mkdtemp(), "test_security.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with session_local() as session:
+        session.add(
+            User(id=1, email="burst@anki.ai", hashed_password="x", is_verified=True)
+        )
+        session.add(Card(id=1, word="word", definition="definition", owner_id=1))
+        await session.commit()
+
+    async def get_test_db():
+        async with session_local() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_read_db] = get_test_db
+    app.dependency_overrides[get_current_active_user] = lambda: User(id=1)
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+
+            async def login():
+                response = await client.post(
+                    f"{settings.API_V1_STR}/users/login",
+                    data={"username": "burst@anki.ai", "password": "pw"},
+                )
+                return response.status_code
+
+            async def review():
+                st = time.perf_counter()
+                response = await client.post(
+                    f"{settings.API_V1_STR}/cards/1/review",
+                    json={"card_id": 1, "rating": 3},
+                )
+                assert response.status_code == 200
+                return time.perf_counter() - st
+
+            await review()
+            logins = asyncio.gather(*(login() for _ in range(100)))
+            # measure while the logins wait on bcrypt, not while they are parsed
+            await wait_until(lambda: security.pending_password_jobs >= 50)
+            latencies = []
+            while not logins.done():
+                latencies.append(await review())
+                await asyncio.sleep(0.005)
+            statuses = await logins
+    finally:
+        app.dependency_overrides.pop(get_db)
+        app.dependency_overrides.pop(get_read_db)
+        app.dependency_overrides.pop(get_current_active_user)
+        await engine.dispose()
+    assert statuses == [200] * 100
+    assert len(latencies) >= 5
+    # generous for a slow CI machine, far below the 5s of inline hashing
+    assert max(latencies) < 0.25
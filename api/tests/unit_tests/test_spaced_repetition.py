@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from hypothesis import given
+from hypothesis import strategies as st
+
+from corelib.spaced_repetition import (
+    EBINGHAUS_INTERVALS,
+    calculate_next_review,
+    calculate_next_reviews,
+    get_review_status,
+    schedule_reviews,
+)
+
+review_counts = st.integers(min_value=0, max_value=len(EBINGHAUS_INTERVALS) + 10)
+ratings = st.integers(min_value=1, max_value=5)
+reference_times = st.datetimes(
+    min_value=datetime(2000, 1, 1), max_value=datetime(2100, 1, 1)
+)
+
+
+def test_every_interval_matches_scalar_scheduler():
+    now = datetime(2026, 10, 17, 12, 34, 56, 789012)
+    counts, rates = np.meshgrid(
+        np.arange(len(EBINGHAUS_INTERVALS) + 3), np.arange(1, 6), indexing="ij"
+    )
+    next_reviews, statuses = schedule_reviews(counts.ravel(), rates.ravel(), now)
+    for review_count, rating, next_review, status in zip(
+        counts.ravel().tolist(),
+        rates.ravel().tolist(),
+        next_reviews.tolist(),
+        statuses.tolist(),
+    ):
+        assert next_review == calculate_next_review(review_count, rating, now)
+        assert status == get_review_status(review_count + 1)
+
+
+@given(st.lists(st.tuples(review_counts, ratings), min_size=1), reference_times)
+def test_batch_matches_scalar_scheduler(cards, now):
+    counts = np.array([review_count for review_count, _ in cards])
+    rates = np.array([rating for _, rating in cards])
+    next_reviews, statuses = schedule_reviews(counts, rates, now)
+    assert next_reviews.tolist() == [
+        calculate_next_review(review_count, rating, now)
+        for review_count, rating in cards
+    ]
+    assert statuses.tolist() == [
+        get_review_status(review_count + 1) for review_count, _ in cards
+    ]
+
+
+@given(st.lists(st.tuples(review_counts, ratings, reference_times), min_size=1))
+def test_batch_matches_scalar_scheduler_per_card_reference_time(cards):
+    next_reviews = calculate_next_reviews(
+        np.array([card[0] for card in cards]),
+        np.array([card[1] for card in cards]),
+        np.array([card[2] for card in cards], dtype="datetime64[us]"),
+    )
+    assert next_reviews.tolist() == [
+        calculate_next_review(review_count, rating, now)
+        for review_count, rating, now in cards
+    ]
+
+
+def test_next_review_is_at_least_one_hour_away():
+    now = datetime(2026, 10, 17)
+    next_reviews = calculate_next_reviews(
+        np.zeros(5, dtype=np.int64), np.arange(1, 6), now
+    )
+    assert min(next_reviews.tolist()) - now >= timedelta(hours=1)
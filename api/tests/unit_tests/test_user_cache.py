@@ -0,0 +1,180 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from api import deps
+from corelib import user_cache
+from corelib.config import settings
+from corelib.db import start_group_commit, stop_group_commit
+from corelib.metrics import get_metrics
+from corelib.security import create_token
+from corelib.user_cache import (
+    cache_user,
+    get_cached_user,
+    invalidate_cached_user,
+    user_cache_generation,
+)
+from crud.crud_user import (
+    cancel_subscription,
+    create_user,
+    delete_user,
+    get_user,
+    update_user_profile,
+)
+from models.base import Base
+from models.card import Card  # noqa: F401, mapped for User.cards
+from models.user import User
+from schemas.user import UserCreate, UserUpdate
+
+EMAIL = "user@anki.ai"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_REDIS_ENABLED", False)
+    user_cache.cached_users.clear()
+    yield
+    user_cache.cached_users.clear()
+
+
+@pytest.fixture
+async def db():
+    db_path = os.path.join(tempfile.mkdtemp(), "test_user_cache.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async with session_local() as session:
+        session.add(User(id=1, email=EMAIL, hashed_password="hash", is_premium=True))
+        await session.commit()
+        session.session_local = session_local
+        yield session
+    await engine.dispose()
+
+
+async def fill(db):
+    # what get_current_user does on a miss
+    generation = await user_cache_generation(EMAIL)
+    user = await deps.get_user_by_email(db, email=EMAIL)
+    await cache_user(user, generation)
+    return user
+
+
+@pytest.mark.anyio
+async def test_cached_user_is_a_detached_snapshot(db):
+    await fill(db)
+    user = await get_cached_user(EMAIL)
+    assert (user.id, user.email, user.is_premium) == (1, EMAIL, True)
+    assert user.hashed_password is None
+
+
+@pytest.mark.anyio
+async def test_fill_racing_an_invalidation_is_not_cached(db):
+    generation = await user_cache_generation(EMAIL)
+    user = await deps.get_user_by_email(db, email=EMAIL)
+    # the user changes and is invalidated after the read
+    await invalidate_cached_user(EMAIL)
+    await cache_user(user, generation)
+    assert await get_cached_user(EMAIL) is None
+    await fill(db)
+    assert await get_cached_user(EMAIL) is not None
+
+
+@pytest.mark.anyio
+async def test_fill_racing_a_lost_subscription_is_not_cached(db):
+    generation = await user_cache_generation(EMAIL)
+    user = await deps.get_user_by_email(db, email=EMAIL)
+    user_cache._clear_local()
+    await cache_user(user, generation)
+    assert await get_cached_user(EMAIL) is None
+
+
+@pytest.mark.anyio
+async def test_get_current_user_does_not_cache_a_user_deleted_meanwhile(
+    db, monkeypatch
+):
+    get_user_by_email = deps.get_user_by_email
+
+    async def read_then_delete(db, email):
+        user = await get_user_by_email(db, email)
+        await delete_user(db, user.id)
+        return user
+
+    monkeypatch.setattr(deps, "get_user_by_email", read_then_delete)
+    token = create_token({"sub": EMAIL})
+    user = await deps.get_current_user(db=db, token=token)
+    assert user.email == EMAIL
+    assert await get_cached_user(EMAIL) is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda db: update_user_profile(db, 1, UserUpdate(nickname="Renamed")),
+        lambda db: cancel_subscription(db, 1),
+        lambda db: delete_user(db, 1),
+    ],
+    ids=["update_user_profile", "cancel_subscription", "delete_user"],
+)
+async def test_user_writes_invalidate_the_cache(db, change):
+    await fill(db)
+    assert await get_cached_user(EMAIL) is not None
+    await change(db)
+    assert await get_cached_user(EMAIL) is None
+
+
+@pytest.mark.anyio
+async def test_user_writes_go_through_group_commit(db):
+    def n_writes():
+        return get_metrics()["counters"].get("group_commit.writes", 0)
+
+    start_group_commit(1, 8, db.session_local)
+    try:
+        n_before = n_writes()
+        await fill(db)
+        user = await update_user_profile(db, 1, UserUpdate(nickname="Renamed"))
+        assert user.nickname == "Renamed"
+        assert await get_cached_user(EMAIL) is None
+        created = await create_user(
+            db, UserCreate(email="new@anki.ai", password="password")
+        )
+        assert created.id is not None
+        await delete_user(db, created.id)
+        assert n_writes() - n_before == 3
+    finally:
+        await stop_group_commit()
+    async with db.session_local() as session:
+        assert (await get_user(session, 1)).nickname == "Renamed"
+        assert await get_user(session, created.id) is None
+
+
+@pytest.mark.anyio
+async def test_redis_fill_racing_another_worker_is_not_cached(db, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_REDIS_ENABLED", True)
+    monkeypatch.setattr(user_cache, "redis_client", None)
+    try:
+        await user_cache._get_redis().ping()
+    except Exception:
+        pytest.skip("redis is not reachable")
+    try:
+        await invalidate_cached_user(EMAIL)
+        generation = await user_cache_generation(EMAIL)
+        user = await deps.get_user_by_email(db, email=EMAIL)
+        # another worker invalidates the user: only Redis sees it
+        monkeypatch.setattr(user_cache, "_bump_generation", lambda email: None)
+        await invalidate_cached_user(EMAIL)
+        await cache_user(user, generation)
+        assert (
+            await user_cache._get_redis().get(
+                user_cache.USER_CACHE_REDIS_KEY_PREFIX + EMAIL
+            )
+            is None
+        )
+        assert EMAIL not in user_cache.cached_users
+    finally:
+        await user_cache._get_redis().aclose()
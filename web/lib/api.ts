@@ -68,6 +68,16 @@ export interface Card {
   status: 'learning' | 'reviewing' | 'mastered';
 }
 
+export interface CardCursor {
+  after_next_review: string;
+  after_id: number;
+}
+
+export interface CardPage {
+  items: Card[];
+  next_cursor: CardCursor | null;
+}
+
 export interface Review {
   id: number;
   card_id: number;
@@ -125,14 +135,14 @@ export const auth = {
 
 // Cards API
 export const cards = {
-  getAll: async () => {
-    const response = await api.get<Card[]>('/api/v1/cards/');
-    return response.data;
+  getAll: async (cursor?: CardCursor) => {
+    const response = await api.get<CardPage>('/api/v1/cards/', { params: cursor });
+    return response.data.items;
   },
 
-  getDue: async () => {
-    const response = await api.get<Card[]>('/api/v1/cards/due/');
-    return response.data;
+  getDue: async (cursor?: CardCursor) => {
+    const response = await api.get<CardPage>('/api/v1/cards/due/', { params: cursor });
+    return response.data.items;
   },
 
   getById: async (id: number) => {
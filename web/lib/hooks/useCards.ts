@@ -9,12 +9,12 @@ export function useCards() {
 
   const allCards = useQuery({
     queryKey: ['cards'],
-    queryFn: cards.getAll,
+    queryFn: () => cards.getAll(),
   });
 
   const dueCards = useQuery({
     queryKey: ['cards', 'due'],
-    queryFn: cards.getDue,
+    queryFn: () => cards.getDue(),
   });
 
   const getById = async (id: number) => {